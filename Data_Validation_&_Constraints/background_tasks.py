@@ -3,16 +3,48 @@ Background Tasks Example
 
 Description:
 Shows how to run tasks in the background using FastAPI's BackgroundTasks.
+
+send_email calls an external mail API. All jobs share one pooled HTTP client
+created in the app lifespan (keep-alive, per-host limits, time budget,
+circuit breaker), and emails are grouped into batch requests.
+
+How to run:
+1. Start the stub mail provider (from ../advance):
+       uvicorn mail_stub:app --port 9000
+2. uvicorn background_tasks:app --reload
+3. POST /notify?email=alok@example.com, then check http://127.0.0.1:9000/stats
 """
 
-from fastapi import FastAPI, BackgroundTasks
+import os
+import sys
+from contextlib import asynccontextmanager
+from pathlib import Path
+
+import anyio
+from fastapi import FastAPI, BackgroundTasks, Request
+
+# Shared helpers (outbound HTTP client, ...) live in ../advance
+sys.path.append(str(Path(__file__).resolve().parent.parent / "advance"))
+from http_client import MailBatcher, MailClient, OutboundClient
+
+MAIL_API_URL = os.getenv("MAIL_API_URL", "http://127.0.0.1:9000")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    async with OutboundClient(per_host=10, budget=5.0) as client:
+        mailer = MailBatcher(MailClient(client, MAIL_API_URL), batch_size=50)
+        app.state.mailer = mailer
+        async with anyio.create_task_group() as tg:
+            tg.start_soon(mailer.run)
+            yield
+            await mailer.close()  # flush pending emails before shutdown
 
-app = FastAPI(title="Background Tasks Example")
+app = FastAPI(title="Background Tasks Example", lifespan=lifespan)
 
-def send_email(to: str, subject: str):
-    print(f"Sending email to {to}: {subject}")
+async def send_email(mailer: MailBatcher, to: str, subject: str):
+    await mailer.send(to, subject)
 
 @app.post("/notify")
-def notify(email: str, tasks: BackgroundTasks):
-    tasks.add_task(send_email, email, "Thanks for signing up")
+def notify(email: str, tasks: BackgroundTasks, request: Request):
+    tasks.add_task(send_email, request.app.state.mailer, email, "Thanks for signing up")
     return {"queued": True}
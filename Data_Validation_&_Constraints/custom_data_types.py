@@ -15,13 +15,23 @@ Running it:
 3. Test: Go to http://localhost:8000/docs and try POST /users/
    - Valid: {"name": "alok", "email": "alok@example.com"}
    - Invalid email: Gets 422 error with message.
+   - Send an "Idempotency-Key" header to make retries safe: repeating the
+     request with the same key returns the first response, no duplicate user.
 """
 
+import sys
+from pathlib import Path
+
 from fastapi import FastAPI
 from pydantic import BaseModel, validator, EmailStr
 from typing import Optional
 
+# Shared helpers (idempotency, ...) live in ../advance
+sys.path.append(str(Path(__file__).resolve().parent.parent / "advance"))
+from idempotency import IdempotencyMiddleware
+
 app = FastAPI(title="Simple Validation Example")
+app.add_middleware(IdempotencyMiddleware, paths={"/users/"})
 
 # Custom data type: Uses Pydantic's built-in EmailStr for easy validation
 # (You can make your own, but this is simple and ready-to-use)
@@ -3,21 +3,39 @@ Dependency Injection Example
 
 Description:
 Shows function and class dependencies, including header-based auth.
+
+The x-token header carries an API key checked against a hashed key store.
+Create a key (run from this folder so both use ./api_keys.db):
+    python ../advance/api_keys.py create my-service
+    curl -H "x-token: fk_..." http://127.0.0.1:8000/secure
 """
 
-from fastapi import FastAPI, Depends, Header, HTTPException
+import sys
+from contextlib import asynccontextmanager
+from pathlib import Path
+
+from fastapi import FastAPI, Depends, Header
+
+# Shared helpers (API keys, ...) live in ../advance
+sys.path.append(str(Path(__file__).resolve().parent.parent / "advance"))
+from api_keys import APIKeyStore
+
+api_keys = APIKeyStore("./api_keys.db")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    api_keys.close()  # stop the usage flusher, write the last batch
 
-app = FastAPI(title="Dependency Injection Example")
+app = FastAPI(title="Dependency Injection Example", lifespan=lifespan)
 
 # Function dependency
 def get_token(x_token: str | None = Header(default=None)):
-    if x_token != "secret":
-        raise HTTPException(status_code=401, detail="Invalid token")
-    return x_token
+    return api_keys.verify(x_token)  # 401 if missing, unknown or revoked
 
 @app.get("/secure")
-def secure_area(token: str = Depends(get_token)):
-    return {"ok": True}
+def secure_area(client: str = Depends(get_token)):
+    return {"ok": True, "client": client}
 
 # Class dependency
 class Repo:
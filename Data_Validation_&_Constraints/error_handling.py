@@ -3,12 +3,26 @@ Error Handling Example
 
 Description:
 Shows usage of HTTPException and custom exception handlers in FastAPI.
+GET /charge is rate limited per client (429 + Retry-After on bursts) and
+debits a per-account credit ledger (402 once the credit is spent); balances
+survive restarts via the journal in LEDGER_DIR. The ledger is per process:
+run one worker, or one LEDGER_DIR per worker with accounts routed to it.
 """
 
-from fastapi import FastAPI, HTTPException, Request
+import os
+import sys
+from pathlib import Path
+
+from fastapi import Depends, FastAPI, HTTPException, Query, Request
 from fastapi.responses import JSONResponse
 
+# Shared helpers (rate limiting, credit ledger, ...) live in ../advance
+sys.path.append(str(Path(__file__).resolve().parent.parent / "advance"))
+from ledger import CreditLedger, InsufficientCredit
+from rate_limiting import LoadShedder, RateLimit, SlidingWindow
+
 app = FastAPI(title="Error Handling Example")
+app.add_middleware(LoadShedder, max_concurrency=64, target_wait=0.1)
 
 # Pretend database
 db = {1: {"id": 1, "title": "A"}}
@@ -21,14 +35,27 @@ def get_book(book_id: int):
 
 # Custom exception
 class OutOfCreditError(Exception):
-    pass
+    def __init__(self, balance: float):
+        self.balance = balance
 
 @app.exception_handler(OutOfCreditError)
 def handle_credit(request: Request, exc: OutOfCreditError):
-    return JSONResponse(status_code=402, content={"detail": "Insufficient credit"})
-
-@app.get("/charge")
-def charge(amount: float):
-    if amount > 100:
-        raise OutOfCreditError()
-    return {"charged": amount}
+    return JSONResponse(status_code=402, content={"detail": "Insufficient credit", "balance": exc.balance})
+
+# Every account starts with 100.00 of credit; balances are kept in cents.
+# Stats at /stats/ledger.
+ledger = CreditLedger(os.getenv("LEDGER_DIR", "./ledger_data"), initial_credit=100_00).install(app)
+
+# At most 20 charges per client in any 10-second window
+charge_rate_limit = RateLimit(SlidingWindow(limit=20, window=10), scope="charge")
+
+@app.get("/charge", dependencies=[Depends(charge_rate_limit)])
+async def charge(
+    amount: float = Query(..., ge=0.01, le=1_000_000, allow_inf_nan=False),  # finite and bounded: round(amount * 100) stays a sane int
+    account: str = Query("default", pattern=r"^[A-Za-z0-9_.-]{1,64}$"),
+):
+    try:
+        balance = await ledger.charge_async(account, round(amount * 100))
+    except InsufficientCredit as exc:
+        raise OutOfCreditError(exc.balance / 100)
+    return {"charged": amount, "balance": balance / 100}
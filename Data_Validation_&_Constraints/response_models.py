@@ -3,6 +3,11 @@ Response Models Example
 
 Description:
 Shows how to use response_model to filter output and ensure correct schema.
+
+response_model trims the object after it has been built and validated in
+full. For database-backed endpoints, letting the client pick fields with
+?fields=id,title and selecting only those columns is cheaper: see
+GET /books in ../advance/database_integration.py (../advance/projection.py).
 """
 
 from fastapi import FastAPI
@@ -4,6 +4,11 @@ Advanced Query Parameter Patterns
 Description:
 Demonstrates centralized dependencies, cross-field validation, and Pydantic models as query bundles.
 
+Query bundles are bound with `Annotated[Model, Query()]`: FastAPI builds the
+model's validator once per route and validates the whole query string in a
+single pass (constraints, custom validators and defaults together). No
+hand-written dependency re-declares the fields and no second validation runs.
+
 How to run:
 1. uvicorn advanced_query_parameters:app --reload
 2. Open browser: http://127.0.0.1:8000/docs
@@ -13,27 +18,29 @@ Examples:
 - /items-adv?page=2&per_page=50
 - /range?start=10&end=20
 - /search-adv?q=fastapi&lang=en&limit=10
+  (identical concurrent searches run once, see /stats/single-flight)
 """
 
+import sys
+from pathlib import Path
+from typing import Annotated
+
 from fastapi import FastAPI, Depends, Query, HTTPException
-from pydantic import BaseModel, field_validator
+from pydantic import BaseModel, Field, field_validator
 
-app = FastAPI(title="Advanced Query Parameter Patterns")
+# Shared helpers (single-flight, ...) live in ../advance
+sys.path.append(str(Path(__file__).resolve().parent.parent / "advance"))
+from single_flight import Flight, SingleFlight
 
-# Dependency Class for Pagination
-class Pagination:
-    def __init__(self, page: int, per_page: int):
-        self.page = page
-        self.per_page = per_page
+app = FastAPI(title="Advanced Query Parameter Patterns")
 
-def pagination_dep(
-    page: int = Query(1, ge=1),
-    per_page: int = Query(20, ge=1, le=100)
-) -> Pagination:
-    return Pagination(page, per_page)
+# Pydantic Model for Pagination (bound from the query string in one pass)
+class Pagination(BaseModel):
+    page: int = Field(1, ge=1)
+    per_page: int = Field(20, ge=1, le=100)
 
 @app.get("/items-adv")
-def items_adv(p: Pagination = Depends(pagination_dep)):
+def items_adv(p: Annotated[Pagination, Query()]):
     return {"page": p.page, "per_page": p.per_page}
 
 # Cross-Field Validation
@@ -45,9 +52,9 @@ def range_query(start: int = Query(..., ge=0), end: int = Query(..., ge=0)):
 
 # Pydantic Model as Query Bundle
 class SearchParams(BaseModel):
-    q: str
-    lang: str | None = None
-    limit: int = 20
+    q: str = Field(..., min_length=1)
+    lang: str | None = Field(None, min_length=2, max_length=2)
+    limit: int = Field(20, ge=1, le=100)
 
     @field_validator("q")
     def q_not_blank(cls, v):
@@ -55,13 +62,20 @@ class SearchParams(BaseModel):
             raise ValueError("q cannot be blank")
         return v
 
-def search_params_dep(
-    q: str = Query(..., min_length=1),
-    lang: str | None = Query(None, min_length=2, max_length=2),
-    limit: int = Query(20, ge=1, le=100)
-) -> SearchParams:
-    return SearchParams(q=q, lang=lang, limit=limit)
+search_flights = SingleFlight("search")
+search_flight = search_flights.dependency(key=("q", "lang", "limit"))
 
-@app.get("/search-adv")
-def search_adv(params: SearchParams = Depends(search_params_dep)):
+def run_search(params: SearchParams) -> dict:
+    # Placeholder for the real (expensive) search backend
     return params.model_dump()
+
+@app.get("/search-adv")
+def search_adv(
+    params: Annotated[SearchParams, Query()],
+    flight: Flight = Depends(search_flight),
+):
+    return flight.run_sync(run_search, params)
+
+@app.get("/stats/single-flight")
+def single_flight_stats():
+    return search_flights.stats()
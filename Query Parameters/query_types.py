@@ -17,38 +17,111 @@ Examples:
 - /colors?tags=red&tags=blue
 - /unique-tags?tags=python&tags=fastapi
 - /csv-tags?tags=red,green,blue
+- /stats/inline
+- PUT /catalogs/7/tags?tags=python&tags=fastapi
+- /catalogs/search?all=python&any=fastapi&any=flask&none=deprecated&limit=20
+- /stats/tags
+
+The handlers are trivial, so they run inline on the event loop instead of in
+the threadpool (../advance/inline_routes.py). /csv-tags depends on input
+size, so it is profiled first and only promoted if it stays under budget.
+
+Catalog tags (models.Catalog.tags) are kept in an inverted index of
+compressed bitmaps (../advance/tag_index.py): AND / OR / NOT tag queries
+stay in the low milliseconds at millions of catalogs. The index is saved
+on shutdown and memory-mapped on startup instead of being rebuilt.
 """
 
-from fastapi import FastAPI, Query
+import os
+import sys
+from contextlib import asynccontextmanager
+from pathlib import Path
+
+from fastapi import FastAPI, HTTPException, Path as PathParam, Query
 from typing import List, Set
 
-app = FastAPI(title="Different Types of Query Parameters Example")
+# Shared helpers (inline routes, tag index, ...) live in ../advance
+sys.path.append(str(Path(__file__).resolve().parent.parent / "advance"))
+from inline_routes import InlineGuard
+from tag_index import CatalogTags
+
+catalog_tags = CatalogTags(os.getenv("CATALOG_TAGS_DB", "./catalog_tags.db"))
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    catalog_tags.snapshot()
+
+app = FastAPI(title="Different Types of Query Parameters Example", lifespan=lifespan)
+
+inline_guard = InlineGuard(budget_ms=1.0)
 
 @app.get("/greet")
+@inline_guard.inline
 def greet(name: str = Query("world", min_length=1)):
     return {"message": f"Hello, {name}!"}
 
 @app.get("/square")
+@inline_guard.inline
 def square(n: int = Query(..., ge=0)):
     return {"n": n, "square": n * n}
 
 @app.get("/ratio")
+@inline_guard.inline
 def ratio(x: float = Query(..., gt=0), y: float = Query(..., gt=0)):
     return {"ratio": x / y}
 
 @app.get("/features")
+@inline_guard.inline
 def features(enabled: bool = Query(True)):
     return {"enabled": enabled}
 
 @app.get("/colors")
+@inline_guard.inline
 def colors(tags: List[str] = Query([])):
     return {"tags": tags}
 
 @app.get("/unique-tags")
+@inline_guard.inline
 def unique_tags(tags: Set[str] = Query(set())):
     return {"tags": sorted(tags)}
 
 @app.get("/csv-tags")
+@inline_guard.auto
 def csv_tags(tags: str = Query("")):
     parsed = [t for t in tags.split(",") if t] if tags else []
     return {"tags": parsed}
+
+@app.get("/stats/inline")
+def inline_stats():
+    return inline_guard.stats()
+
+
+@app.put("/catalogs/{catalog_id}/tags")
+def set_catalog_tags(catalog_id: int = PathParam(..., ge=0, lt=2**32), tags: Set[str] = Query(set())):
+    return {"catalog_id": catalog_id, "tags": catalog_tags.set_tags(catalog_id, tags)}
+
+@app.get("/catalogs/search")
+def search_catalogs(
+    all_: List[str] = Query([], alias="all", description="Catalog has every one of these tags"),
+    any_: List[str] = Query([], alias="any", description="Catalog has at least one of these tags"),
+    none: List[str] = Query([], description="Catalog has none of these tags"),
+    limit: int = Query(50, ge=1, le=1000),
+    offset: int = Query(0, ge=0),
+):
+    return catalog_tags.search(all_, any_, none, limit=limit, offset=offset)
+
+@app.get("/catalogs/{catalog_id}/tags")
+def get_catalog_tags(catalog_id: int):
+    tags = catalog_tags.get_tags(catalog_id)
+    if tags is None:
+        raise HTTPException(status_code=404, detail="Catalog not found")
+    return {"catalog_id": catalog_id, "tags": tags}
+
+@app.delete("/catalogs/{catalog_id}", status_code=204)
+def delete_catalog(catalog_id: int):
+    catalog_tags.delete(catalog_id)
+
+@app.get("/stats/tags")
+def tag_stats():
+    return catalog_tags.index.stats()
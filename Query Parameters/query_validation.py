@@ -15,13 +15,40 @@ Examples:
 - /price-range?min_price=10&max_price=500
 - /slugs?slug=my-first-slug
 - /analytics?start-date=2025-01-01&end-date=2025-12-31
-- /feed?limit=50&cursor=abc123
+  (count / sum / percentiles / time series over events stored by day, see ../advance/analytics.py)
+- POST /analytics/events  [{"ts": "2025-03-14T10:00:00Z", "value": 12.5}]
+- /feed?user=alice&limit=50  then  /feed?user=alice&limit=50&cursor=<next_cursor>
+- POST /feed/follow  {"follower": "alice", "followee": "bob"}
+- POST /feed/posts   {"author": "bob", "body": "hello"}
 """
 
-from fastapi import FastAPI, Query, HTTPException
+import sys
+from datetime import date, datetime, timezone
+from pathlib import Path
+from typing import List
+
+from fastapi import FastAPI, Query, HTTPException, Request
+from fastapi.encoders import jsonable_encoder
+from fastapi.exceptions import RequestValidationError
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel, Field
+
+# Shared helpers (analytics, feed, ...) live in ../advance
+sys.path.append(str(Path(__file__).resolve().parent.parent / "advance"))
+from analytics import EventStore, parse_date_range
+from feed import FeedService
 
 app = FastAPI(title="Query Parameter Validation Example")
 
+@app.exception_handler(RequestValidationError)
+def validation_error(request: Request, exc: RequestValidationError):
+    # Like the default 422, minus the echoed input: a rejected NaN/inf cannot be rendered as JSON
+    errors = [{k: v for k, v in error.items() if k != "input"} for error in exc.errors()]
+    return JSONResponse(status_code=422, content={"detail": jsonable_encoder(errors)})
+
+events = EventStore("./analytics_events")
+feed_service = FeedService("./feed.db")
+
 @app.get("/validate")
 def validate(
     q: str = Query(..., min_length=3, max_length=50, description="Search term"),
@@ -46,16 +73,43 @@ def price_range(
 def slugs(slug: str = Query(..., pattern=r"^[a-z0-9-]+$")):
     return {"slug": slug}
 
+class Event(BaseModel):
+    ts: datetime
+    value: float = Field(allow_inf_nan=False)  # NaN/inf would poison the sums and the JSON reply
+
+@app.post("/analytics/events", status_code=201)
+def add_events(batch: List[Event]):
+    ts = [int(e.ts.replace(tzinfo=e.ts.tzinfo or timezone.utc).timestamp() * 1_000_000) for e in batch]
+    return {"stored": events.append(ts, [e.value for e in batch])}
+
 @app.get("/analytics")
 def analytics(
-    start: str = Query(..., alias="start-date"),
-    end: str = Query(..., alias="end-date"),
+    start: date = Query(..., alias="start-date", description="YYYY-MM-DD, inclusive"),
+    end: date = Query(..., alias="end-date", description="YYYY-MM-DD, inclusive"),
 ):
-    return {"start": start, "end": end}
+    start, end = parse_date_range(start, end)
+    return events.query(start, end)
+
+class Follow(BaseModel):
+    follower: str
+    followee: str
+
+class Post(BaseModel):
+    author: str
+    body: str
+
+@app.post("/feed/follow", status_code=204)
+def follow(f: Follow):
+    feed_service.follow(f.follower, f.followee)
+
+@app.post("/feed/posts", status_code=201)
+def create_post(p: Post):
+    return feed_service.post(p.author, p.body)
 
 @app.get("/feed")
 def feed(
+    user: str = Query(..., min_length=1, description="Whose home timeline"),
     limit: int = Query(20, ge=1, le=100, description="Items per page"),
-    cursor: str | None = Query(None, description="Pagination cursor"),
+    cursor: str | None = Query(None, description="Opaque cursor from the previous page's next_cursor"),
 ):
-    return {"limit": limit, "cursor": cursor}
+    return {"limit": limit, "cursor": cursor, **feed_service.page(user, limit, cursor)}
@@ -7,7 +7,8 @@ Shows how to combine path parameters, query parameters, and request body in a si
 How to run:
 1. uvicorn body_with_path_query:app --reload
 2. Open browser: http://127.0.0.1:8000/docs
-3. Test POST /catalogs/{catalog_id}/books with JSON body
+3. Test POST /catalogs/{catalog_id}/books with JSON body, then
+   GET /catalogs/{catalog_id}/books?fields=id,title
 
 Example:
 POST /catalogs/10/books?featured=true
@@ -18,18 +19,129 @@ Body:
   "price": 59.9,
   "in_stock": true
 }
+
+GET /catalogs/10/books?fields=id,title
+  only the id and title columns are selected from the database and returned
+
+GET /books?limit=50   then   GET /books?limit=50&after=<X-Next-After header>
+  books of all catalogs, merged from every shard in (catalog_id, id) order
+
+Storage is sharded by catalog_id: each catalog lives in one of
+CATALOG_SHARDS SQLite files (consistent hashing, ../advance/sharding.py),
+and each shard has its own writer thread with group commit, so writes to
+different catalogs do not queue on one database lock. To change the shard
+count, stop the app and run:
+    python ../advance/sharding.py rebalance ./catalog_shards 4 6
 """
 
-from typing import Optional
-from fastapi import FastAPI
+import os
+import sys
+from contextlib import asynccontextmanager
+from pathlib import Path
+from typing import List, Optional
+
+from fastapi import Depends, FastAPI, HTTPException, Query, status
+from sqlalchemy import Boolean, Column, Float, Integer, String, insert, tuple_
+from sqlalchemy.orm import declarative_base
+
 from models import Book
 
-app = FastAPI(title="Body with Path & Query Parameters Example")
+# Shared helpers (projection, sharding, ...) live in ../advance
+sys.path.append(str(Path(__file__).resolve().parent.parent / "advance"))
+from projection import FieldSet, Projection
+from sharding import ShardedDatabase
+
+Base = declarative_base()
+
+
+class CatalogBookORM(Base):
+    __tablename__ = "catalog_books"
+
+    catalog_id = Column(Integer, primary_key=True)
+    id = Column(Integer, primary_key=True)
+    title = Column(String, nullable=False)
+    price = Column(Float, nullable=False)
+    in_stock = Column(Boolean, nullable=False)
+    featured = Column(Boolean, nullable=False, default=False)
+
+
+shards = ShardedDatabase.from_directory(
+    os.getenv("CATALOG_SHARDS_DIR", "./catalog_shards"),
+    int(os.getenv("CATALOG_SHARDS", "4")),
+    Base.metadata,
+)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    shards.close()
+
+
+app = FastAPI(title="Body with Path & Query Parameters Example", lifespan=lifespan)
+
+book_fields = FieldSet(Book, CatalogBookORM)
+upsert_book = insert(CatalogBookORM).prefix_with("OR REPLACE")
 
 @app.post("/catalogs/{catalog_id}/books")
-def add_book(
+async def add_book(
     catalog_id: int,                # path
     book: Book,                     # body
-    featured: Optional[bool] = False  # query
+    featured: Optional[bool] = False,  # query
 ):
+    row = {"catalog_id": catalog_id, "featured": featured, **book.model_dump()}
+    await shards.run(catalog_id, lambda conn: conn.execute(upsert_book, row))
     return {"catalog_id": catalog_id, "featured": featured, "book": book}
+
+@app.get("/catalogs/{catalog_id}/books", response_model=List[Book])
+async def list_catalog_books(
+    catalog_id: int,
+    proj: Projection = Depends(book_fields),  # ?fields=id,title
+):
+    stmt = proj.select().where(CatalogBookORM.catalog_id == catalog_id).order_by(CatalogBookORM.id)
+    return proj.render(await shards.run(catalog_id, lambda conn: conn.execute(stmt).all()))
+
+@app.get("/catalogs/{catalog_id}/books/{book_id}", response_model=Book)
+async def get_catalog_book(
+    catalog_id: int,
+    book_id: int,
+    proj: Projection = Depends(book_fields),
+):
+    stmt = proj.select().where(CatalogBookORM.catalog_id == catalog_id, CatalogBookORM.id == book_id)
+    row = await shards.run(catalog_id, lambda conn: conn.execute(stmt).first())
+    if row is None:
+        raise HTTPException(status_code=404, detail="Book not found")
+    return proj.render_one(row)
+
+def parse_after(after: Optional[str] = Query(None, description="catalog_id:book_id of the last book seen")):
+    if after is None:
+        return None
+    try:
+        catalog_id, book_id = (int(part) for part in after.split(":"))
+    except ValueError:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="after must be <catalog_id>:<book_id>")
+    return catalog_id, book_id
+
+@app.get("/books", response_model=List[Book])
+async def list_all_books(
+    limit: int = Query(50, ge=1, le=1000),
+    after: Optional[tuple] = Depends(parse_after),
+    proj: Projection = Depends(book_fields),
+):
+    key = (CatalogBookORM.catalog_id, CatalogBookORM.id)
+
+    def fetch(conn, since, n):  # one shard's next rows in (catalog_id, id) order
+        stmt = proj.select().add_columns(*key).order_by(*key).limit(n)
+        if since is not None:
+            stmt = stmt.where(tuple_(*key) > since)
+        return conn.execute(stmt).all()
+
+    rows = [row async for row in shards.merge(fetch, key=lambda row: tuple(row[-2:]), after=after, limit=limit)]
+    page = proj.render(row[:-2] for row in rows)
+    if len(rows) == limit:
+        page.headers["X-Next-After"] = "%d:%d" % tuple(rows[-1][-2:])
+    return page
+
+@app.get("/stats/shards")
+def shard_stats():
+    return shards.stats()
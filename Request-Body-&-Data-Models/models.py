@@ -24,7 +24,7 @@ class Author(BaseModel):
     name: str
     email: str
 
-# Complex Catalog model
+# Complex Catalog model (tags are searchable via ../advance/tag_index.py, see Query Parameters/query_types.py)
 class Catalog(BaseModel):
     name: str
     count: int
@@ -21,17 +21,95 @@ Example JSON body:
     "name": "Fiction"
   }
 }
+
+GET /shelves/Fiction?limit=50
+  placements on that shelf across all catalogs (every shard queried at once,
+  results merged in (catalog_id, book_id) order)
+
+Placements are stored in catalog_id-sharded SQLite files
+(../advance/sharding.py) under PLACEMENT_SHARDS_DIR. Each shard must have a
+single writer thread, so this app does not share body_with_path_query.py's
+./catalog_shards directory.
 """
 
-from fastapi import FastAPI
+import os
+import sys
+from contextlib import asynccontextmanager
+from pathlib import Path
+from typing import Optional
+
+from fastapi import FastAPI, HTTPException, Query, status
 from models import Book
 from pydantic import BaseModel
+from sqlalchemy import Column, Integer, String, insert, select, tuple_
+from sqlalchemy.orm import declarative_base
+
+# Shared helpers (sharding, ...) live in ../advance
+sys.path.append(str(Path(__file__).resolve().parent.parent / "advance"))
+from sharding import ShardedDatabase
+
+Base = declarative_base()
+
+
+class PlacementORM(Base):
+    __tablename__ = "shelf_placements"
+
+    catalog_id = Column(Integer, primary_key=True)
+    book_id = Column(Integer, primary_key=True)
+    title = Column(String, nullable=False)
+    shelf = Column(String, nullable=False, index=True)
+
 
-app = FastAPI(title="Multiple Body Parameters Example")
+shards = ShardedDatabase.from_directory(
+    os.getenv("PLACEMENT_SHARDS_DIR", "./placement_shards"),
+    int(os.getenv("PLACEMENT_SHARDS", "4")),
+    Base.metadata,
+)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    shards.close()
+
+
+app = FastAPI(title="Multiple Body Parameters Example", lifespan=lifespan)
 
 class Shelf(BaseModel):
     name: str
 
+place = insert(PlacementORM).prefix_with("OR REPLACE")
+
 @app.post("/catalogs/{catalog_id}/place")
-def place_book(catalog_id: int, book: Book, shelf: Shelf):
+async def place_book(catalog_id: int, book: Book, shelf: Shelf):
+    row = {"catalog_id": catalog_id, "book_id": book.id, "title": book.title, "shelf": shelf.name}
+    await shards.run(catalog_id, lambda conn: conn.execute(place, row))
     return {"catalog_id": catalog_id, "book": book, "shelf": shelf}
+
+@app.get("/shelves/{shelf}")
+async def shelf_books(
+    shelf: str,
+    limit: int = Query(50, ge=1, le=1000),
+    after: Optional[str] = Query(None, description="catalog_id:book_id of the last placement seen"),
+):
+    since = None
+    if after is not None:
+        try:
+            catalog_id, book_id = (int(part) for part in after.split(":"))
+        except ValueError:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="after must be <catalog_id>:<book_id>")
+        since = (catalog_id, book_id)
+    key = (PlacementORM.catalog_id, PlacementORM.book_id)
+
+    def fetch(conn, since, n):
+        stmt = select(*key, PlacementORM.title).where(PlacementORM.shelf == shelf).order_by(*key).limit(n)
+        if since is not None:
+            stmt = stmt.where(tuple_(*key) > since)
+        return conn.execute(stmt).all()
+
+    rows = [row async for row in shards.merge(fetch, key=lambda row: tuple(row[:2]), after=since, limit=limit)]
+    return {
+        "shelf": shelf,
+        "books": [{"catalog_id": c, "book_id": b, "title": t} for c, b, t in rows],
+        "next_after": f"{rows[-1][0]}:{rows[-1][1]}" if len(rows) == limit else None,
+    }
@@ -0,0 +1,285 @@
+"""
+Columnar Time-Series Analytics (NumPy)
+
+Description:
+Stores events append-only in a columnar layout and answers range
+aggregations (count, sum, mean, min, max, percentiles, time series) with
+vectorized NumPy scans.
+
+Layout (one directory per day):
+    <root>/2025/03/14/ts.i8       int64 timestamps (unix microseconds)
+    <root>/2025/03/14/value.f8    float64 values
+    <root>/2025/03/14/summary.f8  cached day summary (rebuilt when stale)
+
+- Appends go to the end of the day's files; reads memory-map them
+  (np.memmap), so nothing is loaded until a scan touches it.
+- Per-day summaries (count, sum, min, max and a 257-point quantile digest)
+  are computed once per partition and cached, so five years of data is
+  answered from ~1800 summaries instead of every event.
+- Downsampling for long ranges: the time series has at most `max_points`
+  buckets (hourly for a day, daily for a year, weekly for 5 years). Ranges
+  with more than `sample_limit` events take percentiles from the merged
+  digests instead of the raw values (the response says "approximate": true).
+
+How to use:
+    from analytics import EventStore, parse_date_range
+
+    store = EventStore("./events")
+    store.append(timestamps_us, values)
+    store.query(date(2025, 1, 1), date(2025, 12, 31))
+
+Benchmark (1 day / 1 year / 5 years over N events):
+    python analytics.py 100000000
+"""
+
+import threading
+import time
+from datetime import date, datetime, timedelta, timezone
+from pathlib import Path
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+from fastapi import HTTPException, status
+
+US_PER_DAY = 86_400 * 1_000_000
+EPOCH = date(1970, 1, 1)
+BUCKETS_US = [  # candidate series resolutions, finest first
+    3_600 * 1_000_000,            # 1 hour
+    6 * 3_600 * 1_000_000,        # 6 hours
+    US_PER_DAY,                   # 1 day
+    7 * US_PER_DAY,               # 1 week
+    30 * US_PER_DAY,              # ~1 month
+]
+
+DIGEST_QUANTILES = np.linspace(0.0, 1.0, 257)  # per-day quantile sketch
+
+
+class DaySummary(NamedTuple):
+    count: int
+    total: float
+    low: float
+    high: float
+    digest: np.ndarray  # values at DIGEST_QUANTILES
+
+
+def parse_date_range(start: date, end: date, max_days: int = 3660) -> Tuple[date, date]:
+    """Validate an inclusive [start, end] day range (400 on bad input)."""
+    if start > end:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="start-date must be <= end-date")
+    if (end - start).days + 1 > max_days:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Range is limited to {max_days} days")
+    return start, end
+
+
+def day_of(ts_us: np.ndarray) -> np.ndarray:
+    return ts_us // US_PER_DAY  # days since epoch
+
+
+class EventStore:
+    def __init__(self, root: str, sample_limit: int = 2_000_000, max_points: int = 400):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.sample_limit = sample_limit
+        self.max_points = max_points
+        self._summaries: Dict[int, DaySummary] = {}
+        self._generations: Dict[int, int] = {}  # bumped by every append to that day
+        self._lock = threading.Lock()
+
+    def _dir(self, day: int) -> Path:
+        d = EPOCH + timedelta(days=int(day))
+        return self.root / f"{d.year:04d}" / f"{d.month:02d}" / f"{d.day:02d}"
+
+    # -- writes -----------------------------------------------------------
+    def append(self, ts_us: np.ndarray, values: np.ndarray) -> int:
+        """Append events (any order); they are split into day partitions."""
+        ts_us = np.asarray(ts_us, dtype="<i8")
+        values = np.asarray(values, dtype="<f8")
+        if ts_us.shape != values.shape:
+            raise ValueError("timestamps and values must have the same length")
+        if not np.isfinite(values).all():
+            raise ValueError("values must be finite (no NaN or inf)")
+        if not len(values):
+            return 0
+        days = day_of(ts_us)
+        order = np.argsort(days, kind="stable")
+        ts_us, values, days = ts_us[order], values[order], days[order]
+        boundaries = np.flatnonzero(np.diff(days)) + 1
+        with self._lock:
+            for ts_part, val_part in zip(np.split(ts_us, boundaries), np.split(values, boundaries)):
+                day = int(ts_part[0] // US_PER_DAY)
+                folder = self._dir(day)
+                folder.mkdir(parents=True, exist_ok=True)
+                with open(folder / "ts.i8", "ab") as f:
+                    f.write(ts_part.tobytes())
+                with open(folder / "value.f8", "ab") as f:
+                    f.write(val_part.tobytes())
+                self._summaries.pop(day, None)  # recomputed on next read
+                self._generations[day] = self._generations.get(day, 0) + 1
+        return len(values)
+
+    # -- reads ------------------------------------------------------------
+    def _columns(self, day: int) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        folder = self._dir(day)
+        ts_file, val_file = folder / "ts.i8", folder / "value.f8"
+        if not val_file.exists() or val_file.stat().st_size == 0:
+            return None
+        # Sizes may differ by a partial write in progress: use the shorter one
+        n = min(ts_file.stat().st_size // 8, val_file.stat().st_size // 8)
+        ts = np.memmap(ts_file, dtype="<i8", mode="r", shape=(n,))
+        values = np.memmap(val_file, dtype="<f8", mode="r", shape=(n,))
+        return ts, values
+
+    def _summary(self, day: int) -> Optional[DaySummary]:
+        summary = self._summaries.get(day)
+        if summary is None:
+            with self._lock:
+                generation = self._generations.get(day, 0)
+            cols = self._columns(day)
+            if cols is None:
+                return None
+            values = cols[1]
+            summary = self._load_summary(day, len(values))
+            if summary is None:
+                summary = DaySummary(
+                    count=len(values),
+                    total=float(values.sum()),
+                    low=float(values.min()),
+                    high=float(values.max()),
+                    digest=np.quantile(values, DIGEST_QUANTILES),
+                )
+                self._save_summary(day, summary)
+            with self._lock:
+                # An append since we read the columns makes this summary stale: serve it, don't cache it
+                if self._generations.get(day, 0) == generation:
+                    self._summaries[day] = summary
+        return summary
+
+    def _load_summary(self, day: int, count: int) -> Optional[DaySummary]:
+        """Summary persisted next to the partition, if it still matches the row count."""
+        path = self._dir(day) / "summary.f8"
+        if not path.exists():
+            return None
+        raw = np.fromfile(path, dtype="<f8")
+        if len(raw) != 4 + len(DIGEST_QUANTILES) or int(raw[0]) != count:
+            return None  # stale: events were appended since
+        return DaySummary(count, float(raw[1]), float(raw[2]), float(raw[3]), raw[4:])
+
+    def _save_summary(self, day: int, s: DaySummary) -> None:
+        path = self._dir(day) / "summary.f8"
+        tmp = path.with_suffix(".tmp")
+        np.concatenate([[s.count, s.total, s.low, s.high], s.digest]).astype("<f8").tofile(tmp)
+        tmp.replace(path)
+
+    def query(self, start: date, end: date) -> dict:
+        first, last = (start - EPOCH).days, (end - EPOCH).days
+        summaries = [(d, s) for d in range(first, last + 1) if (s := self._summary(d)) is not None]
+
+        count = sum(s.count for _, s in summaries)
+        total = sum(s.total for _, s in summaries)
+        result = {
+            "start": start.isoformat(),
+            "end": end.isoformat(),
+            "days_with_data": len(summaries),
+            "count": count,
+            "sum": total,
+            "mean": total / count if count else None,
+            "min": min((s.low for _, s in summaries), default=None),
+            "max": max((s.high for _, s in summaries), default=None),
+        }
+
+        span_us = (last - first + 1) * US_PER_DAY
+        bucket_us = next((b for b in BUCKETS_US if span_us / b <= self.max_points), BUCKETS_US[-1])
+        n_buckets = -(-span_us // bucket_us)
+        bucket_count = np.zeros(n_buckets, dtype=np.int64)
+        bucket_sum = np.zeros(n_buckets, dtype=np.float64)
+        origin = first * US_PER_DAY
+        exact = count <= self.sample_limit
+        samples: List[np.ndarray] = []
+
+        if bucket_us >= US_PER_DAY:
+            # Downsampled series: whole days per bucket, straight from the summaries
+            for d, s in summaries:
+                i = (d - first) * US_PER_DAY // bucket_us
+                bucket_count[i] += s.count
+                bucket_sum[i] += s.total
+        if bucket_us < US_PER_DAY or exact:
+            # Short range: one vectorized pass over the memory-mapped columns
+            for d, _ in summaries:
+                ts, values = self._columns(d)
+                if bucket_us < US_PER_DAY:
+                    idx = (ts - origin) // bucket_us
+                    bucket_count += np.bincount(idx, minlength=n_buckets)[:n_buckets]
+                    bucket_sum += np.bincount(idx, weights=values, minlength=n_buckets)[:n_buckets]
+                if exact:
+                    samples.append(values)
+
+        if count:
+            if exact:
+                percentiles = np.percentile(np.concatenate(samples), [50, 90, 99])
+            else:
+                percentiles = merged_percentiles([s for _, s in summaries], [50, 90, 99])
+            result.update(p50=float(percentiles[0]), p90=float(percentiles[1]), p99=float(percentiles[2]))
+        result["approximate"] = not exact
+        result["bucket_seconds"] = bucket_us // 1_000_000
+        nonzero = np.flatnonzero(bucket_count)
+        result["series"] = [
+            {
+                "t": datetime.fromtimestamp((origin + int(i) * bucket_us) / 1e6, tz=timezone.utc).isoformat(),
+                "count": int(bucket_count[i]),
+                "mean": float(bucket_sum[i] / bucket_count[i]),
+            }
+            for i in nonzero
+        ]
+        return result
+
+
+def merged_percentiles(summaries: List[DaySummary], percents: List[float]) -> np.ndarray:
+    """
+    Percentiles from per-day digests. Each gap between neighbouring digest
+    points holds 1/256 of its day's events; it is represented by its midpoint.
+    """
+    points = np.concatenate([(s.digest[1:] + s.digest[:-1]) / 2 for s in summaries])
+    weights = np.concatenate([np.full(len(s.digest) - 1, s.count / (len(s.digest) - 1)) for s in summaries])
+    order = np.argsort(points, kind="stable")
+    cumulative = np.cumsum(weights[order])
+    targets = np.asarray(percents) / 100 * cumulative[-1]
+    return points[order][np.minimum(np.searchsorted(cumulative, targets), len(points) - 1)]
+
+
+# ------------------------------------------------------------------------------
+# Benchmark: query latency for 1 day, 1 year and 5 years
+# ------------------------------------------------------------------------------
+def benchmark(total_events: int = 100_000_000, years: int = 5) -> None:
+    import tempfile
+
+    root = tempfile.mkdtemp()
+    store = EventStore(root)
+    start_day = date(2021, 1, 1)
+    n_days = 365 * years + 1
+    per_day = total_events // n_days
+    rng = np.random.default_rng(0)
+    print(f"Writing {per_day * n_days:,} events over {n_days} days to {root} ...")
+    t = time.perf_counter()
+    base = (start_day - EPOCH).days * US_PER_DAY
+    for day in range(n_days):
+        ts = base + day * US_PER_DAY + np.sort(rng.integers(0, US_PER_DAY, per_day))
+        store.append(ts, rng.gamma(2.0, 50.0, per_day))
+    print(f"  ingest: {time.perf_counter() - t:.1f}s")
+
+    store._summaries.clear()  # first run builds the summaries (page cache stays warm)
+    for label, days in (("1 day", 1), ("1 year", 365), (f"{years} years", n_days)):
+        end = start_day + timedelta(days=days - 1)
+        for run in ("first", "cached summaries"):
+            t = time.perf_counter()
+            r = store.query(start_day, end)
+            ms = (time.perf_counter() - t) * 1000
+            print(
+                f"{label:>8} ({run:<16}) {ms:9.1f} ms  count={r['count']:,} "
+                f"p99={r['p99']:.1f} points={len(r['series'])} approximate={r['approximate']}"
+            )
+
+
+if __name__ == "__main__":
+    import sys
+
+    benchmark(int(sys.argv[1]) if len(sys.argv) > 1 else 100_000_000)
@@ -0,0 +1,232 @@
+"""
+Hashed API-Key Store
+
+Description:
+API keys for thousands of service clients, checked on every request.
+
+- Keys look like `fk_<prefix>_<secret>`. The prefix is public and indexed,
+  so a lookup is O(1); only a salted HMAC-SHA256 digest of the secret is
+  stored, never the key itself.
+- Digests are compared with hmac.compare_digest (constant time).
+  Keys are 256-bit random values, so a fast keyed hash is enough; a slow
+  password hash (bcrypt) is only needed for low-entropy secrets.
+- Validated key records are cached in memory for `cache_ttl` seconds.
+  Revoking a key drops it from this worker's cache at once; other workers
+  notice within `cache_ttl`.
+- Usage counters are aggregated in memory and written to SQLite in one
+  batch every `flush_interval` seconds instead of on every request. The
+  write happens on a background thread, never on a request; if it fails, the
+  counters are kept and retried on the next flush.
+
+How to use:
+    from api_keys import APIKeyStore
+
+    keys = APIKeyStore("./api_keys.db")
+
+    def get_token(x_token: str | None = Header(default=None)):
+        return keys.verify(x_token)   # raises 401 if invalid
+
+    # on shutdown: keys.close()  (stops the flusher, writes the last batch)
+
+Create / revoke keys from the command line:
+    python api_keys.py create billing-service
+    python api_keys.py revoke <prefix>
+"""
+
+import hashlib
+import hmac
+import logging
+import secrets
+import sqlite3
+import threading
+import time
+from collections import Counter
+from typing import Dict, Optional, Tuple
+
+from fastapi import HTTPException, status
+
+KEY_PREFIX = "fk"
+
+logger = logging.getLogger("api_keys")
+
+
+class KeyRecord:
+    __slots__ = ("prefix", "salt", "digest", "client", "revoked", "cached_at")
+
+    def __init__(self, prefix: str, salt: bytes, digest: bytes, client: str, revoked: bool):
+        self.prefix = prefix
+        self.salt = salt
+        self.digest = digest
+        self.client = client
+        self.revoked = revoked
+        self.cached_at = time.monotonic()
+
+
+def _digest(salt: bytes, secret: str) -> bytes:
+    return hmac.new(salt, secret.encode(), hashlib.sha256).digest()
+
+
+def split_key(key: str) -> Optional[Tuple[str, str]]:
+    """'fk_<prefix>_<secret>' -> (prefix, secret), or None if malformed."""
+    parts = key.split("_", 2)
+    if len(parts) != 3 or parts[0] != KEY_PREFIX or not parts[1] or not parts[2]:
+        return None
+    return parts[1], parts[2]
+
+
+class APIKeyStore:
+    def __init__(
+        self,
+        path: str = "./api_keys.db",
+        cache_ttl: float = 60.0,
+        cache_size: int = 50_000,
+        flush_interval: float = 5.0,
+    ):
+        self.path = path
+        self.cache_ttl = cache_ttl
+        self.cache_size = cache_size
+        self.flush_interval = flush_interval
+        self._cache: Dict[str, KeyRecord] = {}
+        self._usage: Counter = Counter()
+        self._last_used: Dict[str, float] = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._flusher: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._conn().execute(
+            "CREATE TABLE IF NOT EXISTS api_keys ("
+            " prefix TEXT PRIMARY KEY,"
+            " salt BLOB NOT NULL,"
+            " digest BLOB NOT NULL,"
+            " client TEXT NOT NULL,"
+            " revoked INTEGER NOT NULL DEFAULT 0,"
+            " created_at REAL NOT NULL,"
+            " usage_count INTEGER NOT NULL DEFAULT 0,"
+            " last_used REAL)"
+        )
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    # -- management -------------------------------------------------------
+    def create(self, client: str) -> str:
+        """Create a key for `client`. The full key is returned only once."""
+        prefix = secrets.token_hex(6)
+        secret = secrets.token_urlsafe(32)
+        salt = secrets.token_bytes(16)
+        self._conn().execute(
+            "INSERT INTO api_keys (prefix, salt, digest, client, created_at) VALUES (?, ?, ?, ?, ?)",
+            (prefix, salt, _digest(salt, secret), client, time.time()),
+        )
+        return f"{KEY_PREFIX}_{prefix}_{secret}"
+
+    def revoke(self, prefix: str) -> bool:
+        cur = self._conn().execute("UPDATE api_keys SET revoked = 1 WHERE prefix = ?", (prefix,))
+        with self._lock:
+            self._cache.pop(prefix, None)
+        return cur.rowcount > 0
+
+    # -- hot path ---------------------------------------------------------
+    def _record(self, prefix: str) -> Optional[KeyRecord]:
+        record = self._cache.get(prefix)
+        if record is not None and time.monotonic() - record.cached_at < self.cache_ttl:
+            return record
+        row = self._conn().execute(
+            "SELECT salt, digest, client, revoked FROM api_keys WHERE prefix = ?", (prefix,)
+        ).fetchone()
+        if row is None:
+            return None  # unknown prefixes are not cached (attackers pick random ones)
+        record = KeyRecord(prefix, row[0], row[1], row[2], bool(row[3]))
+        with self._lock:
+            if len(self._cache) >= self.cache_size:
+                self._cache.clear()
+            self._cache[prefix] = record
+        return record
+
+    def verify(self, key: Optional[str]) -> str:
+        """Return the client name for a valid key, otherwise raise 401."""
+        parsed = split_key(key) if key else None
+        record = self._record(parsed[0]) if parsed else None
+        # Always compute a digest so timing does not reveal whether the prefix exists
+        salt = record.salt if record is not None else b"\0" * 16
+        presented = _digest(salt, parsed[1] if parsed else "")
+        expected = record.digest if record is not None else b"\1" * 32
+        if not hmac.compare_digest(presented, expected) or record.revoked:
+            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token")
+        self._count(record.prefix)
+        return record.client
+
+    # -- usage counters ---------------------------------------------------
+    def _count(self, prefix: str) -> None:
+        with self._lock:
+            self._usage[prefix] += 1
+            self._last_used[prefix] = time.monotonic()
+            if self._flusher is None and not self._stop.is_set():
+                self._flusher = threading.Thread(target=self._flush_loop, name="api-key-usage", daemon=True)
+                self._flusher.start()
+
+    def _flush_loop(self) -> None:
+        while not self._stop.wait(self.flush_interval):
+            try:
+                self.flush()
+            except sqlite3.Error as exc:
+                logger.warning("Usage flush failed, retrying in %gs: %r", self.flush_interval, exc)
+
+    def flush(self) -> int:
+        """Write aggregated usage counters in one transaction. Returns keys updated."""
+        with self._lock:
+            usage, self._usage = self._usage, Counter()
+            last_used, self._last_used = self._last_used, {}
+        if not usage:
+            return 0
+        offset = time.time() - time.monotonic()  # monotonic -> wall clock
+        conn = self._conn()
+        try:
+            conn.execute("BEGIN")
+            conn.executemany(
+                "UPDATE api_keys SET usage_count = usage_count + ?, last_used = ? WHERE prefix = ?",
+                [(count, last_used[prefix] + offset, prefix) for prefix, count in usage.items()],
+            )
+            conn.execute("COMMIT")
+        except BaseException:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            # Put the counters back so the next flush writes them
+            with self._lock:
+                self._usage.update(usage)
+                for prefix, used in last_used.items():
+                    self._last_used[prefix] = max(used, self._last_used.get(prefix, used))
+            raise
+        return len(usage)
+
+    def close(self) -> None:
+        """Stop the background flusher and write the last batch."""
+        self._stop.set()
+        with self._lock:
+            flusher = self._flusher
+        if flusher is not None:
+            flusher.join()
+        self.flush()
+
+    def usage(self, prefix: str) -> int:
+        row = self._conn().execute("SELECT usage_count FROM api_keys WHERE prefix = ?", (prefix,)).fetchone()
+        with self._lock:
+            pending = self._usage.get(prefix, 0)
+        return (row[0] if row else 0) + pending
+
+
+if __name__ == "__main__":
+    import sys
+
+    store = APIKeyStore()
+    if len(sys.argv) == 3 and sys.argv[1] == "create":
+        print(store.create(sys.argv[2]))
+    elif len(sys.argv) == 3 and sys.argv[1] == "revoke":
+        print("revoked" if store.revoke(sys.argv[2]) else "unknown prefix")
+    else:
+        print("usage: python api_keys.py create <client> | revoke <prefix>")
@@ -0,0 +1,389 @@
+"""
+Streaming CSV Import with Background Jobs
+
+Description:
+`POST /books/import` (multipart form, field `file`) takes a CSV of any size
+and answers 202 with a job id as soon as the upload has arrived;
+`GET /books/import/{job_id}` reports progress and row errors.
+
+- The CSV is parsed incrementally (csv.reader over a TextIOWrapper) from the
+  spooled temporary file python-multipart already wrote the upload to; it
+  is never read into memory as a whole.
+- The header is checked before the job is accepted: a file without the
+  required columns gets 422 right away instead of a failed job.
+- Rows are validated against the Pydantic model in batches: one
+  TypeAdapter(List[Model]) call runs `batch_rows` rows through pydantic-core
+  at once. Bad rows are reported with their CSV line number and skipped; the
+  import goes on.
+- Each batch is inserted in its own transaction together with the job's
+  counters and the batch's row errors, so the reported progress always
+  matches what is committed, and the database write lock is held for one
+  batch only (other requests keep writing during a long import).
+- Jobs live in the same database (tables import_jobs / import_errors), so any
+  worker of `uvicorn --workers N` can answer the status request.
+- Jobs run one at a time on a dedicated thread (not the request threadpool).
+  On shutdown the running job stops after its current batch and is marked
+  "interrupted"; the batches committed so far stay.
+
+How to use:
+    from bulk_import import CsvImporter
+
+    importer = CsvImporter(engine, BookORM.__table__, BookCreate).install(app, path="/books/import")
+
+    curl -F file=@books.csv http://127.0.0.1:8000/books/import
+    -> {"job_id": "...", "state": "queued", "status": "/books/import/..."}
+    curl http://127.0.0.1:8000/books/import/<job_id>
+    -> {"state": "running", "rows_read": 1200000, "inserted": 1199990,
+        "failed": 10, "progress": 0.42, "errors": [{"line": 17, "error": "..."}]}
+
+Benchmark (batch vs per-row validation, import rows/s and peak RSS):
+    python bulk_import.py [rows]
+"""
+
+import csv
+import io
+import os
+import secrets
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from typing import Any, BinaryIO, Callable, Dict, List, Optional, Tuple, Type
+
+import anyio
+from fastapi import APIRouter, FastAPI, File, HTTPException, Query, UploadFile, status
+from pydantic import BaseModel, TypeAdapter, ValidationError
+from sqlalchemy import Column, Float, Integer, MetaData, String, Table, insert, select, update
+from sqlalchemy.engine import Engine
+
+jobs_metadata = MetaData()
+
+import_jobs = Table(
+    "import_jobs",
+    jobs_metadata,
+    Column("id", String, primary_key=True),
+    Column("filename", String),
+    Column("state", String, nullable=False),  # queued, running, done, failed, interrupted
+    Column("message", String),  # why a job failed or stopped
+    Column("size", Integer, nullable=False),  # bytes of the uploaded file
+    Column("bytes_read", Integer, nullable=False, default=0),
+    Column("rows_read", Integer, nullable=False, default=0),
+    Column("inserted", Integer, nullable=False, default=0),
+    Column("failed", Integer, nullable=False, default=0),
+    Column("created_at", Float, nullable=False),
+    Column("started_at", Float),
+    Column("finished_at", Float),
+)
+
+import_errors = Table(
+    "import_errors",
+    jobs_metadata,
+    Column("job_id", String, primary_key=True),
+    Column("line", Integer, primary_key=True),  # CSV line number (header = 1)
+    Column("error", String, nullable=False),
+)
+
+def _detach(spooled: Any) -> BinaryIO:
+    """
+    The job's own handle on an UploadFile's spooled file. FastAPI closes (and
+    thereby deletes) the upload once the response is sent, but the job reads
+    it afterwards: a dup()ed descriptor keeps the unlinked temp file alive.
+    """
+    rollover = getattr(spooled, "rollover", None)
+    if rollover is not None:
+        rollover()  # uploads under the spool limit are still in memory
+    file = os.fdopen(os.dup(spooled.fileno()), "rb")
+    file.seek(0)
+    return file
+
+
+class _Job:
+    """What the worker thread needs; the counters mirror the import_jobs row."""
+
+    def __init__(self, job_id: str, text: io.TextIOWrapper, reader: Any, header: List[str], size: int):
+        self.id = job_id
+        self.text = text
+        self.reader = reader
+        self.header = header
+        self.size = size
+        self.rows_read = self.inserted = self.failed = self.errors_stored = 0
+
+
+class CsvImporter:
+    """
+    Args:
+        engine: database holding `table`; the job tables are created there too.
+        table: target table; CSV columns are matched to `model` fields by name.
+        model: Pydantic model every row is validated against (e.g. BookCreate).
+        batch_rows: rows per validation call and per transaction.
+        max_errors: row errors stored per job (all of them are counted).
+        on_done: called with the final status of each finished job (from the
+            worker thread), e.g. to publish a change event.
+    """
+
+    def __init__(
+        self,
+        engine: Engine,
+        table: Table,
+        model: Type[BaseModel],
+        batch_rows: int = 5000,
+        max_errors: int = 1000,
+        on_done: Optional[Callable[[dict], None]] = None,
+    ):
+        self.engine = engine
+        self.table = table
+        self.adapter = TypeAdapter(List[model])
+        self.fields = list(model.model_fields)
+        self.required = [name for name, field in model.model_fields.items() if field.is_required()]
+        # INSERT compiled once; batches go to the driver's executemany()
+        compiled = insert(table).compile(dialect=engine.dialect, column_keys=self.fields)
+        self._insert_sql = str(compiled)
+        self._positions = [self.fields.index(key) for key in compiled.positiontup] if compiled.positional else None
+        self._processors = [table.c[name].type.bind_processor(engine.dialect) for name in self.fields]
+        self.batch_rows = batch_rows
+        self.max_errors = max_errors
+        self.on_done = on_done
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="csv-import")
+        self._stopping = threading.Event()
+        jobs_metadata.create_all(engine)
+
+    # -- jobs -------------------------------------------------------------
+    def start(self, upload: UploadFile) -> dict:
+        """Check the header, take over the spooled upload and queue the job."""
+        file = _detach(upload.file)
+        size = os.fstat(file.fileno()).st_size
+        text = io.TextIOWrapper(file, encoding="utf-8-sig", errors="replace", newline="")
+        reader = csv.reader(text)
+        try:
+            header = [name.strip() for name in next(reader, [])]
+        except csv.Error as exc:
+            text.close()
+            raise HTTPException(status.HTTP_422_UNPROCESSABLE_CONTENT, f"Not a CSV file: {exc}")
+        missing = [name for name in self.required if name not in header]
+        if missing:
+            text.close()
+            raise HTTPException(
+                status.HTTP_422_UNPROCESSABLE_CONTENT,
+                {"message": "CSV header is missing required columns", "missing": missing},
+            )
+
+        job = _Job(secrets.token_urlsafe(12), text, reader, header, size)
+        with self.engine.begin() as conn:
+            conn.execute(
+                insert(import_jobs).values(
+                    id=job.id, filename=upload.filename, state="queued", size=size, created_at=time.time()
+                )
+            )
+        self._executor.submit(self._run, job)
+        return {"job_id": job.id, "state": "queued"}
+
+    def status(self, job_id: str, errors_offset: int = 0, errors_limit: int = 100) -> dict:
+        with self.engine.connect() as conn:
+            job = conn.execute(select(import_jobs).where(import_jobs.c.id == job_id)).mappings().first()
+            if job is None:
+                raise HTTPException(status.HTTP_404_NOT_FOUND, "Import job not found")
+            errors = conn.execute(
+                select(import_errors.c.line, import_errors.c.error)
+                .where(import_errors.c.job_id == job_id)
+                .order_by(import_errors.c.line)
+                .offset(errors_offset)
+                .limit(errors_limit)
+            ).all()
+        info = dict(job)
+        info["progress"] = 1.0 if job["state"] == "done" else round(job["bytes_read"] / job["size"], 4) if job["size"] else 0.0
+        if job["started_at"]:
+            elapsed = (job["finished_at"] or time.time()) - job["started_at"]
+            info["rows_per_second"] = round(job["rows_read"] / elapsed) if elapsed > 0 else None
+        info["errors"] = [{"line": line, "error": error} for line, error in errors]
+        return info
+
+    def _run(self, job: _Job) -> None:
+        try:
+            if self._stopping.is_set():
+                self._finish(job, "interrupted", "Server shut down before the job started")
+                return
+            self._set(job, state="running", started_at=time.time())
+            reader, binary = job.reader, job.text.buffer
+            batch: List[Tuple[int, List[str]]] = []  # (line number, fields)
+            for row in reader:
+                batch.append((reader.line_num, row))
+                if len(batch) >= self.batch_rows:
+                    self._batch(job, batch, binary.tell())
+                    batch = []
+                    if self._stopping.is_set():
+                        self._finish(job, "interrupted", f"Server shut down after line {reader.line_num}")
+                        return
+            self._batch(job, batch, job.size)
+            self._finish(job, "done")
+        except Exception as exc:  # bad encoding, broken quoting, database errors
+            self._finish(job, "failed", f"{type(exc).__name__}: {exc}")
+        finally:
+            job.text.close()
+
+    def _validate(self, rows: List[dict], lines: List[int]) -> Tuple[List[BaseModel], List[Tuple[int, str]]]:
+        """One pydantic-core call per batch; only batches with bad rows are validated twice."""
+        try:
+            return self.adapter.validate_python(rows), []
+        except ValidationError as exc:
+            bad: Dict[int, List[str]] = {}
+            for error in exc.errors(include_url=False, include_input=False):
+                index, *loc = error["loc"]
+                bad.setdefault(index, []).append(f"{'.'.join(map(str, loc))}: {error['msg']}")
+            good = [row for index, row in enumerate(rows) if index not in bad]
+            return self.adapter.validate_python(good), [(lines[i], "; ".join(msgs)) for i, msgs in bad.items()]
+
+    def _parameters(self, items: List[BaseModel]) -> List[Any]:
+        """
+        Driver parameters for the precompiled INSERT, converted column by
+        column with the columns' bind processors: building them per row
+        through Connection.execute() cost more than parsing and validation.
+        """
+        columns = list(zip(*[tuple(item.__dict__.values()) for item in items]))
+        columns = [list(map(p, c)) if p is not None else c for p, c in zip(self._processors, columns)]
+        if self._positions is None:
+            return [dict(zip(self.fields, row)) for row in zip(*columns)]
+        return list(zip(*[columns[i] for i in self._positions]))
+
+    def _batch(self, job: _Job, batch: List[Tuple[int, List[str]]], position: int) -> None:
+        header, width = job.header, len(job.header)
+        batch = [(line, row) for line, row in batch if row]  # blank lines
+        errors = [(line, f"expected {width} fields, got {len(row)}") for line, row in batch if len(row) != width]
+        if errors:
+            batch = [(line, row) for line, row in batch if len(row) == width]
+        lines = [line for line, _ in batch]
+        items, invalid = self._validate([dict(zip(header, row)) for _, row in batch], lines) if batch else ([], [])
+        errors = sorted(errors + invalid)
+        stored = errors[: max(0, self.max_errors - job.errors_stored)]
+        job.rows_read += len(batch) + len(errors) - len(invalid)
+        job.inserted += len(items)
+        job.failed += len(errors)
+        job.errors_stored += len(stored)
+        with self.engine.begin() as conn:  # rows, errors and progress commit together
+            if items:
+                conn.exec_driver_sql(self._insert_sql, self._parameters(items))
+            if stored:
+                conn.execute(insert(import_errors), [{"job_id": job.id, "line": n, "error": e} for n, e in stored])
+            conn.execute(
+                update(import_jobs)
+                .where(import_jobs.c.id == job.id)
+                .values(bytes_read=position, rows_read=job.rows_read, inserted=job.inserted, failed=job.failed)
+            )
+
+    def _set(self, job: _Job, **values: Any) -> None:
+        with self.engine.begin() as conn:
+            conn.execute(update(import_jobs).where(import_jobs.c.id == job.id).values(**values))
+
+    def _finish(self, job: _Job, state: str, message: Optional[str] = None) -> None:
+        self._set(job, state=state, message=message, finished_at=time.time())
+        if self.on_done is not None:
+            self.on_done(self.status(job.id, errors_limit=0))
+
+    def close(self) -> None:
+        """Stop after the current batch; queued jobs are marked interrupted."""
+        self._stopping.set()
+        self._executor.shutdown(wait=True)
+
+    # -- app wiring -------------------------------------------------------
+    def install(self, app: FastAPI, path: str = "/import") -> "CsvImporter":
+        """Add POST `path` and GET `path`/{job_id}; stop jobs on shutdown."""
+        router = APIRouter(tags=["import"])
+
+        # Sync handler: reading the header touches the spooled file on disk
+        @router.post(path, status_code=status.HTTP_202_ACCEPTED)
+        def start_import(file: UploadFile = File(...)):
+            job = self.start(file)
+            return {**job, "status": f"{path}/{job['job_id']}"}
+
+        @router.get(path + "/{job_id}")
+        def import_status(
+            job_id: str,
+            errors_offset: int = Query(0, ge=0),
+            errors_limit: int = Query(100, ge=0, le=1000),
+        ):
+            return self.status(job_id, errors_offset, errors_limit)
+
+        app.include_router(router)
+        inner = app.router.lifespan_context
+
+        @asynccontextmanager
+        async def lifespan(app):
+            try:
+                async with inner(app) as state:
+                    yield state
+            finally:
+                await anyio.to_thread.run_sync(self.close)
+
+        app.router.lifespan_context = lifespan
+        return self
+
+
+# ------------------------------------------------------------------------------
+# Benchmark: per-row vs batch validation, then a full import
+# ------------------------------------------------------------------------------
+def benchmark(rows: int = 1_000_000) -> None:
+    import resource
+    import tempfile
+
+    from sqlalchemy import Boolean, create_engine
+
+    class BookCreate(BaseModel):
+        title: str
+        price: float
+        in_stock: bool
+
+    directory = tempfile.mkdtemp()
+    path = os.path.join(directory, "books.csv")
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["title", "price", "in_stock"])
+        for i in range(rows):
+            if i % 10_000 == 9_999:
+                writer.writerow([f"Book {i}", "free", "yes"])  # one bad price per 10k rows
+            else:
+                writer.writerow([f"Book {i}, vol. 2", f"{(i % 9000) / 100 + 5}", "true" if i % 3 else "false"])
+    print(f"{rows:,} rows, {os.path.getsize(path) / 1e6:.0f} MB CSV")
+
+    sample = [{"title": f"Book {i}", "price": "12.5", "in_stock": "true"} for i in range(100_000)]
+    start = time.perf_counter()
+    for row in sample:
+        BookCreate(**row)
+    per_row = time.perf_counter() - start
+    start = time.perf_counter()
+    TypeAdapter(List[BookCreate]).validate_python(sample)
+    batched = time.perf_counter() - start
+    print(f"validate 100k rows: per row {per_row * 1000:.0f} ms, one batch {batched * 1000:.0f} ms")
+
+    engine = create_engine(f"sqlite:///{os.path.join(directory, 'books.db')}")
+    books = Table(
+        "books", MetaData(),
+        Column("id", Integer, primary_key=True), Column("title", String),
+        Column("price", Float), Column("in_stock", Boolean),
+    )
+    books.metadata.create_all(engine)
+    done = threading.Event()
+    importer = CsvImporter(engine, books, BookCreate, on_done=lambda info: done.set())
+
+    class Upload:  # what UploadFile hands over: a spooled file
+        filename = "books.csv"
+        file = open(path, "rb")
+
+    start = time.perf_counter()
+    job = importer.start(Upload)  # type: ignore[arg-type]
+    while not done.wait(2):
+        info = importer.status(job["job_id"], errors_limit=0)
+        print(f"  {info['progress']:6.1%}  {info['rows_read']:>10,} rows")
+    seconds = time.perf_counter() - start
+    info = importer.status(job["job_id"], errors_limit=1)
+    importer.close()
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(
+        f"import: {info['state']}, {info['inserted']:,} inserted, {info['failed']:,} failed "
+        f"in {seconds:.1f}s ({rows / seconds:,.0f} rows/s), peak RSS {rss:.0f} MB"
+    )
+    print(f"first error: {info['errors'][0]}")
+
+
+if __name__ == "__main__":
+    import sys
+
+    benchmark(int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000)
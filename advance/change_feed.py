@@ -0,0 +1,400 @@
+"""
+Change Feed over Server-Sent Events and WebSockets
+
+Description:
+Writers publish change events ("created", "updated", ...) to an in-process
+hub; clients follow them live instead of polling list endpoints.
+
+- Publishing never waits for readers: `publish()` appends the event to one
+  shared log and schedules a single wake-up, O(1) whatever the number of
+  subscribers (from the event loop or a threadpool handler alike). Each
+  subscriber only keeps its position in the log, and each event is
+  encoded once; the same bytes go to every subscriber.
+- Slow consumers: a subscriber may fall at most `buffer` events behind.
+  Past that it is dropped with a final `lagged` event; it reconnects with
+  its last event id and catches up from history. Subscribers that asked
+  for `coalesce` skip ahead instead, receiving only the latest pending
+  event per key (e.g. per book id).
+- Resume: the hub keeps the last `history` events. SSE clients send
+  `Last-Event-ID` automatically on reconnect (or pass `?last_event_id=`);
+  if that id is no longer in history the stream starts with a `reset`
+  event (re-fetch the full list, then follow).
+- Several workers (uvicorn --workers N) on one host: with `peers_dir` set,
+  every worker binds a Unix datagram socket in that directory and sends
+  each event it publishes to all the others, so subscribers on any worker
+  see every write.
+
+How to use:
+    from change_feed import ChangeHub
+
+    hub = ChangeHub(peers_dir=os.getenv("CHANGE_FEED_DIR"))
+    hub.install(app, path="/books/changes")   # SSE at the path, WebSocket at <path>/ws
+
+    @app.post("/books")
+    def create_book(...):
+        ...
+        hub.publish("created", book.model_dump(), key=book.id)
+
+Benchmark (publish -> delivered latency and subscribers per worker):
+    python change_feed.py
+"""
+
+import asyncio
+import json
+import os
+import secrets
+import socket
+import threading
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Deque, Dict, Hashable, List, Optional
+
+from fastapi import APIRouter, FastAPI, Header, Query, WebSocket, WebSocketDisconnect
+from fastapi.responses import StreamingResponse
+
+
+def _running_loop() -> Optional[asyncio.AbstractEventLoop]:
+    try:
+        return asyncio.get_running_loop()
+    except RuntimeError:
+        return None
+
+
+class ChangeEvent:
+    __slots__ = ("id", "type", "key", "data", "_json", "_sse")
+
+    def __init__(self, id: str, type: str, key: Optional[Hashable], data: Any):
+        self.id = id
+        self.type = type
+        self.key = key
+        self.data = data
+        self._json: Optional[str] = None
+        self._sse: Optional[bytes] = None
+
+    def json(self) -> str:
+        """{"id", "type", "key", "data"}; encoded once, shared by all subscribers."""
+        if self._json is None:
+            self._json = json.dumps({"id": self.id, "type": self.type, "key": self.key, "data": self.data})
+        return self._json
+
+    def sse(self) -> bytes:
+        if self._sse is None:
+            self._sse = f"id: {self.id}\nevent: {self.type}\ndata: {self.json()}\n\n".encode()
+        return self._sse
+
+
+class ChangeHub:
+    def __init__(
+        self,
+        buffer: int = 256,
+        history: int = 10_000,
+        peers_dir: Optional[str] = None,
+        keepalive: float = 15.0,
+    ):
+        self.buffer = buffer  # how far (in events) a subscriber may fall behind
+        self.keepalive = keepalive
+        self.peers_dir = peers_dir
+        self.origin = secrets.token_hex(4)
+        # One shared log; subscribers only keep a position in it
+        self.log: Deque[ChangeEvent] = deque(maxlen=max(history, buffer))
+        self._head = 0  # position of the newest event (1-based delivery count)
+        self._positions: Dict[str, int] = {}  # event id -> position, for resume
+        self._signal: Optional[asyncio.Event] = None
+        self._wake_scheduled = False
+        self._closed = False
+        self._counter = 0
+        self._counter_lock = threading.Lock()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._socket: Optional[socket.socket] = None
+        self._socket_path: Optional[str] = None
+        self._peers: List[str] = []
+        self._peers_checked = 0.0
+        self.subscribers = 0
+        self.published = 0
+        self.dropped_subscribers = 0
+        self.coalesced_events = 0
+        self.peer_send_failures = 0
+
+    # -- lifecycle ----------------------------------------------------------
+    def install(self, app: FastAPI, path: str = "/changes") -> "ChangeHub":
+        """Add SSE (`path`), WebSocket (`path`/ws) and /stats/changes; start with the app."""
+        router = APIRouter()
+        router.add_api_route(path, self.sse_endpoint, methods=["GET"], tags=["changes"])
+        router.add_api_websocket_route(f"{path}/ws", self.websocket_endpoint)
+        router.add_api_route("/stats/changes", self.stats, methods=["GET"], tags=["metrics"])
+        app.include_router(router)
+        inner = app.router.lifespan_context
+
+        @asynccontextmanager
+        async def lifespan(app):
+            async with self:
+                async with inner(app) as state:
+                    yield state
+
+        app.router.lifespan_context = lifespan
+        return self
+
+    async def __aenter__(self) -> "ChangeHub":
+        self._loop = asyncio.get_running_loop()
+        self._signal = asyncio.Event()
+        self._closed = False
+        if self.peers_dir:
+            os.makedirs(self.peers_dir, exist_ok=True)
+            self._socket_path = os.path.join(self.peers_dir, f"{os.getpid()}-{self.origin}.sock")
+            self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+            self._socket.bind(self._socket_path)
+            self._socket.setblocking(False)
+            self._loop.add_reader(self._socket.fileno(), self._receive)
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        self._closed = True  # ends open streams
+        self._wake()
+        if self._socket is not None:
+            self._loop.remove_reader(self._socket.fileno())
+            self._socket.close()
+            os.unlink(self._socket_path)
+            self._socket = None
+        self._loop = None
+
+    # -- publishing ---------------------------------------------------------
+    def publish(self, type: str, data: Any, key: Optional[Hashable] = None) -> ChangeEvent:
+        """
+        Thread-safe and O(1) whatever the number of subscribers: the event is
+        appended to the shared log and readers are woken on the next loop tick.
+        Returns the event (its id is the resume token).
+        """
+        with self._counter_lock:
+            self._counter += 1
+            event = ChangeEvent(f"{self.origin}.{self._counter}", type, key, data)
+        self.published += 1
+        loop = self._loop
+        if loop is not None:
+            if _running_loop() is loop:
+                self._append(event)
+            else:
+                loop.call_soon_threadsafe(self._append, event)
+        if self._socket is not None:
+            self._send_to_peers(event)
+        return event
+
+    def _append(self, event: ChangeEvent) -> None:
+        """On the event loop: add to the log, schedule one wake-up for all readers."""
+        if len(self.log) == self.log.maxlen:
+            self._positions.pop(self.log[0].id, None)
+        self.log.append(event)
+        self._head += 1
+        self._positions[event.id] = self._head
+        if not self._wake_scheduled:
+            self._wake_scheduled = True
+            self._loop.call_soon(self._wake)
+
+    def _wake(self) -> None:
+        self._wake_scheduled = False
+        signal, self._signal = self._signal, asyncio.Event()
+        signal.set()
+
+    # -- cross-worker fan-out ------------------------------------------------
+    def _send_to_peers(self, event: ChangeEvent) -> None:
+        now = time.monotonic()
+        if now - self._peers_checked > 1.0:
+            self._peers = [
+                os.path.join(self.peers_dir, name)
+                for name in os.listdir(self.peers_dir)
+                if name.endswith(".sock") and os.path.join(self.peers_dir, name) != self._socket_path
+            ]
+            self._peers_checked = now
+        payload = event.json().encode()
+        for peer in self._peers:
+            try:
+                self._socket.sendto(payload, peer)
+            except OSError as exc:
+                # Full peer buffer (that worker is stuck) or a worker that exited
+                self.peer_send_failures += 1
+                if isinstance(exc, (ConnectionRefusedError, FileNotFoundError)):
+                    self._peers_checked = 0.0
+
+    def _receive(self) -> None:
+        while True:
+            try:
+                payload = self._socket.recv(65536)
+            except BlockingIOError:
+                return
+            message = json.loads(payload)
+            event = ChangeEvent(message["id"], message["type"], message["key"], message["data"])
+            event._json = payload.decode()
+            self._append(event)
+
+    # -- subscribing --------------------------------------------------------
+    async def subscribe(self, last_event_id: Optional[str] = None, coalesce: bool = False) -> AsyncIterator[ChangeEvent]:
+        """
+        Events after `last_event_id` (from history), then live ones. A reader
+        more than `buffer` events behind gets a final `lagged` event, or, with
+        `coalesce`, only the latest pending event per key.
+        """
+        position = self._head  # position of the last event this reader has seen
+        if last_event_id is not None:
+            resume = self._positions.get(last_event_id)
+            if resume is None:
+                yield ChangeEvent(last_event_id, "reset", None, {"reason": "last_event_id is no longer in history"})
+            else:
+                position = resume
+        last_id = last_event_id
+        self.subscribers += 1
+        try:
+            while not self._closed:
+                if position == self._head:
+                    await self._signal.wait()
+                    continue
+                oldest = self._head - len(self.log)  # position just before log[0]
+                if self._head - position > self.buffer or position < oldest:
+                    if not coalesce or position < oldest:
+                        self.dropped_subscribers += 1
+                        yield ChangeEvent(last_id or "", "lagged", None, {"resume_from": last_id})
+                        return
+                    pending = list(self.log)[position - oldest:]
+                    latest = {(e.key if e.key is not None else ("id", e.id)): e for e in pending}
+                    keep = {id(e) for e in latest.values()}
+                    self.coalesced_events += len(pending) - len(keep)
+                    position = self._head
+                    for event in [e for e in pending if id(e) in keep]:
+                        last_id = event.id
+                        yield event
+                    continue
+                event = self.log[position - oldest]
+                position += 1
+                last_id = event.id
+                yield event
+        finally:
+            self.subscribers -= 1
+
+    # -- endpoints ------------------------------------------------------------
+    async def sse_endpoint(
+        self,
+        coalesce: bool = Query(False, description="Keep only the latest event per key when behind"),
+        last_event_id: Optional[str] = Query(None),
+        last_event_id_header: Optional[str] = Header(None, alias="Last-Event-ID"),
+    ):
+        events = self.subscribe(last_event_id or last_event_id_header, coalesce)
+
+        async def stream():
+            yield b"retry: 1000\n\n"
+            iterator = events.__aiter__()
+            next_event = asyncio.ensure_future(iterator.__anext__())
+            try:
+                while True:
+                    done, _ = await asyncio.wait({next_event}, timeout=self.keepalive)
+                    if not done:
+                        yield b": keepalive\n\n"
+                        continue
+                    try:
+                        event = next_event.result()
+                    except StopAsyncIteration:
+                        return
+                    yield event.sse()
+                    next_event = asyncio.ensure_future(iterator.__anext__())
+            finally:
+                next_event.cancel()
+                try:
+                    await next_event  # the generator must be idle before it can be closed
+                except (asyncio.CancelledError, StopAsyncIteration):
+                    pass
+                await events.aclose()
+
+        return StreamingResponse(
+            stream(),
+            media_type="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        )
+
+    async def websocket_endpoint(
+        self,
+        websocket: WebSocket,
+        coalesce: bool = False,
+        last_event_id: Optional[str] = None,
+    ) -> None:
+        await websocket.accept()
+        events = self.subscribe(last_event_id, coalesce)
+        try:
+            async for event in events:
+                await websocket.send_text(event.json())
+        except WebSocketDisconnect:
+            pass
+        finally:
+            await events.aclose()
+
+    async def stats(self) -> dict:
+        return {
+            "published": self.published,
+            "subscribers": self.subscribers,
+            "dropped_subscribers": self.dropped_subscribers,
+            "coalesced_events": self.coalesced_events,
+            "history": len(self.log),
+            "peers": len(self._peers),
+            "peer_send_failures": self.peer_send_failures,
+        }
+
+
+# ------------------------------------------------------------------------------
+# Benchmark: publish -> delivered latency vs number of subscribers
+# ------------------------------------------------------------------------------
+def benchmark(subscriber_counts=(1, 100, 1_000, 10_000), events: int = 200) -> None:
+    import resource
+    import statistics
+    import tracemalloc
+
+    async def run(count: int) -> None:
+        hub = ChangeHub(buffer=256)
+        async with hub:
+            received = [0] * count
+            done = asyncio.Event()
+            latencies: List[float] = []
+            published_at: Dict[str, float] = {}
+
+            async def consume(i: int) -> None:
+                async for event in hub.subscribe():
+                    received[i] += 1
+                    if i == count - 1:  # the last subscriber to be served
+                        latencies.append(time.perf_counter() - published_at[event.id])
+                        if received[i] == events:
+                            done.set()
+
+            tracemalloc.start()
+            before = tracemalloc.get_traced_memory()[0]
+            tasks = [asyncio.create_task(consume(i)) for i in range(count)]
+            await asyncio.sleep(0)
+            while hub.subscribers < count:
+                await asyncio.sleep(0.01)
+            per_subscriber = (tracemalloc.get_traced_memory()[0] - before) / count
+            tracemalloc.stop()
+
+            publish_cost = []
+            for n in range(events):
+                start = time.perf_counter()
+                event = hub.publish("created", {"id": n, "title": f"Book {n}", "price": 9.99}, key=n)
+                publish_cost.append(time.perf_counter() - start)
+                published_at[event.id] = start
+                if n % 10 == 9:
+                    await asyncio.sleep(0)  # let subscribers drain, as a real server would
+            await asyncio.wait_for(done.wait(), 60)
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+        ordered = sorted(latencies)
+        print(
+            f"{count:>7,} subscribers   publish {statistics.fmean(publish_cost) * 1e6:7.1f} us   "
+            f"delivered to all: p50 {ordered[len(ordered) // 2] * 1000:7.2f} ms  "
+            f"p99 {ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))] * 1000:7.2f} ms   "
+            f"{per_subscriber / 1024:.1f} KB/subscriber   dropped {hub.dropped_subscribers}"
+        )
+
+    print(f"{events} events per run, bursts of 10, one event loop")
+    for count in subscriber_counts:
+        asyncio.run(run(count))
+    print(f"max RSS {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:.0f} MB")
+
+
+if __name__ == "__main__":
+    benchmark()
@@ -5,13 +5,23 @@ Database Integration Example (SQLAlchemy + FastAPI)
 Run with:     uvicorn database_integration:app --reload
 """
 
+import os
 from typing import Generator, List
 
-from fastapi import FastAPI, Depends, HTTPException, status
+from fastapi import FastAPI, Depends, HTTPException, Query, Request, status
 from pydantic import BaseModel, ConfigDict
 from sqlalchemy import create_engine, Column, Integer, String, Float, Boolean
 from sqlalchemy.orm import sessionmaker, declarative_base, Session
 
+from bulk_import import CsvImporter
+from change_feed import ChangeHub
+from compression import CompressionMiddleware
+from export import Exporter
+from idempotency import IdempotencyMiddleware
+from projection import FieldSet, Projection
+from runtime_metrics import RuntimeMonitor
+from single_flight import SingleFlight
+
 # -------------------------------------------------------------------
 # Database setup
 # -------------------------------------------------------------------
@@ -39,7 +49,7 @@ class BookORM(Base):
     id = Column(Integer, primary_key=True, index=True)
     title = Column(String, index=True, nullable=False)
     price = Column(Float, nullable=False)
-    in_stock = Column(Boolean, default=True)
+    in_stock = Column(Boolean, nullable=False, default=True)
 
 
 # Create tables
@@ -81,6 +91,18 @@ def get_session() -> Generator[Session, None, None]:
 # -------------------------------------------------------------------
 app = FastAPI(title="SQLAlchemy Integration Example")
 
+# Retried POST /books with the same Idempotency-Key replays the first response
+app.add_middleware(IdempotencyMiddleware, paths={"/books"})
+# gzip/brotli/zstd for large responses such as GET /books and /openapi.json
+# (added last = outermost, so replayed responses are compressed per client)
+app.add_middleware(CompressionMiddleware, minimum_size=500)
+# Threadpool capacity (THREADPOOL_SIZE) and saturation metrics at /stats/runtime
+runtime = RuntimeMonitor(threadpool_size=int(os.getenv("THREADPOOL_SIZE", "40"))).install(app)
+# Live change feed instead of polling GET /books: SSE at /books/changes, WebSocket
+# at /books/changes/ws. CHANGE_FEED_DIR lets `uvicorn --workers N` share events.
+# (Installed before /books/{book_id} so that route does not capture "changes".)
+changes = ChangeHub(peers_dir=os.getenv("CHANGE_FEED_DIR")).install(app, path="/books/changes")
+
 
 @app.post("/books", response_model=Book, status_code=status.HTTP_201_CREATED)
 def create_book(book: BookCreate, db: Session = Depends(get_session)):
@@ -88,23 +110,65 @@ def create_book(book: BookCreate, db: Session = Depends(get_session)):
     db.add(row)
     db.commit()
     db.refresh(row)
-    return row
+    created = Book.model_validate(row)
+    changes.publish("created", created.model_dump(), key=created.id)
+    return created
+
+
+# ?fields=id,title selects only those columns and serializes only those fields.
+# trusted: rows come from our own typed NOT NULL columns, so they are serialized
+# without re-validation (request bodies such as BookCreate are still validated).
+book_fields = FieldSet(Book, BookORM, trusted=True)
 
 
 @app.get("/books", response_model=List[Book])
-def list_books(db: Session = Depends(get_session)):
-    return db.query(BookORM).all()
+def list_books(db: Session = Depends(get_session), proj: Projection = Depends(book_fields)):
+    return proj.render(db.execute(proj.select()))
+
+
+# CSV upload imported by a background job: POST /books/import -> job id,
+# GET /books/import/{job_id} -> progress and row errors. Subscribers of the
+# change feed get one "imported" event per job instead of one per row.
+importer = CsvImporter(
+    engine, BookORM.__table__, BookCreate, on_done=lambda job: changes.publish("imported", job, key=job["id"])
+).install(app, path="/books/import")
+
+
+# Whole-table download streamed from a server-side cursor in chunks:
+# ?format=csv|ndjson (compressed per Accept-Encoding) or arrow|parquet (needs
+# pyarrow), honoring ?fields= too. Declared before /books/{book_id}.
+book_export = Exporter(engine)
+
+
+@app.get("/books/export")
+def export_books(
+    request: Request,
+    format: str = Query("ndjson", pattern="^(csv|ndjson|arrow|parquet)$"),
+    proj: Projection = Depends(book_fields),
+):
+    stmt = proj.select().order_by(BookORM.id)
+    return book_export.response(stmt, format, request.headers.get("accept-encoding", ""), "books")
+
+
+# Concurrent GET /books/{id} for the same id share one database query
+book_flights = SingleFlight("books")
 
 
 @app.get("/books/{book_id}", response_model=Book)
-def get_book(book_id: int, db: Session = Depends(get_session)):
-    book = db.query(BookORM).filter(BookORM.id == book_id).first()
+@book_flights.coalesce(key=("book_id", "proj"))
+def get_book(book_id: int, db: Session = Depends(get_session), proj: Projection = Depends(book_fields)):
+    book = db.execute(proj.select().where(BookORM.id == book_id)).first()
     if not book:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Book not found",
         )
-    return book
+    return proj.render_one(book)
+
+
+@app.get("/stats/single-flight")
+def single_flight_stats():
+    return book_flights.stats()
 
 
 # -------------------------------------------------------------------
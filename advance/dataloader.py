@@ -0,0 +1,173 @@
+"""
+Request-Scoped Batch Loading (DataLoader) and SQL Query Counting
+
+Description:
+Removes N+1 queries from list views: instead of one SELECT per parent row
+("items of order 1", "items of order 2", ...), every `load(key)` awaited in
+the same event-loop tick is collected and fetched with ONE `IN (...)` query.
+
+- `DataLoader(batch_fn)`: `batch_fn(keys) -> {key: value}` runs in a worker
+  thread (sync SQLAlchemy is fine). Keys missing from the result get
+  `default`. Results are cached for the loader's lifetime, i.e. one request
+  when the loader comes from a dependency.
+- `QueryCounter`: counts the SQL statements an engine executes per request.
+  `QueryCountMiddleware` adds them to every response as `X-SQL-Queries`,
+  so a test can assert that a list view stays at 2 queries.
+
+How to use:
+    from dataloader import DataLoader, QueryCounter, QueryCountMiddleware
+
+    queries = QueryCounter(engine)
+    app.add_middleware(QueryCountMiddleware, counter=queries)
+
+    def items_loader(db: Session = Depends(get_session)) -> DataLoader:
+        return DataLoader(lambda ids: load_items(db, ids), default=[])
+
+    @app.get("/orders")
+    async def orders(items: DataLoader = Depends(items_loader)):
+        ...
+        await asyncio.gather(*(items.load(o.id) for o in orders))
+"""
+
+import asyncio
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Hashable, Iterable, Iterator, List, Mapping, Optional, Set
+
+import anyio
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+
+class DataLoader:
+    def __init__(
+        self,
+        batch_fn: Callable[[List[Hashable]], Mapping[Hashable, Any]],
+        default: Any = None,
+        max_batch_size: int = 500,
+    ):
+        self.batch_fn = batch_fn
+        self.default = default
+        self.max_batch_size = max_batch_size  # stays under SQLite's bound-parameter limit
+        self._cache: Dict[Hashable, asyncio.Future] = {}
+        self._pending: List[Hashable] = []
+        self._tasks: Set[asyncio.Task] = set()  # the loop only keeps weak references to tasks
+        self.batches = 0
+
+    async def load(self, key: Hashable) -> Any:
+        future = self._cache.get(key)
+        if future is None:
+            loop = asyncio.get_running_loop()
+            future = self._cache[key] = loop.create_future()
+            self._pending.append(key)
+            if len(self._pending) == 1:
+                # Runs after every task already scheduled in this tick has queued its key
+                loop.call_soon(self._dispatch)
+        # Shared by every load() of this key: one cancelled caller must not cancel it for the others
+        return await asyncio.shield(future)
+
+    async def load_many(self, keys: Iterable[Hashable]) -> List[Any]:
+        return list(await asyncio.gather(*(self.load(key) for key in keys)))
+
+    def _dispatch(self) -> None:
+        keys, self._pending = self._pending, []
+        for start in range(0, len(keys), self.max_batch_size):
+            task = asyncio.ensure_future(self._run(keys[start:start + self.max_batch_size]))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, keys: List[Hashable]) -> None:
+        self.batches += 1
+        try:
+            results = await anyio.to_thread.run_sync(self.batch_fn, keys)
+        except Exception as exc:
+            for key in keys:
+                future = self._cache.pop(key)  # not cached: a retry may succeed
+                if not future.done():
+                    future.set_exception(exc)
+            return
+        for key in keys:
+            future = self._cache[key]
+            if not future.done():
+                future.set_result(results.get(key, self.default))
+
+
+def group_by(rows: Iterable[Any], attr: str) -> Dict[Hashable, List[Any]]:
+    """Rows of a one-to-many IN query -> {parent key: [rows]} for a batch_fn."""
+    grouped: Dict[Hashable, List[Any]] = defaultdict(list)
+    for row in rows:
+        grouped[getattr(row, attr)].append(row)
+    return grouped
+
+
+# ------------------------------------------------------------------------------
+# Per-request SQL query counting
+# ------------------------------------------------------------------------------
+class QueryStats:
+    __slots__ = ("statements",)
+
+    def __init__(self):
+        self.statements: List[str] = []
+
+    @property
+    def count(self) -> int:
+        return len(self.statements)
+
+
+_current: ContextVar[Optional[QueryStats]] = ContextVar("sql_query_stats", default=None)
+
+
+class QueryCounter:
+    """
+    Counts statements executed by `engine` into the current QueryStats.
+    The stats object is shared by the request's context copies, so
+    statements run in threadpool workers are counted too.
+    """
+
+    def __init__(self, engine: Engine):
+        event.listen(engine, "before_cursor_execute", self._on_execute)
+
+    @staticmethod
+    def _on_execute(conn, cursor, statement, parameters, context, executemany) -> None:
+        stats = _current.get()
+        if stats is not None:
+            stats.statements.append(statement)  # list.append is atomic under the GIL
+
+    @contextmanager
+    def track(self) -> Iterator[QueryStats]:
+        """Count statements outside a request (scripts, tests)."""
+        stats = QueryStats()
+        token = _current.set(stats)
+        try:
+            yield stats
+        finally:
+            _current.reset(token)
+
+
+class QueryCountMiddleware:
+    """Adds `X-SQL-Queries: <n>` to every HTTP response."""
+
+    def __init__(self, app, counter: QueryCounter, header: str = "x-sql-queries"):
+        self.app = app
+        self.counter = counter
+        self.header = header.encode()
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        stats = QueryStats()
+        token = _current.set(stats)
+
+        async def send_with_count(message):
+            if message["type"] == "http.response.start":
+                headers = list(message.get("headers", []))
+                headers.append((self.header, str(stats.count).encode()))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_count)
+        finally:
+            _current.reset(token)
@@ -0,0 +1,333 @@
+"""
+Cursor-Paginated Feed with Fan-Out-on-Write Timelines
+
+Description:
+A home timeline ("posts by the people I follow", newest first) whose pages
+cost the same at any depth.
+
+- Items live in SQLite with an AUTOINCREMENT id, so ids only ever grow and
+  "newer than" is "larger id". Pages use keyset pagination (id < cursor),
+  never OFFSET, so page 10,000 does not scan the 199,980 rows before it.
+- Cursors are opaque (base64url of the last id); clients pass them back
+  unchanged.
+- Fan-out-on-write: posting appends the item id to each follower's
+  in-memory timeline (bounded to `timeline_size` ids; least recently read
+  timelines are evicted after `max_timelines`).
+- Timelines are per process. On read, each one catches up on ids newer than
+  the last it saw in the database (one indexed query), so posts handled by
+  other workers (`uvicorn --workers N`) show up too.
+- Heavy producers (>= `heavy_threshold` followers) are not fanned out;
+  their items are merged in on read with one indexed query.
+- Pages older than a cached timeline reaches fall back to the database
+  (same keyset query), so depth is unbounded.
+
+How to use:
+    from feed import FeedService
+
+    feed = FeedService("./feed.db")
+    feed.follow("alice", "bob")
+    feed.post("bob", "hello")
+    page = feed.page("alice", limit=20, cursor=None)   # {"items": [...], "next_cursor": ...}
+
+Benchmark (page 1 vs page 10,000, keyset vs OFFSET):
+    python feed.py
+"""
+
+import base64
+import bisect
+import heapq
+import sqlite3
+import struct
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Set
+
+from fastapi import HTTPException, status
+
+
+def encode_cursor(item_id: int) -> str:
+    return base64.urlsafe_b64encode(struct.pack(">Q", item_id)).rstrip(b"=").decode()
+
+
+def decode_cursor(cursor: str) -> int:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        (item_id,) = struct.unpack(">Q", raw)
+    except (ValueError, struct.error):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+    return item_id
+
+
+class Timeline:
+    """
+    Ascending item ids; every fanned-out item with id >= `floor` is present.
+    `checked` is the newest id read from the database: ids commit in order,
+    so nothing older than it can still appear there.
+    """
+
+    __slots__ = ("ids", "floor", "checked")
+
+    def __init__(self, ids: List[int], floor: int):
+        self.ids = ids
+        self.floor = floor
+        self.checked = ids[-1] if ids else 0
+
+    def insert(self, item_id: int, size: int) -> None:
+        """Add one id in order (concurrent posts can arrive out of order), keeping about `size` ids."""
+        index = bisect.bisect_left(self.ids, item_id)
+        if index < len(self.ids) and self.ids[index] == item_id:
+            return  # already there (fanned out and caught up)
+        self.ids.insert(index, item_id)
+        if len(self.ids) > 2 * size:
+            del self.ids[:-size]
+            self.floor = self.ids[0]
+
+
+class FeedService:
+    def __init__(
+        self,
+        path: str = "./feed.db",
+        timeline_size: int = 1000,
+        max_timelines: int = 10_000,
+        heavy_threshold: int = 10_000,
+    ):
+        self.path = path
+        self.timeline_size = timeline_size
+        self.max_timelines = max_timelines
+        self.heavy_threshold = heavy_threshold
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._timelines: "OrderedDict[str, Timeline]" = OrderedDict()
+
+        conn = self._conn()
+        conn.executescript(
+            "CREATE TABLE IF NOT EXISTS feed_items ("
+            " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+            " author TEXT NOT NULL,"
+            " body TEXT NOT NULL,"
+            " created_at REAL NOT NULL);"
+            "CREATE INDEX IF NOT EXISTS ix_feed_items_author ON feed_items (author, id);"
+            "CREATE TABLE IF NOT EXISTS follows ("
+            " follower TEXT NOT NULL,"
+            " followee TEXT NOT NULL,"
+            " PRIMARY KEY (follower, followee));"
+            "CREATE INDEX IF NOT EXISTS ix_follows_followee ON follows (followee, follower);"
+        )
+        self._follower_counts: Dict[str, int] = dict(
+            conn.execute("SELECT followee, COUNT(*) FROM follows GROUP BY followee").fetchall()
+        )
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def is_heavy(self, author: str) -> bool:
+        return self._follower_counts.get(author, 0) >= self.heavy_threshold
+
+    # -- social graph -----------------------------------------------------
+    def follow(self, follower: str, followee: str) -> None:
+        cur = self._conn().execute(
+            "INSERT OR IGNORE INTO follows (follower, followee) VALUES (?, ?)", (follower, followee)
+        )
+        if cur.rowcount:
+            with self._lock:
+                self._follower_counts[followee] = self._follower_counts.get(followee, 0) + 1
+                self._timelines.pop(follower, None)  # rebuilt with the new followee on next read
+
+    def unfollow(self, follower: str, followee: str) -> None:
+        cur = self._conn().execute(
+            "DELETE FROM follows WHERE follower = ? AND followee = ?", (follower, followee)
+        )
+        if cur.rowcount:
+            with self._lock:
+                was_heavy = self.is_heavy(followee)
+                self._follower_counts[followee] -= 1
+                self._timelines.pop(follower, None)
+                if was_heavy and not self.is_heavy(followee):
+                    # Its past items were never fanned out: rebuild its followers' timelines
+                    for (user,) in self._conn().execute(
+                        "SELECT follower FROM follows WHERE followee = ?", (followee,)
+                    ):
+                        self._timelines.pop(user, None)
+
+    def followees(self, user: str) -> List[str]:
+        rows = self._conn().execute("SELECT followee FROM follows WHERE follower = ?", (user,))
+        return [row[0] for row in rows]
+
+    # -- write path -------------------------------------------------------
+    def post(self, author: str, body: str) -> dict:
+        created_at = time.time()
+        conn = self._conn()
+        item_id = conn.execute(
+            "INSERT INTO feed_items (author, body, created_at) VALUES (?, ?, ?)",
+            (author, body, created_at),
+        ).lastrowid
+        if not self.is_heavy(author):
+            followers = conn.execute("SELECT follower FROM follows WHERE followee = ?", (author,))
+            with self._lock:
+                for (user,) in followers:
+                    timeline = self._timelines.get(user)
+                    if timeline is None:
+                        continue  # not cached: built from the database when read
+                    timeline.insert(item_id, self.timeline_size)
+        return {"id": item_id, "author": author, "body": body, "created_at": created_at}
+
+    # -- read path --------------------------------------------------------
+    def _timeline(self, user: str, light: List[str]) -> Timeline:
+        with self._lock:
+            timeline = self._timelines.get(user)
+            if timeline is not None:
+                self._timelines.move_to_end(user)
+                return timeline
+        ids = self._query_ids(light, before=None, limit=self.timeline_size)
+        ids.reverse()
+        floor = ids[0] if len(ids) == self.timeline_size else 0
+        timeline = Timeline(ids, floor)
+        with self._lock:
+            self._timelines[user] = timeline
+            if len(self._timelines) > self.max_timelines:
+                self._timelines.popitem(last=False)
+        return timeline
+
+    def _catch_up(self, timeline: Timeline, light: List[str]) -> None:
+        """
+        Add items committed since `timeline.checked`: posts handled by other
+        processes, and local ones that fanned out before the timeline was
+        installed. Local posts from then on are fanned out into it directly.
+        """
+        newer = self._query_ids(light, before=None, limit=-1, after=timeline.checked)
+        if newer:
+            with self._lock:
+                for item_id in reversed(newer):
+                    timeline.insert(item_id, self.timeline_size)
+                timeline.checked = max(timeline.checked, newer[0])
+
+    def _query_ids(self, authors: List[str], before: Optional[int], limit: int, after: int = 0) -> List[int]:
+        """Newest-first ids by `authors`, between `after` and `before` (index range scan per author)."""
+        if not authors:
+            return []
+        marks = ",".join("?" * len(authors))
+        rows = self._conn().execute(
+            f"SELECT id FROM feed_items WHERE author IN ({marks}) AND id > ? AND id < ? ORDER BY id DESC LIMIT ?",
+            (*authors, after, before if before is not None else 2**63 - 1, limit),
+        ).fetchall()
+        return [row[0] for row in rows]
+
+    def page(self, user: str, limit: int = 20, cursor: Optional[str] = None) -> dict:
+        before = decode_cursor(cursor) if cursor else None
+        followees = self.followees(user)
+        heavy = [a for a in followees if self.is_heavy(a)]
+        light = [a for a in followees if not self.is_heavy(a)]
+
+        # Light producers: from the precomputed timeline, then the database below its floor
+        timeline = self._timeline(user, light)
+        self._catch_up(timeline, light)
+        ids = timeline.ids
+        end = bisect.bisect_left(ids, before) if before is not None else len(ids)
+        cached = ids[max(0, end - limit):end][::-1]
+        if len(cached) < limit and timeline.floor:
+            older = min(before, timeline.floor) if before is not None else timeline.floor
+            cached += self._query_ids(light, older, limit - len(cached))
+
+        # Heavy producers: merged on read
+        pulled = self._query_ids(heavy, before, limit)
+
+        merged: List[int] = []
+        seen: Set[int] = set()
+        for item_id in heapq.merge(cached, pulled, reverse=True):
+            if item_id not in seen:  # a producer that turned heavy may be in both
+                seen.add(item_id)
+                merged.append(item_id)
+                if len(merged) == limit:
+                    break
+
+        items = self._hydrate(merged)
+        next_cursor = encode_cursor(merged[-1]) if len(merged) == limit else None
+        return {"items": items, "next_cursor": next_cursor}
+
+    def _hydrate(self, ids: List[int]) -> List[dict]:
+        if not ids:
+            return []
+        marks = ",".join("?" * len(ids))
+        rows = self._conn().execute(
+            f"SELECT id, author, body, created_at FROM feed_items WHERE id IN ({marks}) ORDER BY id DESC",
+            ids,
+        ).fetchall()
+        return [{"id": r[0], "author": r[1], "body": r[2], "created_at": r[3]} for r in rows]
+
+    def stats(self) -> dict:
+        return {
+            "cached_timelines": len(self._timelines),
+            "heavy_producers": sum(1 for c in self._follower_counts.values() if c >= self.heavy_threshold),
+        }
+
+
+# ------------------------------------------------------------------------------
+# Benchmark: page latency at depth 1 and 10,000
+# ------------------------------------------------------------------------------
+def benchmark(pages: int = 10_000, limit: int = 20, authors: int = 50) -> None:
+    import os
+    import random
+    import tempfile
+
+    path = os.path.join(tempfile.mkdtemp(), "feed.db")
+    feed = FeedService(path, heavy_threshold=1_000)
+    conn = feed._conn()
+    for a in range(authors):
+        feed.follow("reader", f"author{a}")
+    conn.executemany(  # a celebrity: too many followers to fan out
+        "INSERT INTO follows (follower, followee) VALUES (?, 'celebrity')",
+        [(f"fan{i}",) for i in range(1_000)],
+    )
+    feed = FeedService(path, heavy_threshold=1_000)  # reload follower counts
+    feed.follow("reader", "celebrity")
+    conn = feed._conn()
+
+    total = pages * limit + 10_000
+    rng = random.Random(0)
+    now = time.time()
+    conn.execute("BEGIN")
+    conn.executemany(
+        "INSERT INTO feed_items (author, body, created_at) VALUES (?, ?, ?)",
+        (
+            ("celebrity" if i % 10 == 0 else f"author{rng.randrange(authors)}", f"post {i}", now)
+            for i in range(total)
+        ),
+    )
+    conn.execute("COMMIT")
+    print(f"{total:,} items, reader follows {authors} authors + 1 heavy producer")
+
+    def timed(fn, repeat=200):
+        start = time.perf_counter()
+        for _ in range(repeat):
+            fn()
+        return (time.perf_counter() - start) / repeat * 1e6
+
+    cursors = [None]
+    for _ in range(pages - 1):
+        cursors.append(feed.page("reader", limit, cursors[-1])["next_cursor"])
+
+    light = [f"author{a}" for a in range(authors)] + ["celebrity"]
+    marks = ",".join("?" * len(light))
+
+    def offset_page(n):
+        return conn.execute(
+            f"SELECT id, author, body, created_at FROM feed_items WHERE author IN ({marks}) "
+            "ORDER BY id DESC LIMIT ? OFFSET ?",
+            (*light, limit, (n - 1) * limit),
+        ).fetchall()
+
+    for n in (1, 10, 1_000, pages):
+        cursor = cursors[n - 1]
+        keyset = timed(lambda: feed.page("reader", limit, cursor))
+        offset = timed(lambda: offset_page(n), repeat=20)
+        print(f"page {n:>6,}: cursor {keyset:8.0f} µs   OFFSET {offset:10,.0f} µs")
+
+
+if __name__ == "__main__":
+    benchmark()
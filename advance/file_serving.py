@@ -0,0 +1,435 @@
+"""
+Static / Storage File Serving
+
+Description:
+Serves real files from a configurable root directory behind routes such as
+/assets/{file_path:path} and /storage/{file_path:path}.
+
+- Safe path resolution: "..", absolute paths, NUL bytes and symlinks that
+  escape the root are rejected.
+- Zero-copy transfer: when the ASGI server offers the
+  "http.response.zerocopysend" extension the kernel copies the file straight
+  to the socket (sendfile). Behind nginx, set `offload_header` to
+  "X-Accel-Redirect" and nginx does the transfer itself. Otherwise the file
+  is streamed with os.pread() in a worker thread.
+- HTTP Range: single ranges (206 + Content-Range) and multiple ranges
+  (multipart/byteranges), 416 for unsatisfiable ranges, If-Range.
+- Small hot files (read at least twice, up to `mmap_max` bytes) are
+  memory-mapped and served from the page cache without read() calls.
+- Open file descriptors are cached (LRU) and re-validated with stat() at most
+  every `fd_valid` seconds, like nginx's open_file_cache.
+- ETag / Last-Modified with If-None-Match / If-Modified-Since (304).
+
+How to use:
+    from file_serving import FileStore
+
+    assets = FileStore(os.getenv("ASSETS_ROOT", "./assets"))
+
+    @app.get("/assets/{file_path:path}")
+    def read_asset(file_path: str, request: Request):
+        return assets.response(request, file_path)
+
+Benchmark (MB/s on a large file at several concurrency levels):
+    python file_serving.py
+"""
+
+import mimetypes
+import mmap
+import os
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from email.utils import formatdate, parsedate_to_datetime
+from pathlib import Path
+from typing import List, Optional, Tuple
+from urllib.parse import quote
+
+import anyio
+from fastapi import HTTPException, Request, status
+from starlette.responses import Response
+
+ByteRange = Tuple[int, int]  # inclusive start, inclusive end
+
+
+# ------------------------------------------------------------------------------
+# Open file cache
+# ------------------------------------------------------------------------------
+class OpenFile:
+    """A cached open file. `refs` counts responses currently reading it."""
+
+    def __init__(self, path: str, fd: int, st: os.stat_result):
+        self.path = path
+        self.fd = fd
+        self.size = st.st_size
+        self.mtime = st.st_mtime
+        self.identity = (st.st_ino, st.st_mtime_ns, st.st_size)
+        self.etag = f'"{st.st_mtime_ns:x}-{st.st_size:x}"'
+        self.last_modified = formatdate(st.st_mtime, usegmt=True)
+        self.checked_at = time.monotonic()
+        self.hits = 0
+        self.mm: Optional[mmap.mmap] = None
+        self.refs = 0
+        self.evicted = False
+
+    def close(self) -> None:
+        if self.mm is not None:
+            self.mm.close()
+            self.mm = None
+        os.close(self.fd)
+
+
+class OpenFileCache:
+    def __init__(self, max_files: int = 1024, valid: float = 2.0):
+        self.max_files = max_files
+        self.valid = valid
+        self._files: "OrderedDict[str, OpenFile]" = OrderedDict()
+        self._lock = threading.Lock()  # handlers may run in the thread pool
+
+    def acquire(self, path: str) -> OpenFile:
+        """Return an open file for `path` with its reference count taken."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._files.get(path)
+            if entry is not None and now - entry.checked_at > self.valid:
+                try:
+                    st = os.stat(path)
+                    current = (st.st_ino, st.st_mtime_ns, st.st_size)
+                except FileNotFoundError:
+                    current = None
+                if current != entry.identity:
+                    self._evict(path)  # file was replaced or changed
+                    entry = None
+                else:
+                    entry.checked_at = now
+            if entry is None:
+                fd = os.open(path, os.O_RDONLY)
+                entry = OpenFile(path, fd, os.fstat(fd))
+                self._files[path] = entry
+                while len(self._files) > self.max_files:
+                    self._evict(next(iter(self._files)))
+            else:
+                self._files.move_to_end(path)
+            entry.refs += 1
+            entry.hits += 1
+            return entry
+
+    def map(self, entry: OpenFile) -> None:
+        with self._lock:
+            if entry.mm is None and not entry.evicted:
+                entry.mm = mmap.mmap(entry.fd, 0, access=mmap.ACCESS_READ)
+
+    def release(self, entry: OpenFile) -> None:
+        with self._lock:
+            entry.refs -= 1
+            if entry.evicted and entry.refs == 0:
+                entry.close()
+
+    def _evict(self, path: str) -> None:
+        entry = self._files.pop(path)
+        entry.evicted = True
+        if entry.refs == 0:
+            entry.close()  # otherwise the last reader closes it
+
+
+# ------------------------------------------------------------------------------
+# Range parsing
+# ------------------------------------------------------------------------------
+def parse_range(header: str, size: int, max_ranges: int = 16) -> Optional[List[ByteRange]]:
+    """
+    Parse a `Range: bytes=...` header.
+
+    Returns None when the header should be ignored (malformed or abusive, the
+    full file is sent), [] when no range is satisfiable (416), otherwise the
+    sorted, merged list of (start, end) ranges.
+    """
+    unit, _, spec = header.partition("=")
+    if unit.strip().lower() != "bytes" or not spec:
+        return None
+    ranges = []
+    for part in spec.split(","):
+        part = part.strip()
+        first, dash, last = part.partition("-")
+        if not dash or not all(n.isascii() and n.isdigit() for n in (first, last) if n):
+            return None  # only 1*DIGIT: no signs ("--5"), spaces or underscores
+        if first == "":  # suffix: the last N bytes
+            if last == "":
+                return None
+            start, end = max(0, size - int(last)), size - 1
+        else:
+            start = int(first)
+            end = int(last) if last else max(start, size - 1)
+            if start > end:
+                return None
+            end = min(end, size - 1)
+        if start <= end:  # after clamping; otherwise this range is unsatisfiable
+            ranges.append((start, end))
+    if len(ranges) > max_ranges:
+        return None
+    if size == 0:
+        return []
+
+    ranges.sort()
+    merged: List[ByteRange] = []
+    for start, end in ranges:
+        if merged and start <= merged[-1][1] + 1:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+# ------------------------------------------------------------------------------
+# File store
+# ------------------------------------------------------------------------------
+def safe_join(root: Path, rel_path: str) -> Path:
+    """Join a client-supplied relative path to root, rejecting traversal (400)."""
+    if "\x00" in rel_path or rel_path.startswith("/"):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid path")
+    parts = [p for p in rel_path.replace("\\", "/").split("/") if p not in ("", ".")]
+    if not parts or any(p == ".." for p in parts):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid path")
+    return root.joinpath(*parts)
+
+
+class FileStore:
+    """
+    Args:
+        root: directory files are served from.
+        mmap_max: files up to this size are mmapped once they are hot.
+        fd_cache_size / fd_valid: open file descriptor cache limits.
+        chunk_size: read size when streaming without sendfile.
+        offload_header: e.g. "X-Accel-Redirect" to let nginx send the file;
+            `offload_prefix` is the internal nginx location for `root`.
+    """
+
+    def __init__(
+        self,
+        root: str,
+        mmap_max: int = 256 * 1024,
+        fd_cache_size: int = 1024,
+        fd_valid: float = 2.0,
+        chunk_size: int = 256 * 1024,
+        offload_header: Optional[str] = None,
+        offload_prefix: str = "/protected/",
+    ):
+        self.root = Path(root).resolve()
+        self.mmap_max = mmap_max
+        self.chunk_size = chunk_size
+        self.offload_header = offload_header
+        self.offload_prefix = offload_prefix
+        self.files = OpenFileCache(fd_cache_size, fd_valid)
+
+    def resolve(self, rel_path: str) -> Path:
+        """Map a URL path to a file inside root, or raise 404/400."""
+        real = Path(os.path.realpath(safe_join(self.root, rel_path)))
+        if real != self.root and self.root not in real.parents:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="File not found")
+        if not real.is_file():
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="File not found")
+        return real
+
+    def response(self, request: Request, rel_path: str) -> Response:
+        path = self.resolve(rel_path)
+        try:
+            entry = self.files.acquire(str(path))
+        except (FileNotFoundError, IsADirectoryError, PermissionError):
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="File not found")
+        try:
+            return self._build(request, path, entry)
+        except BaseException:
+            self.files.release(entry)
+            raise
+
+    def _build(self, request: Request, path: Path, entry: OpenFile) -> Response:
+        media_type = mimetypes.guess_type(path.name)[0] or "application/octet-stream"
+        headers = {
+            "etag": entry.etag,
+            "last-modified": entry.last_modified,
+            "accept-ranges": "bytes",
+        }
+
+        if _not_modified(request, entry):
+            self.files.release(entry)
+            return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+        if self.offload_header:
+            self.files.release(entry)
+            rel = path.relative_to(self.root).as_posix()
+            headers[self.offload_header] = self.offload_prefix + quote(rel)
+            return Response(media_type=media_type, headers=headers)
+
+        ranges = None
+        range_header = request.headers.get("range")
+        if range_header and _if_range_matches(request, entry):
+            ranges = parse_range(range_header, entry.size)
+            if ranges == []:
+                self.files.release(entry)
+                headers["content-range"] = f"bytes */{entry.size}"
+                return Response(status_code=status.HTTP_416_RANGE_NOT_SATISFIABLE, headers=headers)
+
+        if entry.mm is None and 0 < entry.size <= self.mmap_max and entry.hits >= 2:
+            self.files.map(entry)
+
+        return FileRangeResponse(self, entry, media_type, headers, ranges)
+
+
+def _not_modified(request: Request, entry: OpenFile) -> bool:
+    inm = request.headers.get("if-none-match")
+    if inm is not None:
+        tags = [t.strip() for t in inm.split(",")]
+        return "*" in tags or entry.etag in tags or f"W/{entry.etag}" in tags
+    ims = request.headers.get("if-modified-since")
+    if ims:
+        try:
+            return int(entry.mtime) <= parsedate_to_datetime(ims).timestamp()
+        except (TypeError, ValueError):
+            return False
+    return False
+
+
+def _if_range_matches(request: Request, entry: OpenFile) -> bool:
+    if_range = request.headers.get("if-range")
+    if if_range is None:
+        return True
+    return if_range.strip() in (entry.etag, entry.last_modified)
+
+
+# ------------------------------------------------------------------------------
+# Response
+# ------------------------------------------------------------------------------
+class FileRangeResponse(Response):
+    """Sends a whole file, one range, or several ranges as multipart/byteranges."""
+
+    def __init__(self, store: FileStore, entry: OpenFile, media_type: str, headers: dict, ranges):
+        self.store = store
+        self.entry = entry
+        self.ranges: List[ByteRange] = ranges or ([(0, entry.size - 1)] if entry.size else [])
+        self.parts: Optional[List[Tuple[bytes, ByteRange]]] = None
+        self.background = None
+        self.status_code = status.HTTP_206_PARTIAL_CONTENT if ranges else status.HTTP_200_OK
+
+        if ranges and len(ranges) > 1:
+            boundary = secrets.token_hex(12)
+            self.parts = []
+            length = 0
+            for start, end in ranges:
+                head = (
+                    f"--{boundary}\r\nContent-Type: {media_type}\r\n"
+                    f"Content-Range: bytes {start}-{end}/{entry.size}\r\n\r\n"
+                ).encode()
+                if self.parts:
+                    head = b"\r\n" + head
+                self.parts.append((head, (start, end)))
+                length += len(head) + end - start + 1
+            self.tail = f"\r\n--{boundary}--\r\n".encode()
+            length += len(self.tail)
+            headers["content-type"] = f"multipart/byteranges; boundary={boundary}"
+        else:
+            if ranges:
+                start, end = ranges[0]
+                headers["content-range"] = f"bytes {start}-{end}/{entry.size}"
+            length = sum(end - start + 1 for start, end in self.ranges)
+            headers["content-type"] = media_type
+        headers["content-length"] = str(length)
+        self.init_headers(headers)
+
+    async def __call__(self, scope, receive, send) -> None:
+        try:
+            await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+            if scope.get("method") == "HEAD":
+                await send({"type": "http.response.body", "body": b""})
+                return
+            zerocopy = "http.response.zerocopysend" in scope.get("extensions", {})
+            if self.parts is None:
+                for start, end in self.ranges:
+                    await self._send_range(send, start, end, zerocopy)
+            else:
+                for head, (start, end) in self.parts:
+                    await send({"type": "http.response.body", "body": head, "more_body": True})
+                    await self._send_range(send, start, end, zerocopy)
+                await send({"type": "http.response.body", "body": self.tail, "more_body": True})
+            await send({"type": "http.response.body", "body": b""})
+        finally:
+            self.store.files.release(self.entry)
+
+    async def _send_range(self, send, start: int, end: int, zerocopy: bool) -> None:
+        entry = self.entry
+        count = end - start + 1
+        if entry.mm is not None:
+            await send({"type": "http.response.body", "body": entry.mm[start:end + 1], "more_body": True})
+            return
+        if zerocopy:
+            # The server calls os.sendfile(); the data never enters Python
+            with os.fdopen(os.dup(entry.fd), "rb") as f:
+                await send({
+                    "type": "http.response.zerocopysend",
+                    "file": f,
+                    "offset": start,
+                    "count": count,
+                    "more_body": True,
+                })
+            return
+        offset = start
+        while offset <= end:
+            size = min(self.store.chunk_size, end - offset + 1)
+            chunk = await anyio.to_thread.run_sync(os.pread, entry.fd, size, offset)
+            if not chunk:
+                break  # file shrank underneath us
+            offset += len(chunk)
+            await send({"type": "http.response.body", "body": chunk, "more_body": True})
+
+
+# ------------------------------------------------------------------------------
+# Benchmark: MB/s on a large file at several concurrency levels
+# ------------------------------------------------------------------------------
+def benchmark(size_mb: int = 256, concurrency=(1, 4, 16), port: int = 8765) -> None:
+    import asyncio
+    import tempfile
+
+    import httpx
+    import uvicorn
+    from fastapi import FastAPI
+
+    root = tempfile.mkdtemp()
+    with open(os.path.join(root, "big.bin"), "wb") as f:
+        for _ in range(size_mb):
+            f.write(os.urandom(1024 * 1024))
+
+    store = FileStore(root)
+    app = FastAPI()
+
+    @app.get("/storage/{file_path:path}")
+    def storage(file_path: str, request: Request):
+        return store.response(request, file_path)
+
+    server = uvicorn.Server(uvicorn.Config(app, port=port, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.05)
+
+    async def download(client: httpx.AsyncClient) -> int:
+        total = 0
+        async with client.stream("GET", f"http://127.0.0.1:{port}/storage/big.bin") as r:
+            async for chunk in r.aiter_raw():
+                total += len(chunk)
+        return total
+
+    async def run(n: int) -> None:
+        async with httpx.AsyncClient(timeout=None, limits=httpx.Limits(max_connections=n)) as client:
+            start = time.perf_counter()
+            sizes = await asyncio.gather(*(download(client) for _ in range(n)))
+            elapsed = time.perf_counter() - start
+        mb = sum(sizes) / 1e6
+        print(f"concurrency={n:<3} {mb:8.0f} MB in {elapsed:6.2f}s = {mb / elapsed:8.1f} MB/s")
+
+    print(f"Serving a {size_mb} MB file")
+    for n in concurrency:
+        asyncio.run(run(n))
+    server.should_exit = True
+    thread.join()
+
+
+if __name__ == "__main__":
+    benchmark()
@@ -0,0 +1,278 @@
+"""
+Pooled Outbound HTTP Client
+
+Description:
+One shared async HTTP client per app for calls to external APIs (mail
+provider, payment gateway, ...), instead of a new connection per job.
+
+- OutboundClient: wraps one httpx.AsyncClient created in the app lifespan.
+  Connections are kept alive and reused; `per_host` caps concurrent requests
+  to any single host, `budget` caps the total time of a call (retries included).
+- CircuitBreaker: after `failure_threshold` consecutive failures to a host,
+  calls fail fast for `reset_timeout` seconds, then one trial call is let
+  through (half-open) to see if the host recovered.
+- MailClient / MailBatcher: sends emails through the provider's API, grouping
+  them into one batch request when the provider supports it.
+
+How to use:
+    from http_client import OutboundClient
+
+    @asynccontextmanager
+    async def lifespan(app):
+        async with OutboundClient(per_host=10, budget=5.0) as client:
+            app.state.http = client
+            yield
+
+    app = FastAPI(lifespan=lifespan)
+
+Local stub provider for trying it out: see mail_stub.py
+"""
+
+import logging
+import time
+from typing import Dict, List, Optional
+from urllib.parse import urlsplit
+
+import anyio
+import httpx
+
+logger = logging.getLogger("http_client")
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling a host whose circuit is open."""
+
+
+class BudgetExceededError(Exception):
+    """The call (including retries) did not finish within its time budget."""
+
+
+# ------------------------------------------------------------------------------
+# Circuit breaker
+# ------------------------------------------------------------------------------
+class CircuitBreaker:
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half-open"
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._trial_running = False
+
+    def before_call(self) -> None:
+        if self.state == self.OPEN:
+            if time.monotonic() - self.opened_at < self.reset_timeout:
+                raise CircuitOpenError("circuit open")
+            self.state = self.HALF_OPEN
+        if self.state == self.HALF_OPEN:
+            if self._trial_running:
+                raise CircuitOpenError("circuit half-open, trial call in progress")
+            self._trial_running = True
+
+    def record_success(self) -> None:
+        self.state = self.CLOSED
+        self.failures = 0
+        self._trial_running = False
+
+    def abandon_trial(self) -> None:
+        """The call ended without a verdict on the host (cancelled, local error): let another trial run."""
+        self._trial_running = False
+
+    def record_failure(self) -> None:
+        self._trial_running = False
+        self.failures += 1
+        if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+            self.state = self.OPEN
+            self.opened_at = time.monotonic()
+
+
+# ------------------------------------------------------------------------------
+# Shared client
+# ------------------------------------------------------------------------------
+class OutboundClient:
+    """
+    Args:
+        max_connections: total pool size across all hosts.
+        per_host: max concurrent requests to one host.
+        keepalive: idle connections kept open for reuse (and for how long).
+        budget: default total seconds for one call, retries included.
+        retries: extra attempts on connection errors / 5xx, within the budget.
+    """
+
+    def __init__(
+        self,
+        max_connections: int = 100,
+        per_host: int = 10,
+        max_keepalive: int = 20,
+        keepalive_expiry: float = 30.0,
+        budget: float = 5.0,
+        connect_timeout: float = 2.0,
+        retries: int = 2,
+        failure_threshold: int = 5,
+        reset_timeout: float = 30.0,
+        transport: Optional[httpx.AsyncBaseTransport] = None,
+    ):
+        self.per_host = per_host
+        self.budget = budget
+        self.retries = retries
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive,
+            keepalive_expiry=keepalive_expiry,
+        )
+        self._timeout = httpx.Timeout(budget, connect=connect_timeout)
+        self._transport = transport
+        self._client: Optional[httpx.AsyncClient] = None
+        self._host_slots: Dict[str, anyio.Semaphore] = {}
+        self.breakers: Dict[str, CircuitBreaker] = {}
+
+    async def __aenter__(self) -> "OutboundClient":
+        self._client = httpx.AsyncClient(
+            limits=self._limits, timeout=self._timeout, transport=self._transport
+        )
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        await self._client.aclose()
+        self._client = None
+
+    def _host(self, url: str) -> str:
+        parts = urlsplit(url)
+        return f"{parts.scheme}://{parts.netloc}"
+
+    def breaker(self, host: str) -> CircuitBreaker:
+        breaker = self.breakers.get(host)
+        if breaker is None:
+            breaker = self.breakers[host] = CircuitBreaker(self.failure_threshold, self.reset_timeout)
+        return breaker
+
+    async def request(self, method: str, url: str, budget: Optional[float] = None, **kwargs) -> httpx.Response:
+        """
+        Send a request through the shared pool.
+
+        Raises CircuitOpenError (host is failing), BudgetExceededError (too
+        slow) or httpx.HTTPStatusError (4xx, not retried).
+        """
+        if self._client is None:
+            raise RuntimeError("OutboundClient is not started (use it in the app lifespan)")
+        host = self._host(url)
+        breaker = self.breaker(host)
+        slots = self._host_slots.setdefault(host, anyio.Semaphore(self.per_host))
+        deadline = time.monotonic() + (budget if budget is not None else self.budget)
+
+        attempt = 0
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise BudgetExceededError(f"{method} {url}: time budget exhausted")
+            breaker.before_call()  # from here on, every exit must settle a half-open trial
+            try:
+                with anyio.fail_after(remaining):
+                    async with slots:
+                        response = await self._client.request(method, url, **kwargs)
+            except TimeoutError:
+                breaker.record_failure()
+                raise BudgetExceededError(f"{method} {url}: time budget exhausted") from None
+            except httpx.TransportError:
+                breaker.record_failure()
+                if attempt >= self.retries:
+                    raise
+            except BaseException:  # cancelled, or an error that says nothing about the host
+                breaker.abandon_trial()
+                raise
+            else:
+                if response.status_code < 500:
+                    breaker.record_success()
+                    response.raise_for_status()
+                    return response
+                breaker.record_failure()
+                if attempt >= self.retries:
+                    response.raise_for_status()
+            attempt += 1
+            # Short exponential backoff, never beyond the budget
+            await anyio.sleep(min(0.05 * 2 ** attempt, max(0.0, deadline - time.monotonic())))
+
+    async def post(self, url: str, **kwargs) -> httpx.Response:
+        return await self.request("POST", url, **kwargs)
+
+    async def get(self, url: str, **kwargs) -> httpx.Response:
+        return await self.request("GET", url, **kwargs)
+
+
+# ------------------------------------------------------------------------------
+# Mail provider client with batching
+# ------------------------------------------------------------------------------
+class MailClient:
+    """Talks to the mail API: POST /send and (if supported) POST /send-batch."""
+
+    def __init__(self, client: OutboundClient, base_url: str, supports_batch: bool = True):
+        self.client = client
+        self.base_url = base_url.rstrip("/")
+        self.supports_batch = supports_batch
+
+    async def send(self, to: str, subject: str) -> None:
+        await self.client.post(f"{self.base_url}/send", json={"to": to, "subject": subject})
+
+    async def send_many(self, messages: List[dict]) -> None:
+        if self.supports_batch and len(messages) > 1:
+            await self.client.post(f"{self.base_url}/send-batch", json={"messages": messages})
+            return
+        for message in messages:
+            await self.send(message["to"], message["subject"])
+
+
+class MailBatcher:
+    """
+    Collects emails from background tasks and sends them in batches of up to
+    `batch_size`, waiting at most `flush_interval` seconds for a batch to fill.
+
+    Run `batcher.run()` in a task group for the lifetime of the app; `close()`
+    flushes what is left.
+    """
+
+    def __init__(self, mail: MailClient, batch_size: int = 50, flush_interval: float = 0.2, max_pending: int = 10_000):
+        self.mail = mail
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._send, self._receive = anyio.create_memory_object_stream(max_pending)
+        self.sent = 0
+        self.failed = 0
+
+    async def send(self, to: str, subject: str) -> None:
+        await self._send.send({"to": to, "subject": subject})
+
+    async def close(self) -> None:
+        await self._send.aclose()
+
+    async def run(self) -> None:
+        async with self._receive:
+            while True:
+                try:
+                    first = await self._receive.receive()
+                except anyio.EndOfStream:
+                    return
+                batch = [first]
+                with anyio.move_on_after(self.flush_interval):
+                    while len(batch) < self.batch_size:
+                        try:
+                            batch.append(await self._receive.receive())
+                        except anyio.EndOfStream:
+                            break
+                await self._flush(batch)
+
+    async def _flush(self, batch: List[dict]) -> None:
+        try:
+            await self.mail.send_many(batch)
+            self.sent += len(batch)
+        except (httpx.HTTPError, CircuitOpenError, BudgetExceededError) as exc:
+            # A real app would requeue or dead-letter these
+            self.failed += len(batch)
+            logger.warning("Failed to send %d emails: %r", len(batch), exc)
+        except Exception:
+            # A bug (bad payload, unexpected response) must not stop the batcher for good
+            self.failed += len(batch)
+            logger.exception("Unexpected error sending %d emails", len(batch))
@@ -0,0 +1,270 @@
+"""
+Idempotency-Key Support
+
+Description:
+Makes retried POST requests safe. A client sends a unique `Idempotency-Key`
+header with each logical operation; retries reuse the same key.
+
+- First request with a key: the handler runs and its response is stored.
+- Retry with the same key and the same body: the stored response is replayed
+  (header `Idempotent-Replayed: true`) without calling the handler, so the
+  database is not touched and no duplicate row is inserted.
+- Retry while the first request is still running: it waits for that
+  execution and gets the same response (concurrent duplicates coalesce).
+- Same key with a different body: 422, the key was reused by mistake.
+- 5xx responses are not stored, so a failed attempt can be retried.
+- Keys are scoped per client (its credentials, else its IP): two clients
+  that happen to pick the same key never see each other's responses.
+
+The store is bounded (LRU) and entries expire after `ttl` seconds. Only
+completed entries are evicted: an in-flight one has waiters relying on it.
+
+How to use:
+    from idempotency import IdempotencyMiddleware
+    app.add_middleware(IdempotencyMiddleware, paths={"/books"})
+
+Test:
+    curl -X POST localhost:8000/books -H "Idempotency-Key: 8f1c..." \\
+         -H "Content-Type: application/json" \\
+         -d '{"title": "Mastering FastAPI", "price": 29.0, "in_stock": true}'
+    (run it twice: one row is created, the second call is a replay)
+"""
+
+import hashlib
+import time
+from collections import OrderedDict
+from typing import Callable, Iterable, List, Optional, Tuple
+
+import anyio
+
+HEADER = b"idempotency-key"
+MAX_KEY_LENGTH = 255
+CREDENTIAL_HEADERS = (b"authorization", b"x-token")
+
+
+class StoredResponse:
+    __slots__ = ("status", "headers", "body")
+
+    def __init__(self, status: int, headers: List[Tuple[bytes, bytes]], body: bytes):
+        self.status = status
+        self.headers = headers
+        self.body = body
+
+
+class Entry:
+    """One idempotency key: its request fingerprint and (eventually) its response."""
+
+    __slots__ = ("fingerprint", "created", "response", "done")
+
+    def __init__(self, fingerprint: str):
+        self.fingerprint = fingerprint
+        self.created = time.monotonic()
+        self.response: Optional[StoredResponse] = None
+        self.done = anyio.Event()
+
+
+class IdempotencyStore:
+    """Bounded, TTL-evicted map of key -> Entry (in-flight or completed)."""
+
+    def __init__(self, max_entries: int = 10_000, ttl: float = 24 * 3600):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[tuple, Entry]" = OrderedDict()
+
+    def get(self, key: tuple) -> Optional[Entry]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry.done.is_set() and time.monotonic() - entry.created > self.ttl:
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def begin(self, key: tuple, fingerprint: str) -> Entry:
+        entry = Entry(fingerprint)
+        self._entries[key] = entry
+        self._evict()
+        return entry
+
+    def discard(self, key: tuple, entry: Entry) -> None:
+        if self._entries.get(key) is entry:
+            del self._entries[key]
+
+    def _evict(self) -> None:
+        now = time.monotonic()
+        excess = len(self._entries) - self.max_entries
+        victims = []
+        # Oldest first. In-flight entries are skipped, never evicted: dropping
+        # one would let its waiters (and later retries) run the handler again.
+        # There are at most as many of them as concurrent requests.
+        for key, entry in self._entries.items():
+            if not entry.done.is_set():
+                continue
+            if excess > 0 or now - entry.created > self.ttl:
+                victims.append(key)
+                excess -= 1
+            else:
+                break
+        for key in victims:
+            del self._entries[key]
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+def client_identity(scope: dict) -> str:
+    """Who sent the request: a digest of its credentials, else its IP."""
+    h = hashlib.sha256()
+    for name, value in scope.get("headers", []):
+        if name in CREDENTIAL_HEADERS:
+            h.update(name + b":" + value + b"\n")
+    if h.digest() != hashlib.sha256().digest():
+        return h.hexdigest()
+    client = scope.get("client")
+    return f"ip:{client[0]}" if client else "anonymous"
+
+
+def fingerprint(method: str, path: str, query: bytes, body: bytes) -> str:
+    h = hashlib.sha256()
+    for part in (method.encode(), path.encode(), query, body):
+        h.update(len(part).to_bytes(8, "big"))
+        h.update(part)
+    return h.hexdigest()
+
+
+class IdempotencyMiddleware:
+    """
+    Pure ASGI middleware. Applies to `methods` on the given `paths` only, and
+    only when the request carries an Idempotency-Key header.
+    """
+
+    def __init__(
+        self,
+        app: Callable,
+        paths: Iterable[str],
+        methods: Iterable[str] = ("POST",),
+        store: Optional[IdempotencyStore] = None,
+        client_key: Callable[[dict], str] = client_identity,
+    ):
+        self.app = app
+        self.paths = set(paths)
+        self.methods = set(methods)
+        self.store = store or IdempotencyStore()
+        self.client_key = client_key
+
+    async def __call__(self, scope, receive, send):
+        if (
+            scope["type"] != "http"
+            or scope["method"] not in self.methods
+            or scope["path"] not in self.paths
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        idem_key = None
+        for name, value in scope.get("headers", []):
+            if name == HEADER:
+                idem_key = value.decode("latin-1").strip()
+                break
+        if not idem_key:
+            await self.app(scope, receive, send)
+            return
+        if len(idem_key) > MAX_KEY_LENGTH:
+            await _send_json(send, 400, b'{"detail":"Idempotency-Key is too long"}')
+            return
+
+        body = await _read_body(receive)
+        fp = fingerprint(scope["method"], scope["path"], scope.get("query_string", b""), body)
+        key = (self.client_key(scope), scope["method"], scope["path"], idem_key)
+
+        while True:
+            entry = self.store.get(key)
+            if entry is None:
+                break
+            if entry.fingerprint != fp:
+                await _send_json(
+                    send, 422, b'{"detail":"Idempotency-Key was already used with a different request"}'
+                )
+                return
+            await entry.done.wait()  # coalesce onto the in-flight execution
+            if entry.response is not None:
+                await _replay(send, entry.response)
+                return
+            # That attempt failed and was not stored: look again, maybe run it ourselves
+
+        entry = self.store.begin(key, fp)
+        recorder = _Recorder(send)
+        try:
+            await self.app(scope, _replay_receive(body, receive), recorder.send)
+            if recorder.status is not None and recorder.status < 500:
+                entry.response = StoredResponse(recorder.status, recorder.headers, b"".join(recorder.chunks))
+            else:
+                self.store.discard(key, entry)
+        except BaseException:
+            self.store.discard(key, entry)
+            raise
+        finally:
+            entry.done.set()
+
+
+class _Recorder:
+    """Forwards the response to the client while keeping a copy of it."""
+
+    def __init__(self, send: Callable):
+        self.downstream = send
+        self.status: Optional[int] = None
+        self.headers: List[Tuple[bytes, bytes]] = []
+        self.chunks: List[bytes] = []
+
+    async def send(self, message: dict) -> None:
+        if message["type"] == "http.response.start":
+            self.status = message["status"]
+            self.headers = list(message.get("headers", []))
+        elif message["type"] == "http.response.body":
+            self.chunks.append(message.get("body", b""))
+        await self.downstream(message)
+
+
+async def _read_body(receive: Callable) -> bytes:
+    chunks = []
+    while True:
+        message = await receive()
+        if message["type"] != "http.request":
+            break
+        chunks.append(message.get("body", b""))
+        if not message.get("more_body", False):
+            break
+    return b"".join(chunks)
+
+
+def _replay_receive(body: bytes, receive: Callable) -> Callable:
+    """Hand the already-read body to the app, then fall back to the real channel."""
+    sent = False
+
+    async def replay() -> dict:
+        nonlocal sent
+        if not sent:
+            sent = True
+            return {"type": "http.request", "body": body, "more_body": False}
+        return await receive()  # e.g. http.disconnect
+
+    return replay
+
+
+async def _replay(send: Callable, response: StoredResponse) -> None:
+    headers = response.headers + [(b"idempotent-replayed", b"true")]
+    await send({"type": "http.response.start", "status": response.status, "headers": headers})
+    await send({"type": "http.response.body", "body": response.body})
+
+
+async def _send_json(send: Callable, status_code: int, body: bytes) -> None:
+    await send({
+        "type": "http.response.start",
+        "status": status_code,
+        "headers": [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode()),
+        ],
+    })
+    await send({"type": "http.response.body", "body": body})
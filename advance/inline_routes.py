@@ -0,0 +1,200 @@
+"""
+Inline Execution of Trivial Sync Handlers
+
+Description:
+FastAPI runs every sync `def` handler in the worker threadpool: a thread
+hand-off and a wake-up on every call, even for `return {"result": a + b}`.
+InlineGuard lets such handlers run directly on the event loop instead.
+
+- `@guard.inline`: the route is known to be non-blocking; it runs on the
+  event loop from the first call.
+- `@guard.auto`: the route starts in the threadpool; after `warmup` calls
+  whose p99 execution time is within the budget it is promoted to inline
+  (detection by profiling).
+- Demotion: an inline call that takes longer than `budget_ms` is a strike;
+  after `max_strikes` strikes within 100 calls the route goes back to the
+  threadpool for good, with a warning in the log. A slow call still
+  blocks the loop once, so keep the budget small.
+- `guard.enabled = False` sends every route to the threadpool (A/B testing).
+
+How to use:
+    from inline_routes import InlineGuard
+
+    fast = InlineGuard(budget_ms=1.0)
+
+    @app.get("/add")
+    @fast.inline
+    def add(a: float, b: float):
+        return {"result": a + b}
+
+Benchmark (requests/second, threadpool vs inline, in-process ASGI calls):
+    python inline_routes.py
+"""
+
+import functools
+import logging
+import time
+from typing import Callable, Dict, List
+
+import anyio
+
+logger = logging.getLogger("inline_routes")
+
+
+class RouteState:
+    __slots__ = ("name", "mode", "inline_calls", "threaded_calls", "strikes", "window", "samples", "demoted")
+
+    def __init__(self, name: str, mode: str):
+        self.name = name
+        self.mode = mode  # "inline" | "profiling" | "threadpool"
+        self.inline_calls = 0
+        self.threaded_calls = 0
+        self.strikes = 0
+        self.window = 0
+        self.samples: List[float] = []
+        self.demoted = False
+
+
+class InlineGuard:
+    def __init__(self, budget_ms: float = 1.0, max_strikes: int = 3, warmup: int = 200):
+        self.budget = budget_ms / 1000
+        self.max_strikes = max_strikes
+        self.warmup = warmup
+        self.enabled = True
+        self.routes: Dict[str, RouteState] = {}
+
+    def inline(self, fn: Callable) -> Callable:
+        """Run `fn` on the event loop (demoted if it exceeds the budget)."""
+        return self._wrap(fn, "inline")
+
+    def auto(self, fn: Callable) -> Callable:
+        """Profile `fn` in the threadpool first; promote it if it stays within budget."""
+        return self._wrap(fn, "profiling")
+
+    def _wrap(self, fn: Callable, mode: str) -> Callable:
+        state = self.routes[fn.__qualname__] = RouteState(fn.__qualname__, mode)
+
+        def timed(**kwargs):
+            start = time.perf_counter()
+            try:
+                return fn(**kwargs)
+            finally:
+                state.samples.append(time.perf_counter() - start)
+
+        # FastAPI reads the signature through __wrapped__, so parameters and
+        # dependencies of the original handler keep working.
+        @functools.wraps(fn)
+        async def wrapper(**kwargs):
+            if state.mode == "inline" and self.enabled:
+                state.inline_calls += 1
+                start = time.perf_counter()
+                try:
+                    return fn(**kwargs)
+                finally:
+                    self._check_budget(state, time.perf_counter() - start)
+            state.threaded_calls += 1
+            if state.mode != "profiling" or not self.enabled:
+                return await anyio.to_thread.run_sync(functools.partial(fn, **kwargs))
+            result = await anyio.to_thread.run_sync(functools.partial(timed, **kwargs))
+            if len(state.samples) >= self.warmup:
+                self._decide(state)
+            return result
+
+        wrapper.execution_mode = lambda: "inline" if state.mode == "inline" and self.enabled else "sync"
+        return wrapper
+
+    def _check_budget(self, state: RouteState, elapsed: float) -> None:
+        state.window += 1
+        if state.window > 100:
+            state.window, state.strikes = 1, 0
+        if elapsed <= self.budget:
+            return
+        state.strikes += 1
+        if state.strikes >= self.max_strikes:
+            state.mode = "threadpool"
+            state.demoted = True
+            logger.warning(
+                "%s took %.2f ms inline (budget %.2f ms, %d strikes): moved back to the threadpool",
+                state.name, elapsed * 1000, self.budget * 1000, state.strikes,
+            )
+
+    def _decide(self, state: RouteState) -> None:
+        ordered = sorted(state.samples)
+        p99 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))]
+        state.samples = []
+        state.mode = "inline" if p99 <= self.budget else "threadpool"
+        logger.info("%s: p99 %.3f ms over %d calls -> %s", state.name, p99 * 1000, len(ordered), state.mode)
+
+    def stats(self) -> dict:
+        return {
+            name: {
+                "mode": s.mode,
+                "inline_calls": s.inline_calls,
+                "threadpool_calls": s.threaded_calls,
+                "demoted": s.demoted,
+            }
+            for name, s in self.routes.items()
+        }
+
+
+# ------------------------------------------------------------------------------
+# Benchmark: requests/second through the full ASGI app, threadpool vs inline
+# ------------------------------------------------------------------------------
+async def _rps(app, path: str, query: str, requests: int, concurrency: int) -> float:
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET",
+        "scheme": "http", "path": path, "raw_path": path.encode(), "query_string": query.encode(),
+        "root_path": "", "headers": [(b"host", b"bench")], "client": ("127.0.0.1", 1), "server": ("bench", 80),
+    }
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        if message["type"] == "http.response.start" and message["status"] != 200:
+            raise RuntimeError(f"{path}?{query} -> {message['status']}")
+
+    async def worker(n):
+        for _ in range(n):
+            await app(dict(scope), receive, send)
+
+    start = time.perf_counter()
+    async with anyio.create_task_group() as tg:
+        for _ in range(concurrency):
+            tg.start_soon(worker, requests // concurrency)
+    return requests / (time.perf_counter() - start)
+
+
+def benchmark(requests: int = 20_000, concurrency: int = 64) -> None:
+    import os
+    import sys
+
+    logging.basicConfig(level=logging.WARNING)
+    here = os.path.dirname(os.path.abspath(__file__))
+    sys.path.append(os.path.join(here, "..", "class-1"))
+    sys.path.append(os.path.join(here, "..", "Query Parameters"))
+    import method_decorators
+    import query_types
+
+    cases = [
+        ("calculator", method_decorators, "/add", "a=10&b=5"),
+        ("calculator", method_decorators, "/subtract", "a=10&b=5"),
+        ("query_types", query_types, "/square", "n=12"),
+        ("query_types", query_types, "/greet", "name=John"),
+    ]
+    print(f"{requests:,} requests, {concurrency} concurrent, in-process ASGI (no network)")
+    for label, module, path, query in cases:
+        guard = module.inline_guard
+        results = {}
+        for enabled in (False, True):
+            guard.enabled = enabled
+            anyio.run(_rps, module.app, path, query, 1_000, concurrency)  # warm up
+            results[enabled] = anyio.run(_rps, module.app, path, query, requests, concurrency)
+        print(
+            f"{label:<12} {path:<10} threadpool {results[False]:8,.0f} req/s   "
+            f"inline {results[True]:8,.0f} req/s   x{results[True] / results[False]:.2f}"
+        )
+
+
+if __name__ == "__main__":
+    benchmark()
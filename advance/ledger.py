@@ -0,0 +1,441 @@
+"""
+Credit Ledger: Striped In-Memory Balances with a Group-Committed Journal
+
+Description:
+Per-account credit for GET /charge. Balances live in memory, every change
+is written to an append-only journal before it is acknowledged, and the
+state is rebuilt from snapshot + journal on startup.
+
+- Amounts are integer cents: no float drift across millions of charges.
+- Lock striping: an account maps to one of `stripes` locks, so charges to
+  different accounts do not contend. Check-and-debit runs under that lock,
+  so two concurrent charges can never both spend the same credit.
+- The journal record is queued inside the same critical section, so each
+  account's records are in the order the changes were applied.
+- Group commit: one writer thread drains the queue and writes all queued
+  records with one write() and one fsync(). A charge returns once its record
+  is on disk; under load one fsync covers hundreds of charges.
+- The journal on disk is always a prefix of the queue, so a crash loses only
+  unacknowledged records, and replay never produces an overdraft.
+- Snapshots: all stripe locks are held just long enough to copy the balances
+  and queue a rotate marker. The writer then switches to a new journal file,
+  writes the snapshot (tmp + fsync + rename) and deletes older journals.
+  Startup loads the snapshot and replays the journals after it; a torn last
+  record (crc32 per line) is cut off.
+- One process owns a ledger directory (flock): a second worker would keep
+  its own balances and allow overdrafts, so it fails at startup instead.
+
+How to use:
+    from ledger import CreditLedger, InsufficientCredit
+
+    ledger = CreditLedger("./ledger_data", initial_credit=100_00).install(app)
+
+    @app.get("/charge")
+    async def charge(account: str, amount: float):
+        balance = await ledger.charge_async(account, round(amount * 100))
+
+Benchmark and concurrency stress test (no overdrafts, replay matches memory):
+    python ledger.py
+"""
+
+import asyncio
+import fcntl
+import json
+import os
+import threading
+import zlib
+from collections import deque
+from contextlib import asynccontextmanager
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from fastapi import FastAPI
+
+SNAPSHOT = "snapshot.json"
+_ROTATE = object()  # queue marker: later records go to the next journal file
+
+
+class InsufficientCredit(Exception):
+    def __init__(self, account: str, balance: int, amount: int):
+        super().__init__(f"{account}: balance {balance} < {amount}")
+        self.account = account
+        self.balance = balance
+        self.amount = amount
+
+
+def _record(account: str, delta: int) -> bytes:
+    body = f"{account} {delta}".encode()
+    return body + b" %08x\n" % zlib.crc32(body)
+
+
+class CreditLedger:
+    """
+    Args:
+        data_dir: snapshot and journal files; owned by one process at a time.
+        initial_credit: balance (cents) of an account seen for the first time.
+        stripes: number of locks balances are spread over.
+        snapshot_every: journal records between automatic snapshots.
+        fsync: False trades durability of the last group for latency
+            (records still reach the OS, so a process crash loses nothing).
+    """
+
+    def __init__(
+        self,
+        data_dir: str,
+        initial_credit: int = 100_00,
+        stripes: int = 64,
+        snapshot_every: int = 1_000_000,
+        fsync: bool = True,
+    ):
+        self.dir = Path(data_dir)
+        self.dir.mkdir(parents=True, exist_ok=True)
+        self.initial_credit = initial_credit
+        self.snapshot_every = snapshot_every
+        self.fsync = fsync
+        self._locks = [threading.Lock() for _ in range(stripes)]
+        self._balances: Dict[str, int] = {}
+        self._queue: deque = deque()  # (record, waiter) | (_ROTATE, snapshot)
+        self._wakeup = threading.Event()
+        self._closed = False
+        self._failed: Optional[BaseException] = None  # journal write error: stop acknowledging
+        self._since_snapshot = 0
+        self._stats = {"charges": 0, "declined": 0, "credits": 0, "groups": 0, "records": 0, "snapshots": 0}
+
+        self._dir_lock = open(self.dir / ".lock", "w")
+        try:
+            fcntl.flock(self._dir_lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            self._dir_lock.close()
+            raise RuntimeError(f"{self.dir} is used by another process (run one worker per ledger directory)")
+        self._generation = self._recover()
+        self._journal = open(self._journal_path(self._generation), "ab")
+        self._writer = threading.Thread(target=self._write_loop, name="ledger-writer", daemon=True)
+        self._writer.start()
+
+    # -- balances ---------------------------------------------------------
+    def balance(self, account: str) -> int:
+        return self._balances.get(account, self.initial_credit)
+
+    def _apply(self, account: str, delta: int, waiter: Any) -> int:
+        """Check-and-update under the account's stripe lock; queue the record."""
+        if self._failed is not None:
+            raise RuntimeError("ledger journal is not writable") from self._failed
+        with self._locks[hash(account) % len(self._locks)]:
+            balance = self._balances.get(account, self.initial_credit)
+            if balance + delta < 0:
+                self._stats["declined"] += 1
+                raise InsufficientCredit(account, balance, -delta)
+            balance += delta
+            self._balances[account] = balance
+            self._queue.append((_record(account, delta), waiter))
+        self._wakeup.set()
+        return balance
+
+    def charge(self, account: str, amount: int) -> int:
+        """Debit `amount` cents; returns the new balance once it is durable."""
+        if amount <= 0:
+            raise ValueError("amount must be positive")
+        done = threading.Event()
+        balance = self._apply(account, -amount, done)
+        _wait(done)
+        self._stats["charges"] += 1
+        return balance
+
+    async def charge_async(self, account: str, amount: int) -> int:
+        """charge() for async handlers: the event loop is never blocked."""
+        if amount <= 0:
+            raise ValueError("amount must be positive")
+        future = asyncio.get_running_loop().create_future()
+        balance = self._apply(account, -amount, future)
+        await future
+        self._stats["charges"] += 1
+        return balance
+
+    def credit(self, account: str, amount: int) -> int:
+        """Top up `amount` cents; returns the new balance once it is durable."""
+        if amount <= 0:
+            raise ValueError("amount must be positive")
+        done = threading.Event()
+        balance = self._apply(account, amount, done)
+        _wait(done)
+        self._stats["credits"] += 1
+        return balance
+
+    # -- journal ----------------------------------------------------------
+    def _journal_path(self, generation: int) -> Path:
+        return self.dir / f"journal.{generation:08d}.log"
+
+    def _write_loop(self) -> None:
+        try:
+            self._write_groups()
+        except BaseException as exc:  # disk full, I/O error: fail every waiting caller
+            self._failed = exc
+            waiters = []
+            while self._queue:
+                record, waiter = self._queue.popleft()
+                waiters.append(waiter[1] if record is _ROTATE else waiter)
+            _release(waiters, exc)
+
+    def _write_groups(self) -> None:
+        queue = self._queue
+        while True:
+            self._wakeup.wait()
+            self._wakeup.clear()
+            while queue:
+                records: List[bytes] = []
+                waiters: List[Any] = []
+                rotate = None
+                while queue:
+                    record, waiter = queue.popleft()
+                    if record is _ROTATE:
+                        rotate = waiter
+                        break
+                    records.append(record)
+                    waiters.append(waiter)
+                if records:
+                    try:
+                        self._journal.write(b"".join(records))
+                        self._journal.flush()
+                        if self.fsync:
+                            os.fdatasync(self._journal.fileno())
+                    except BaseException as exc:
+                        _release(waiters, exc)
+                        raise
+                    self._stats["groups"] += 1
+                    self._stats["records"] += len(records)
+                    self._since_snapshot += len(records)
+                    _release(waiters)
+                if rotate is not None:
+                    self._rotate(*rotate)
+                if self._since_snapshot >= self.snapshot_every and not self._closed:
+                    self.snapshot()  # the queue may never run empty under load
+            if self._closed and not queue:
+                return
+
+    def snapshot(self) -> None:
+        """Queue a consistent copy of the balances; the writer persists it."""
+        for lock in self._locks:
+            lock.acquire()
+        try:
+            balances = dict(self._balances)
+            self._since_snapshot = 0
+            self._queue.append((_ROTATE, (balances, threading.Event())))
+        finally:
+            for lock in self._locks:
+                lock.release()
+        self._wakeup.set()
+
+    def _rotate(self, balances: Dict[str, int], done: threading.Event) -> None:
+        # Every record of the old generation is written: start the next one
+        # before the (slow) snapshot write, then drop what the snapshot covers.
+        self._journal.close()
+        self._generation += 1
+        self._journal = open(self._journal_path(self._generation), "ab")
+        tmp = self.dir / f"{SNAPSHOT}.tmp"
+        with open(tmp, "w") as f:
+            json.dump({"generation": self._generation, "balances": balances}, f, separators=(",", ":"))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.dir / SNAPSHOT)
+        for path in self.dir.glob("journal.*.log"):
+            if int(path.name.split(".")[1]) < self._generation:
+                path.unlink()
+        self._stats["snapshots"] += 1
+        done.set()
+
+    def _recover(self) -> int:
+        """Load the snapshot and replay the journals after it; returns the current generation."""
+        generation = 0
+        snapshot = self.dir / SNAPSHOT
+        if snapshot.exists():
+            state = json.loads(snapshot.read_text())
+            generation = state["generation"]
+            self._balances = state["balances"]
+        journals = sorted(
+            (int(path.name.split(".")[1]), path) for path in self.dir.glob("journal.*.log")
+        )
+        balances, initial = self._balances, self.initial_credit
+        for number, path in journals:
+            if number < generation:
+                path.unlink()  # crashed after the snapshot, before the cleanup
+                continue
+            good = 0
+            with open(path, "rb") as f:
+                for line in f:
+                    body, _, crc = line.rstrip(b"\n").rpartition(b" ")
+                    if not line.endswith(b"\n") or crc != b"%08x" % zlib.crc32(body):
+                        break  # torn write at the tail
+                    account, delta = body.decode().rsplit(" ", 1)
+                    balances[account] = balances.get(account, initial) + int(delta)
+                    good += len(line)
+            if good < path.stat().st_size:
+                os.truncate(path, good)
+            generation = number
+        return generation
+
+    # -- lifecycle --------------------------------------------------------
+    def close(self, snapshot: bool = True) -> None:
+        """Write what is queued, snapshot (so the next start replays nothing) and release the directory."""
+        if self._closed:
+            return
+        if snapshot:
+            self.snapshot()
+        self._closed = True
+        self._wakeup.set()
+        self._writer.join()
+        self._journal.close()
+        fcntl.flock(self._dir_lock, fcntl.LOCK_UN)
+        self._dir_lock.close()
+
+    def stats(self) -> dict:
+        return {
+            **self._stats,
+            "accounts": len(self._balances),
+            "queued": len(self._queue),
+            "records_per_fsync": round(self._stats["records"] / self._stats["groups"], 1) if self._stats["groups"] else None,
+            "journal_generation": self._generation,
+        }
+
+    def install(self, app: FastAPI) -> "CreditLedger":
+        """Add /stats/ledger; flush and snapshot on shutdown."""
+        app.add_api_route("/stats/ledger", self.stats, methods=["GET"], tags=["metrics"])
+        inner = app.router.lifespan_context
+
+        @asynccontextmanager
+        async def lifespan(app):
+            try:
+                async with inner(app) as state:
+                    yield state
+            finally:
+                await asyncio.to_thread(self.close)
+
+        app.router.lifespan_context = lifespan
+        return self
+
+
+def _release(waiters: List[Any], error: Optional[BaseException] = None) -> None:
+    """Wake the callers of one group: thread events directly, futures once per event loop."""
+    futures: Dict[Any, List[asyncio.Future]] = {}
+    for waiter in waiters:
+        if isinstance(waiter, threading.Event):
+            waiter.error = error
+            waiter.set()
+        else:
+            futures.setdefault(waiter.get_loop(), []).append(waiter)
+    for loop, group in futures.items():
+        try:
+            loop.call_soon_threadsafe(_resolve, group, error)
+        except RuntimeError:  # loop already closed
+            pass
+
+
+def _resolve(futures: List[asyncio.Future], error: Optional[BaseException]) -> None:
+    for future in futures:
+        if not future.done():
+            if error is None:
+                future.set_result(None)
+            else:
+                future.set_exception(RuntimeError("ledger journal write failed"))
+
+
+def _wait(done: threading.Event) -> None:
+    done.wait()
+    if getattr(done, "error", None) is not None:
+        raise RuntimeError("ledger journal write failed") from done.error
+
+
+# ------------------------------------------------------------------------------
+# Benchmark and stress test
+# ------------------------------------------------------------------------------
+def benchmark() -> None:
+    import random
+    import shutil
+    import tempfile
+    import time
+
+    # 1. Baseline: one global lock, one fsync per charge
+    directory = tempfile.mkdtemp()
+    lock, balances = threading.Lock(), {}
+    with open(os.path.join(directory, "naive.log"), "ab") as journal:
+        n, start = 2000, time.perf_counter()
+        for i in range(n):
+            with lock:
+                account = f"acct-{i % 1000}"
+                balances[account] = balances.get(account, 100_00) - 1
+                journal.write(_record(account, -1))
+                journal.flush()
+                os.fdatasync(journal.fileno())
+        print(f"baseline (global lock, fsync per charge): {n / (time.perf_counter() - start):10,.0f} charges/s")
+
+    # 2. Async handlers: many concurrent charges, group commit
+    ledger = CreditLedger(os.path.join(directory, "async"), initial_credit=10**12)
+
+    async def run_async(total: int, concurrency: int) -> float:
+        async def client(count: int):
+            for i in range(count):
+                await ledger.charge_async(f"acct-{random.randrange(10_000)}", 1 + i % 500)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(client(total // concurrency) for _ in range(concurrency)))
+        return total / (time.perf_counter() - start)
+
+    for concurrency in (100, 1000):
+        rate = asyncio.run(run_async(200_000, concurrency))
+        print(f"async, {concurrency:>4} concurrent charges:          {rate:10,.0f} charges/s")
+    print(f"  records per fsync: {ledger.stats()['records_per_fsync']}")
+    ledger.close()
+
+    # 3. Stress: threads race for the same few accounts; no overdraft allowed
+    path, credit = os.path.join(directory, "stress"), 500_000
+    ledger = CreditLedger(path, initial_credit=credit, stripes=8, snapshot_every=20_000)
+    accounts = [f"acct-{i}" for i in range(20)]
+    net: Dict[str, int] = {account: 0 for account in accounts}  # acknowledged top-ups - charges
+    net_lock = threading.Lock()
+    declined = [0]
+
+    def worker(seed: int):
+        rng = random.Random(seed)
+        for _ in range(4000):
+            account, amount = rng.choice(accounts), rng.randint(1, 300)
+            try:
+                if rng.random() < 0.02:
+                    ledger.credit(account, amount * 10)
+                    delta = amount * 10
+                else:
+                    ledger.charge(account, amount)
+                    delta = -amount
+            except InsufficientCredit:
+                with net_lock:
+                    declined[0] += 1
+                continue
+            with net_lock:
+                net[account] += delta
+
+    threads = [threading.Thread(target=worker, args=(seed,)) for seed in range(32)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    seconds = time.perf_counter() - start
+    for account in accounts:
+        assert ledger.balance(account) == credit + net[account], account
+        assert ledger.balance(account) >= 0, f"overdraft on {account}"
+    memory = {account: ledger.balance(account) for account in accounts}
+    snapshots = ledger.stats()["snapshots"]
+    ledger.close(snapshot=False)  # leave the latest journal to replay
+    with open(sorted(Path(path).glob("journal.*.log"))[-1], "ab") as journal:
+        journal.write(b"acct-0 -99")  # torn write of an unacknowledged record
+    replayed = CreditLedger(path, initial_credit=credit)
+    assert {account: replayed.balance(account) for account in accounts} == memory, "replay differs"
+    replayed.close()
+    print(
+        f"stress: 32 threads x 4000 charges/top-ups on 20 accounts in {seconds:.1f}s, "
+        f"{declined[0]:,} declined, {snapshots} snapshots, no overdraft, "
+        f"replay (with a torn tail) matches memory"
+    )
+    shutil.rmtree(directory)
+
+
+if __name__ == "__main__":
+    benchmark()
@@ -0,0 +1,53 @@
+"""
+Stub Mail Provider
+
+Description:
+A tiny local stand-in for the external mail API used by background jobs
+(see http_client.py and background_tasks.py). Nothing is delivered; it just
+counts what it receives.
+
+How to run:
+    uvicorn mail_stub:app --port 9000
+
+Endpoints:
+- POST /send         {"to": "...", "subject": "..."}
+- POST /send-batch   {"messages": [{"to": "...", "subject": "..."}, ...]}
+- GET  /stats        how many requests and messages were received
+"""
+
+from typing import List
+
+from fastapi import FastAPI
+from pydantic import BaseModel
+
+app = FastAPI(title="Stub Mail Provider")
+
+stats = {"requests": 0, "messages": 0}
+
+
+class Message(BaseModel):
+    to: str
+    subject: str
+
+
+class Batch(BaseModel):
+    messages: List[Message]
+
+
+@app.post("/send")
+def send(message: Message):
+    stats["requests"] += 1
+    stats["messages"] += 1
+    return {"accepted": 1}
+
+
+@app.post("/send-batch")
+def send_batch(batch: Batch):
+    stats["requests"] += 1
+    stats["messages"] += len(batch.messages)
+    return {"accepted": len(batch.messages)}
+
+
+@app.get("/stats")
+def get_stats():
+    return stats
@@ -0,0 +1,279 @@
+"""
+Sparse Fieldsets (?fields=) Pushed Down into SQL and the Response Model
+
+Description:
+`GET /books?fields=id,title` returns only those fields, and only those
+columns are read from the database and serialized.
+
+- The requested fields are checked against the response model (400 for
+  unknown names) and put in model order.
+- The SELECT lists just those columns: rows come back as light tuples,
+  not ORM objects, so wide columns (descriptions, blobs) are never fetched.
+- The response model is built on the fly with pydantic.create_model and
+  cached per field combination, together with its TypeAdapter.
+- The handler returns the serialized Response itself; the route keeps its
+  full `response_model` for the OpenAPI docs.
+- Trusted mode (`FieldSet(..., trusted=True)`): rows that come out of our
+  own typed columns are not validated again. They go straight to a compiled
+  pydantic-core serializer for a TypedDict with the same fields (~3x the
+  rows/sec). Request bodies and other untrusted input are still validated.
+  A nullable column behind a field that does not accept None is refused
+  up front: a NULL would otherwise be emitted as-is (e.g. null for a bool).
+
+How to use:
+    from projection import FieldSet, Projection
+
+    book_fields = FieldSet(Book, BookORM)
+
+    @app.get("/books", response_model=List[Book])
+    def list_books(db: Session = Depends(get_session), proj: Projection = Depends(book_fields)):
+        return proj.render(db.execute(proj.select()))
+
+Benchmarks (payload size and latency on wide rows; trusted vs validated rows/sec):
+    python projection.py
+"""
+
+from functools import lru_cache
+from typing import Any, Iterable, List, Optional, Tuple, Type, get_args
+
+from fastapi import HTTPException, Query, Response, status
+from pydantic import BaseModel, TypeAdapter, create_model
+from typing_extensions import TypedDict
+from sqlalchemy import select
+from sqlalchemy.sql import Select
+
+
+@lru_cache(maxsize=256)
+def projected_model(model: Type[BaseModel], fields: Tuple[str, ...]) -> Type[BaseModel]:
+    """A model with only `fields` of `model` (same types and defaults), cached."""
+    if fields == tuple(model.model_fields):
+        return model
+    definitions = {name: (model.model_fields[name].annotation, model.model_fields[name]) for name in fields}
+    return create_model(f"{model.__name__}[{','.join(fields)}]", **definitions)
+
+
+@lru_cache(maxsize=256)
+def _adapters(model: Type[BaseModel]) -> Tuple[TypeAdapter, TypeAdapter]:
+    return TypeAdapter(model), TypeAdapter(List[model])
+
+
+@lru_cache(maxsize=256)
+def _trusted_adapters(model: Type[BaseModel]) -> Tuple[TypeAdapter, TypeAdapter]:
+    """Serializer-only adapters: a TypedDict mirroring `model`, used on plain dicts."""
+    shape = TypedDict(f"{model.__name__}Row", {name: f.annotation for name, f in model.model_fields.items()})
+    return TypeAdapter(shape), TypeAdapter(List[shape])
+
+
+def _allows_none(annotation: Any) -> bool:
+    return annotation is Any or annotation is type(None) or type(None) in get_args(annotation)
+
+
+class Projection:
+    """The fields one request asked for; hashable, so it can be part of a cache key."""
+
+    def __init__(self, model: Type[BaseModel], orm: Any, fields: Tuple[str, ...], trusted: bool = False):
+        self.fields = fields
+        self.orm = orm
+        self.trusted = trusted
+        self.model = projected_model(model, fields)
+        self._one, self._many = (_trusted_adapters if trusted else _adapters)(self.model)
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, Projection) and (self.model, self.orm, self.trusted) == (
+            other.model, other.orm, other.trusted,
+        )
+
+    def __hash__(self) -> int:
+        return hash((self.model, self.orm, self.trusted))
+
+    def columns(self) -> list:
+        return [getattr(self.orm, name) for name in self.fields]
+
+    def select(self) -> Select:
+        return select(*self.columns())
+
+    def render(self, rows: Iterable[Any]) -> Response:
+        """Rows of `select()` -> JSON array response."""
+        fields = self.fields  # dict(zip()) is ~2x faster to build and validate than Row._mapping
+        items = [dict(zip(fields, row)) for row in rows]
+        if not self.trusted:
+            items = self._many.validate_python(items)
+        return Response(self._many.dump_json(items, warnings=False), media_type="application/json")
+
+    def render_one(self, row: Any) -> Response:
+        item = dict(zip(self.fields, row))
+        if not self.trusted:
+            item = self._one.validate_python(item)
+        return Response(self._one.dump_json(item, warnings=False), media_type="application/json")
+
+
+class FieldSet:
+    """
+    Dependency parsing `?fields=a,b` for `model` (a Pydantic model) backed by `orm`.
+    `trusted=True` skips validating rows (only for columns typed like the model).
+    """
+
+    def __init__(self, model: Type[BaseModel], orm: Any, trusted: bool = False):
+        self.model = model
+        self.orm = orm
+        self.trusted = trusted
+        self.allowed = tuple(model.model_fields)
+        missing = [name for name in self.allowed if not hasattr(orm, name)]
+        if missing:
+            raise ValueError(f"{orm.__name__} has no columns for {missing}")
+        if trusted:
+            columns = orm.__table__.columns
+            nullable = [
+                name for name, field in model.model_fields.items()
+                if name in columns and columns[name].nullable and not _allows_none(field.annotation)
+            ]
+            if nullable:
+                raise ValueError(f"trusted=True needs NOT NULL columns for non-optional fields; nullable: {nullable}")
+
+    def __call__(
+        self,
+        fields: Optional[str] = Query(None, description="Comma-separated fields to return, e.g. id,title"),
+    ) -> Projection:
+        requested = {name.strip() for name in fields.split(",") if name.strip()} if fields else set()
+        unknown = requested - set(self.allowed)
+        if unknown:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Unknown fields: {sorted(unknown)}; allowed: {list(self.allowed)}",
+            )
+        chosen = tuple(name for name in self.allowed if name in requested) or self.allowed
+        return Projection(self.model, self.orm, chosen, self.trusted)
+
+
+# ------------------------------------------------------------------------------
+# Benchmark: full rows vs ?fields=id,title on a wide table
+# ------------------------------------------------------------------------------
+def benchmark(rows: int = 20_000, extra_columns: int = 30, repeat: int = 5) -> None:
+    import time
+
+    from sqlalchemy import Column, Float, Integer, String, Text, create_engine
+    from sqlalchemy.orm import Session, declarative_base
+
+    Base = declarative_base()
+    attrs = {
+        "__tablename__": "wide_books",
+        "id": Column(Integer, primary_key=True),
+        "title": Column(String, nullable=False),
+        "price": Column(Float, nullable=False),
+        "description": Column(Text, nullable=False),
+    }
+    attrs.update({f"attr_{i}": Column(String, nullable=False) for i in range(extra_columns)})
+    WideORM = type("WideORM", (Base,), attrs)
+    fields = {"id": (int, ...), "title": (str, ...), "price": (float, ...), "description": (str, ...)}
+    fields.update({f"attr_{i}": (str, ...) for i in range(extra_columns)})
+    Wide = create_model("Wide", __config__={"from_attributes": True}, **fields)
+
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    with engine.begin() as conn:
+        conn.execute(
+            WideORM.__table__.insert(),
+            [
+                {
+                    "id": i, "title": f"Book {i}", "price": 9.99, "description": "lorem ipsum " * 150,
+                    **{f"attr_{k}": f"value-{k}-{i}" for k in range(extra_columns)},
+                }
+                for i in range(rows)
+            ],
+        )
+
+    wide_fields = FieldSet(Wide, WideORM)
+    PublicWide = create_model("PublicWide", __config__={"from_attributes": True}, id=(int, ...), title=(str, ...))
+    trim = TypeAdapter(List[PublicWide])
+
+    def orm_then_trim():
+        with Session(engine) as db:  # what response_model=PublicBook does today
+            return trim.dump_json(trim.validate_python(db.query(WideORM).all(), from_attributes=True))
+
+    def projected(spec):
+        proj = wide_fields(spec)
+        with Session(engine) as db:
+            return proj.render(db.execute(proj.select())).body
+
+    cases = [
+        ("full rows (all fields)", lambda: projected(None)),
+        ("ORM load + PublicBook trim", orm_then_trim),
+        ("?fields=id,title", lambda: projected("id,title")),
+    ]
+    print(f"{rows:,} rows, {len(fields)} columns, ~{len('lorem ipsum ' * 150):,} B description")
+    for label, fn in cases:
+        body = fn()
+        start = time.perf_counter()
+        for _ in range(repeat):
+            fn()
+        ms = (time.perf_counter() - start) / repeat * 1000
+        print(f"{label:<28} {ms:8.1f} ms   {len(body) / 1e6:8.2f} MB")
+
+
+# ------------------------------------------------------------------------------
+# Benchmark: rows/sec serialized, validated vs trusted, 100k-row listing
+# ------------------------------------------------------------------------------
+def benchmark_trusted(rows: int = 100_000, repeat: int = 3) -> None:
+    import time
+
+    from sqlalchemy import Boolean, Column, Float, Integer, String, create_engine
+    from sqlalchemy.orm import Session, declarative_base
+
+    Base = declarative_base()
+
+    class BookORM(Base):
+        __tablename__ = "books"
+        id = Column(Integer, primary_key=True)
+        title = Column(String, nullable=False)
+        price = Column(Float, nullable=False)
+        in_stock = Column(Boolean, nullable=False)
+
+    class Book(BaseModel):
+        id: int
+        title: str
+        price: float
+        in_stock: bool
+
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    with engine.begin() as conn:
+        conn.execute(
+            BookORM.__table__.insert(),
+            [{"id": i, "title": f"Book {i}", "price": 9.99, "in_stock": i % 2 == 0} for i in range(rows)],
+        )
+        fetched = conn.execute(BookORM.__table__.select()).all()
+
+    validated, trusted = FieldSet(Book, BookORM)(None), FieldSet(Book, BookORM, trusted=True)(None)
+    assert validated.render(fetched).body == trusted.render(fetched).body
+
+    def orm_from_attributes():  # the previous list_books: ORM objects + from_attributes
+        adapter = TypeAdapter(List[Book])
+        with Session(engine) as db:
+            objs = db.query(BookORM).all()
+            return adapter.dump_json(adapter.validate_python(objs, from_attributes=True))
+
+    def query_and(proj):
+        with Session(engine) as db:
+            return proj.render(db.execute(proj.select())).body
+
+    print(f"{rows:,}-row listing, rows/sec")
+    cases = [
+        ("serialize only: validated", lambda: validated.render(fetched)),
+        ("serialize only: trusted", lambda: trusted.render(fetched)),
+        ("end to end: ORM + from_attributes", orm_from_attributes),
+        ("end to end: validated rows", lambda: query_and(validated)),
+        ("end to end: trusted rows", lambda: query_and(trusted)),
+    ]
+    for label, fn in cases:
+        fn()
+        start = time.perf_counter()
+        for _ in range(repeat):
+            fn()
+        seconds = (time.perf_counter() - start) / repeat
+        print(f"{label:<36} {rows / seconds:12,.0f} rows/s  {seconds * 1000:8.1f} ms")
+
+
+if __name__ == "__main__":
+    benchmark()
+    print()
+    benchmark_trusted()
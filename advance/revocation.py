@@ -0,0 +1,239 @@
+"""
+Token Revocation List with a Bloom-Filter Fast Path
+
+Description:
+Lets JWTs be revoked before they expire (logout, stolen token) without a
+database lookup on every authenticated request.
+
+- Every token carries a unique `jti` claim.
+- Revoked jtis are stored exactly in SQLite (shared by all workers on the host),
+  each with its expiry so old rows can be purged.
+- Each worker keeps an in-memory Bloom filter of revoked jtis. A check asks
+  the filter first: "no" is definite (almost every request), only "maybe"
+  goes to the exact store.
+- Workers sync incrementally: every `sync_interval` seconds they pull only
+  rows newer than the last one they saw (by sequence number). The filter is
+  rebuilt from scratch every `rebuild_interval` seconds to drop expired jtis.
+
+How to use:
+    from revocation import RevocationList
+
+    revoked = RevocationList("./revoked_tokens.db")
+    revoked.revoke(jti, expires_at)
+    if revoked.is_revoked(jti): ...
+
+Benchmark (false-positive rate, nanoseconds per check):
+    python revocation.py
+"""
+
+import math
+import sqlite3
+import threading
+import time
+from array import array
+
+
+class BloomFilter:
+    """
+    Register-blocked Bloom filter: each item sets 8 bits inside one 64-bit
+    word, so a check is one hash, one array read and one AND.
+
+    It needs ~1.5x the bits of a classic Bloom filter for the same
+    false-positive rate, but avoids k scattered memory reads and k hash
+    rounds in Python. Uses Python's built-in (per-process salted) str hash;
+    every worker builds its own filter, so that is fine.
+    """
+
+    MASK64 = (1 << 64) - 1
+
+    def __init__(self, capacity: int = 100_000, fp_rate: float = 0.001):
+        self.capacity = capacity
+        self.fp_rate = fp_rate
+        classic_bits = -capacity * math.log(fp_rate) / (math.log(2) ** 2)
+        self.words = max(1, int(classic_bits * 1.5) // 64 + 1)
+        self.size = self.words * 64
+        self.hashes = 8
+        self.bits = array("Q", bytes(8 * self.words))
+        self.count = 0
+
+    def _locate(self, item: str):
+        h = hash(item) & self.MASK64
+        g = (h * 0x9E3779B97F4A7C15) & self.MASK64  # second, independent-ish hash
+        mask = (
+            (1 << (g & 63)) | (1 << ((g >> 6) & 63)) | (1 << ((g >> 12) & 63)) | (1 << ((g >> 18) & 63))
+            | (1 << ((g >> 24) & 63)) | (1 << ((g >> 30) & 63)) | (1 << ((g >> 36) & 63)) | (1 << ((g >> 42) & 63))
+        )
+        return h % self.words, mask
+
+    def add(self, item: str) -> None:
+        index, mask = self._locate(item)
+        self.bits[index] |= mask
+        self.count += 1
+
+    def __contains__(self, item: str) -> bool:
+        index, mask = self._locate(item)
+        return self.bits[index] & mask == mask
+
+
+class RevocationList:
+    """
+    Args:
+        path: SQLite file holding the exact list (shared by local workers).
+        capacity / fp_rate: Bloom filter sizing; it is rebuilt bigger if the
+            number of live revocations outgrows `capacity`.
+        sync_interval: how often (seconds) to pull revocations made by other workers.
+        rebuild_interval: how often to rebuild the filter without expired jtis.
+    """
+
+    def __init__(
+        self,
+        path: str = "./revoked_tokens.db",
+        capacity: int = 100_000,
+        fp_rate: float = 0.001,
+        sync_interval: float = 1.0,
+        rebuild_interval: float = 3600.0,
+    ):
+        self.path = path
+        self.capacity = capacity
+        self.fp_rate = fp_rate
+        self.sync_interval = sync_interval
+        self.rebuild_interval = rebuild_interval
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self.exact_lookups = 0
+        self.false_positives = 0
+
+        conn = self._conn()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS revoked_tokens ("
+            " seq INTEGER PRIMARY KEY AUTOINCREMENT,"
+            " jti TEXT NOT NULL UNIQUE,"
+            " expires_at REAL NOT NULL)"
+        )
+        self._rebuild()
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            self._local.conn = conn
+        return conn
+
+    # -- writes -----------------------------------------------------------
+    def revoke(self, jti: str, expires_at: float) -> None:
+        """Revoke a token until `expires_at` (unix time; its `exp` claim)."""
+        self._conn().execute(
+            "INSERT OR IGNORE INTO revoked_tokens (jti, expires_at) VALUES (?, ?)",
+            (jti, expires_at),
+        )
+        with self._lock:
+            self.bloom.add(jti)  # visible in this worker immediately
+
+    # -- hot path ---------------------------------------------------------
+    def is_revoked(self, jti: str) -> bool:
+        now = time.monotonic()
+        if now >= self._next_sync:
+            self._sync(now)
+        if jti not in self.bloom:
+            return False
+        # "Maybe": confirm against the exact store
+        self.exact_lookups += 1
+        row = self._conn().execute(
+            "SELECT 1 FROM revoked_tokens WHERE jti = ? AND expires_at > ?", (jti, time.time())
+        ).fetchone()
+        if row is None:
+            self.false_positives += 1
+            return False
+        return True
+
+    # -- sync -------------------------------------------------------------
+    def _sync(self, now: float) -> None:
+        with self._lock:
+            if now < self._next_sync:
+                return  # another thread just did it
+            if now >= self._next_rebuild:
+                self._rebuild()
+                return
+            rows = self._conn().execute(
+                "SELECT seq, jti FROM revoked_tokens WHERE seq > ? ORDER BY seq", (self._last_seq,)
+            ).fetchall()
+            for seq, jti in rows:
+                self.bloom.add(jti)
+                self._last_seq = seq
+            if self.bloom.count > self.bloom.capacity:
+                self._rebuild()
+                return
+            self._next_sync = now + self.sync_interval
+
+    def _rebuild(self) -> None:
+        """Purge expired rows and build a fresh filter from the live ones."""
+        conn = self._conn()
+        conn.execute("DELETE FROM revoked_tokens WHERE expires_at <= ?", (time.time(),))
+        rows = conn.execute("SELECT seq, jti FROM revoked_tokens ORDER BY seq").fetchall()
+        bloom = BloomFilter(max(self.capacity, len(rows) * 2), self.fp_rate)
+        last_seq = 0
+        for seq, jti in rows:
+            bloom.add(jti)
+            last_seq = seq
+        self.bloom = bloom
+        self._last_seq = last_seq  # AUTOINCREMENT: newer revocations get a higher seq
+        now = time.monotonic()
+        self._next_sync = now + self.sync_interval
+        self._next_rebuild = now + self.rebuild_interval
+
+    def stats(self) -> dict:
+        return {
+            "bloom_bits": self.bloom.size,
+            "bloom_bits_per_item": round(self.bloom.size / max(1, self.bloom.count), 1),
+            "bloom_hashes": self.bloom.hashes,
+            "bloom_items": self.bloom.count,
+            "exact_lookups": self.exact_lookups,
+            "false_positives": self.false_positives,
+        }
+
+
+# ------------------------------------------------------------------------------
+# Benchmark: false-positive rate and cost per check
+# ------------------------------------------------------------------------------
+def benchmark(revoked: int = 100_000, checks: int = 200_000) -> None:
+    import os
+    import tempfile
+    import uuid
+
+    path = os.path.join(tempfile.mkdtemp(), "revoked.db")
+    rl = RevocationList(path, capacity=revoked, fp_rate=0.001, sync_interval=3600)
+    conn = rl._conn()
+    expires = time.time() + 3600
+    conn.executemany(
+        "INSERT INTO revoked_tokens (jti, expires_at) VALUES (?, ?)",
+        ((uuid.uuid4().hex, expires) for _ in range(revoked)),
+    )
+    rl._rebuild()
+
+    jtis = [uuid.uuid4().hex for _ in range(checks)]  # valid, never revoked
+    start = time.perf_counter()
+    for jti in jtis:
+        rl.is_revoked(jti)
+    per_check = (time.perf_counter() - start) / checks
+
+    start = time.perf_counter()
+    for jti in jtis:
+        conn.execute("SELECT 1 FROM revoked_tokens WHERE jti = ?", (jti,)).fetchone()
+    per_query = (time.perf_counter() - start) / checks
+
+    start = time.perf_counter()
+    for jti in jtis:
+        pass
+    loop = (time.perf_counter() - start) / checks
+    per_check -= loop
+    per_query -= loop
+
+    print(f"Bloom filter: {rl.bloom.size:,} bits, {rl.bloom.size / max(1, rl.bloom.count):.1f} bits per item, {revoked:,} revoked jtis")
+    print(f"false positives: {rl.false_positives} / {checks:,} = {rl.false_positives / checks:.4%} (target 0.1%)")
+    print(f"is_revoked():    {per_check * 1e9:,.0f} ns per check")
+    print(f"SQLite lookup:   {per_query * 1e9:,.0f} ns per check (without the filter)")
+
+
+if __name__ == "__main__":
+    benchmark()
@@ -0,0 +1,218 @@
+"""
+Incremental Report Rollups (SQLAlchemy)
+
+Description:
+Quarterly sales reports over millions of order rows, answered from small
+pre-aggregated summary rows instead of scanning the orders table.
+
+- `sales_rollups` holds one row per (granularity, period):
+      day     period = 20250314
+      month   period = 202503
+      quarter period = 20251
+  with order count, units sold and revenue (integer cents, so sums are exact).
+- On write: `record_order()` inserts the order and bumps its day, month and
+  quarter rows in the same transaction (SQLite UPSERT).
+- Bulk loads may insert orders directly (rolled_up = false); the periodic
+  `compact()` job aggregates those with one GROUP BY and marks them done.
+  It runs under `BEGIN IMMEDIATE` (SQLite's write lock), so two concurrent
+  runs cannot both read and count the same pending orders.
+- `quarter_report()` is a primary-key lookup: O(1) whatever the row count.
+- `verify_quarter()` recomputes the quarter from the raw orders and compares.
+
+How to use:
+    from rollups import RollupEngine
+
+    rollups = RollupEngine("sqlite:///./reports.db")
+    with rollups.session() as db:
+        rollups.record_order(db, book_id=1, quantity=2, amount_cents=5998)
+        report = rollups.quarter_report(db, 2025, 1)
+"""
+
+from contextlib import contextmanager
+from datetime import date, datetime
+from typing import Iterator, Optional
+
+from sqlalchemy import (
+    Boolean, Column, DateTime, Integer, String, create_engine, event, func, select, update,
+)
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session, declarative_base, sessionmaker
+
+Base = declarative_base()
+
+
+# -------------------------------------------------------------------
+# Tables
+# -------------------------------------------------------------------
+class OrderORM(Base):
+    __tablename__ = "orders"
+
+    id = Column(Integer, primary_key=True)
+    book_id = Column(Integer, nullable=False, index=True)
+    quantity = Column(Integer, nullable=False)
+    amount_cents = Column(Integer, nullable=False)
+    created_at = Column(DateTime, nullable=False, index=True)
+    rolled_up = Column(Boolean, nullable=False, default=False, index=True)
+
+
+class SalesRollup(Base):
+    __tablename__ = "sales_rollups"
+
+    granularity = Column(String, primary_key=True)  # "day" | "month" | "quarter"
+    period = Column(Integer, primary_key=True)
+    orders = Column(Integer, nullable=False, default=0)
+    units = Column(Integer, nullable=False, default=0)
+    revenue_cents = Column(Integer, nullable=False, default=0)
+
+
+def day_key(d: date) -> int:
+    return d.year * 10000 + d.month * 100 + d.day
+
+
+def month_key(d: date) -> int:
+    return d.year * 100 + d.month
+
+
+def quarter_key(year: int, quarter: int) -> int:
+    return year * 10 + quarter
+
+
+def quarter_of(d: date) -> int:
+    return (d.month - 1) // 3 + 1
+
+
+# -------------------------------------------------------------------
+# Engine
+# -------------------------------------------------------------------
+class RollupEngine:
+    def __init__(self, url: str = "sqlite:///./reports.db"):
+        self.engine = create_engine(url, connect_args={"check_same_thread": False})
+        event.listen(self.engine, "connect", self._configure)
+        event.listen(self.engine, "begin", self._begin)
+        self.SessionLocal = sessionmaker(bind=self.engine, autoflush=False, autocommit=False)
+        Base.metadata.create_all(bind=self.engine)
+
+    @staticmethod
+    def _configure(dbapi_conn, record) -> None:
+        # Let SQLAlchemy emit BEGIN itself, so compact() can ask for IMMEDIATE
+        dbapi_conn.isolation_level = None
+
+    @staticmethod
+    def _begin(conn) -> None:
+        mode = conn.get_execution_options().get("sqlite_begin", "DEFERRED")
+        conn.exec_driver_sql(f"BEGIN {mode}")
+
+    @contextmanager
+    def session(self) -> Iterator[Session]:
+        db = self.SessionLocal()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    def get_session(self) -> Iterator[Session]:
+        """FastAPI dependency."""
+        with self.session() as db:
+            yield db
+
+    # -- write path -------------------------------------------------------
+    def _bump(self, db: Session, when: date, orders: int, units: int, revenue_cents: int) -> None:
+        keys = [
+            ("day", day_key(when)),
+            ("month", month_key(when)),
+            ("quarter", quarter_key(when.year, quarter_of(when))),
+        ]
+        for granularity, period in keys:
+            stmt = sqlite_insert(SalesRollup).values(
+                granularity=granularity, period=period,
+                orders=orders, units=units, revenue_cents=revenue_cents,
+            )
+            stmt = stmt.on_conflict_do_update(
+                index_elements=["granularity", "period"],
+                set_={
+                    "orders": SalesRollup.orders + stmt.excluded.orders,
+                    "units": SalesRollup.units + stmt.excluded.units,
+                    "revenue_cents": SalesRollup.revenue_cents + stmt.excluded.revenue_cents,
+                },
+            )
+            db.execute(stmt)
+
+    def record_order(
+        self, db: Session, book_id: int, quantity: int, amount_cents: int,
+        created_at: Optional[datetime] = None,
+    ) -> OrderORM:
+        """Insert an order and update its rollups atomically."""
+        order = OrderORM(
+            book_id=book_id, quantity=quantity, amount_cents=amount_cents,
+            created_at=created_at or datetime.utcnow(), rolled_up=True,
+        )
+        db.add(order)
+        self._bump(db, order.created_at.date(), 1, quantity, amount_cents)
+        db.commit()
+        db.refresh(order)
+        return order
+
+    def compact(self, db: Session) -> int:
+        """
+        Periodic job: fold orders inserted without rollups (bulk loads) into
+        the summary rows. Returns how many orders were processed.
+        """
+        if db.in_transaction():
+            raise RuntimeError("compact() must start its own transaction (pass a fresh session)")
+        # Write lock first: a concurrent run waits here, then sees the rows as done
+        db.connection(execution_options={"sqlite_begin": "IMMEDIATE"})
+        # Fix the batch by id so rows inserted meanwhile wait for the next run
+        max_id = db.scalar(select(func.max(OrderORM.id)).where(OrderORM.rolled_up.is_(False)))
+        if max_id is None:
+            return 0
+        batch = (OrderORM.rolled_up.is_(False), OrderORM.id <= max_id)
+        day = func.date(OrderORM.created_at)
+        pending = db.execute(
+            select(day, func.count(), func.sum(OrderORM.quantity), func.sum(OrderORM.amount_cents))
+            .where(*batch)
+            .group_by(day)
+        ).all()
+        processed = 0
+        for day_str, count, units, revenue in pending:
+            self._bump(db, date.fromisoformat(day_str), count, units, revenue)
+            processed += count
+        db.execute(update(OrderORM).where(*batch).values(rolled_up=True))
+        db.commit()
+        return processed
+
+    # -- read path --------------------------------------------------------
+    def _row(self, db: Session, granularity: str, period: int) -> dict:
+        row = db.get(SalesRollup, (granularity, period))
+        if row is None:
+            return {"orders": 0, "units": 0, "revenue": 0.0}
+        return {"orders": row.orders, "units": row.units, "revenue": row.revenue_cents / 100}
+
+    def quarter_report(self, db: Session, year: int, quarter: int) -> dict:
+        """Quarter totals plus the three monthly rows: four primary-key lookups."""
+        first_month = (quarter - 1) * 3 + 1
+        months = [
+            {"month": m, **self._row(db, "month", year * 100 + m)}
+            for m in range(first_month, first_month + 3)
+        ]
+        totals = self._row(db, "quarter", quarter_key(year, quarter))
+        return {"year": year, "quarter": quarter, **totals, "months": months}
+
+    def verify_quarter(self, db: Session, year: int, quarter: int) -> dict:
+        """Recompute the quarter from raw orders and compare with the rollup."""
+        first_month = (quarter - 1) * 3 + 1
+        start = datetime(year, first_month, 1)
+        end = datetime(year + 1, 1, 1) if quarter == 4 else datetime(year, first_month + 3, 1)
+        count, units, revenue = db.execute(
+            select(
+                func.count(),
+                func.coalesce(func.sum(OrderORM.quantity), 0),
+                func.coalesce(func.sum(OrderORM.amount_cents), 0),
+            ).where(
+                OrderORM.created_at >= start,
+                OrderORM.created_at < end,
+                OrderORM.rolled_up.is_(True),  # pending rows are not in the rollup yet
+            )
+        ).one()
+        recomputed = {"orders": count, "units": units, "revenue": revenue / 100}
+        stored = self._row(db, "quarter", quarter_key(year, quarter))
+        return {"consistent": stored == recomputed, "rollup": stored, "recomputed": recomputed}
@@ -0,0 +1,231 @@
+"""
+Threadpool Sizing, Event-Loop Lag and Saturation Metrics
+
+Description:
+Sync `def` handlers (and sync dependencies) run in AnyIO's worker
+threadpool, which admits 40 at a time by default; under load the rest
+queue without any sign. RuntimeMonitor makes that visible.
+
+- Threadpool capacity is configurable per app (`threadpool_size`).
+- Queue wait: every `probe_interval` seconds a no-op is sent through the
+  same threadpool; the time until it starts running is what a new request
+  would wait. Active and queued counts come from the limiter itself.
+- Event-loop lag: a task sleeps `lag_interval` and records how late it
+  wakes up.
+- Watchdog: a separate OS thread notices when the loop has not ticked for
+  `block_threshold` seconds and logs the loop thread's current stack (the
+  blocking call), once per stall.
+- Per-route execution counts and time, split into sync (threadpool) and
+  async (event loop) handlers; handlers that report an `execution_mode()`
+  (see inline_routes.py) are counted under the mode they actually ran in.
+- Everything is reported by GET /stats/runtime (an async handler, so it
+  answers even when the threadpool is saturated).
+
+How to use:
+    from runtime_metrics import RuntimeMonitor
+
+    app = FastAPI()
+    RuntimeMonitor(threadpool_size=100).install(app)   # middleware + /stats/runtime + lifespan
+"""
+
+import asyncio
+import logging
+import statistics
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Deque, Dict, Optional
+
+import anyio
+from fastapi import APIRouter, FastAPI
+
+logger = logging.getLogger("runtime_metrics")
+
+
+def summarize(samples: Deque[float]) -> dict:
+    """Milliseconds: last / avg / p99 / max of recent samples."""
+    if not samples:
+        return {"last": None, "avg": None, "p99": None, "max": None, "samples": 0}
+    ordered = sorted(samples)
+    return {
+        "last": round(samples[-1] * 1000, 3),
+        "avg": round(statistics.fmean(ordered) * 1000, 3),
+        "p99": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))] * 1000, 3),
+        "max": round(ordered[-1] * 1000, 3),
+        "samples": len(ordered),
+    }
+
+
+class RouteStats:
+    __slots__ = ("mode", "modes", "count", "total")
+
+    def __init__(self, mode):
+        self.mode = mode  # "sync" | "async", or a callable returning the current mode
+        self.modes: Dict[str, int] = {}
+        self.count = 0
+        self.total = 0.0
+
+
+class RuntimeMonitor:
+    def __init__(
+        self,
+        threadpool_size: Optional[int] = None,
+        probe_interval: float = 1.0,
+        lag_interval: float = 0.1,
+        block_threshold: float = 0.5,
+        window: int = 600,
+        path: str = "/stats/runtime",
+    ):
+        self.threadpool_size = threadpool_size
+        self.probe_interval = probe_interval
+        self.lag_interval = lag_interval
+        self.block_threshold = block_threshold
+        self.queue_wait: Deque[float] = deque(maxlen=window)
+        self.loop_lag: Deque[float] = deque(maxlen=window)
+        self.routes: Dict[str, RouteStats] = {}
+        self.blocked_calls = 0
+        self.last_block: Optional[dict] = None
+        self._heartbeat = time.monotonic()
+        self._probe_submitted: Optional[float] = None
+        self._loop_thread_id: Optional[int] = None
+        self._stop = threading.Event()
+        self._task_group = None
+
+        self.router = APIRouter()
+        self.router.add_api_route(path, self.report, methods=["GET"], tags=["metrics"])
+
+    # -- wiring -----------------------------------------------------------
+    def install(self, app: FastAPI) -> "RuntimeMonitor":
+        """Add the middleware, the stats route, and start/stop with the app's lifespan."""
+        app.add_middleware(RouteStatsMiddleware, monitor=self)
+        app.include_router(self.router)
+        inner = app.router.lifespan_context
+
+        @asynccontextmanager
+        async def lifespan(app):
+            async with self:
+                async with inner(app) as state:
+                    yield state
+
+        app.router.lifespan_context = lifespan
+        return self
+
+    async def __aenter__(self) -> "RuntimeMonitor":
+        limiter = anyio.to_thread.current_default_thread_limiter()
+        if self.threadpool_size is not None:
+            limiter.total_tokens = self.threadpool_size
+        self._loop_thread_id = threading.get_ident()
+        self._heartbeat = time.monotonic()
+        self._stop.clear()
+        self._task_group = anyio.create_task_group()
+        await self._task_group.__aenter__()
+        self._task_group.start_soon(self._measure_lag)
+        self._task_group.start_soon(self._probe_threadpool)
+        threading.Thread(target=self._watchdog, name="loop-watchdog", daemon=True).start()
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        self._stop.set()
+        self._task_group.cancel_scope.cancel()
+        await self._task_group.__aexit__(None, None, None)
+
+    # -- samplers ---------------------------------------------------------
+    async def _measure_lag(self) -> None:
+        while True:
+            start = time.perf_counter()
+            await anyio.sleep(self.lag_interval)
+            self.loop_lag.append(max(0.0, time.perf_counter() - start - self.lag_interval))
+            self._heartbeat = time.monotonic()
+
+    async def _probe_threadpool(self) -> None:
+        while True:
+            submitted = self._probe_submitted = time.perf_counter()
+            started = await anyio.to_thread.run_sync(time.perf_counter)
+            self._probe_submitted = None
+            self.queue_wait.append(started - submitted)
+            await anyio.sleep(self.probe_interval)
+
+    def _watchdog(self) -> None:
+        reported = None
+        while not self._stop.wait(self.block_threshold / 4):
+            heartbeat = self._heartbeat
+            stalled = time.monotonic() - heartbeat - self.lag_interval
+            if stalled < self.block_threshold or reported == heartbeat:
+                continue
+            reported = heartbeat  # one report per stall
+            frame = sys._current_frames().get(self._loop_thread_id)
+            stack = "".join(traceback.format_stack(frame)) if frame is not None else "<unknown>"
+            self.blocked_calls += 1
+            self.last_block = {"at": time.time(), "blocked_ms_when_seen": round(stalled * 1000), "stack": stack}
+            logger.warning("Event loop blocked for %.0f ms; loop thread stack:\n%s", stalled * 1000, stack)
+
+    # -- per-route counts -------------------------------------------------
+    def record(self, route, seconds: float) -> None:
+        key = f"{','.join(sorted(getattr(route, 'methods', None) or ()))} {route.path}"
+        stats = self.routes.get(key)
+        if stats is None:
+            call = getattr(getattr(route, "dependant", None), "call", route.endpoint)
+            mode = getattr(call, "execution_mode", None)
+            if mode is None:
+                mode = "async" if asyncio.iscoroutinefunction(call) else "sync"
+            stats = self.routes[key] = RouteStats(mode)
+        mode = stats.mode if isinstance(stats.mode, str) else stats.mode()
+        stats.modes[mode] = stats.modes.get(mode, 0) + 1
+        stats.count += 1
+        stats.total += seconds
+
+    # -- report -----------------------------------------------------------
+    def _probe_waiting_ms(self) -> Optional[float]:
+        submitted = self._probe_submitted
+        return round((time.perf_counter() - submitted) * 1000, 3) if submitted is not None else None
+
+    async def report(self) -> dict:
+        limiter = anyio.to_thread.current_default_thread_limiter()
+        limiter_stats = limiter.statistics()
+        by_mode: Dict[str, int] = {}
+        for stats in self.routes.values():
+            for mode, count in stats.modes.items():
+                by_mode[mode] = by_mode.get(mode, 0) + count
+        return {
+            "threadpool": {
+                "capacity": limiter.total_tokens,
+                "active": limiter_stats.borrowed_tokens,
+                "queued": limiter_stats.tasks_waiting,
+                "queue_wait_ms": summarize(self.queue_wait),
+                # a probe still queued right now (saturation not yet in the samples)
+                "probe_waiting_ms": self._probe_waiting_ms(),
+            },
+            "event_loop": {
+                "lag_ms": summarize(self.loop_lag),
+                "blocked_calls": self.blocked_calls,
+                "last_block": self.last_block,
+            },
+            "executions": by_mode,
+            "routes": {
+                key: {"modes": s.modes, "count": s.count, "avg_ms": round(s.total / s.count * 1000, 3)}
+                for key, s in sorted(self.routes.items())
+            },
+        }
+
+
+class RouteStatsMiddleware:
+    """Times each HTTP request and files it under the route that handled it."""
+
+    def __init__(self, app, monitor: RuntimeMonitor):
+        self.app = app
+        self.monitor = monitor
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            route = scope.get("route")  # set by the router on the shared scope
+            if route is not None:
+                self.monitor.record(route, time.perf_counter() - start)
@@ -4,24 +4,40 @@ Security: OAuth2 + JWT Example
 Run the app with:
     uvicorn security_oauth2:app --reload
 
+Endpoints:
+    POST /token    log in, get a JWT
+    GET  /me       who am I (requires the JWT)
+    GET  /me/permissions  permissions from the roles in the JWT
+    GET  /admin/users     admin only (role-based authorization)
+    POST /logout   revoke the JWT used for the call
+    POST /revoke   revoke another of your tokens
+
 Requirements (install with pip):
     fastapi
     uvicorn
     PyJWT
 """
 
+import uuid
 from datetime import datetime, timedelta
 from typing import Optional
 
-from fastapi import FastAPI, Depends, HTTPException, status
+from fastapi import FastAPI, Body, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 import jwt  # from PyJWT
 
+from rate_limiting import LoadShedder, RateLimit, TokenBucket
+from rbac import Permission, PermissionGuard, permissions_of
+from revocation import RevocationList
+
 # ------------------------------------------------------------------------------
 # FastAPI app initialization
 # ------------------------------------------------------------------------------
 app = FastAPI(title="OAuth2 JWT Example")
 
+# Answer 503 early instead of queueing forever when the worker is saturated
+app.add_middleware(LoadShedder, max_concurrency=64, target_wait=0.1)
+
 # ------------------------------------------------------------------------------
 # JWT / OAuth2 configuration
 # ------------------------------------------------------------------------------
@@ -33,6 +49,10 @@ ALGORITHM = "HS256"
 # tokenUrl should match the path for obtaining tokens (our /token endpoint)
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/token")
 
+# Revoked token ids (jti). Checked through an in-memory Bloom filter, so the
+# SQLite file is only read when the filter says "maybe revoked".
+revoked_tokens = RevocationList("./revoked_tokens.db")
+
 # ------------------------------------------------------------------------------
 # Fake user store (demo only)
 # ------------------------------------------------------------------------------
@@ -42,7 +62,13 @@ fake_user_db = {
         "username": "Bahubali",
         # Never store plain passwords in production. Use hashed passwords!
         "password": "devsena",  # demo only
-    }
+        "roles": ["admin"],
+    },
+    "Kattappa": {
+        "username": "Kattappa",
+        "password": "sword",  # demo only
+        "roles": ["viewer"],
+    },
 }
 
 
@@ -58,26 +84,37 @@ def authenticate_user(username: str, password: str) -> Optional[dict]:
     return user
 
 
-def create_access_token(subject: str, expires_delta: timedelta) -> str:
+def create_access_token(subject: str, expires_delta: timedelta, roles: Optional[list] = None) -> str:
     """
     Create a signed JWT token with:
     - sub: the subject (e.g., username)
     - exp: expiration time
+    - jti: unique token id (used to revoke this token)
+    - roles: role names, used for authorization (see rbac.py)
     """
     payload = {
         "sub": subject,
         "exp": datetime.utcnow() + expires_delta,
+        "jti": uuid.uuid4().hex,
+        "roles": roles or [],
     }
     token = jwt.encode(payload, SECRET_KEY, algorithm=ALGORITHM)
     return token
 
 
+# ------------------------------------------------------------------------------
+# Rate limiting
+# ------------------------------------------------------------------------------
+# Each client IP may try 5 logins in a burst, then 1 per second (429 after that)
+login_rate_limit = RateLimit(TokenBucket(rate=1, capacity=5), scope="login")
+
+
 # ------------------------------------------------------------------------------
 # Routes
 # ------------------------------------------------------------------------------
 
 
-@app.post("/token")
+@app.post("/token", dependencies=[Depends(login_rate_limit)])
 def login(form: OAuth2PasswordRequestForm = Depends()):
     """
     OAuth2 Password Flow endpoint.
@@ -103,17 +140,19 @@ def login(form: OAuth2PasswordRequestForm = Depends()):
 
     # Token will be valid for 30 minutes
     access_token_expires = timedelta(minutes=30)
-    token = create_access_token(subject=user["username"], expires_delta=access_token_expires)
+    token = create_access_token(
+        subject=user["username"],
+        expires_delta=access_token_expires,
+        roles=user.get("roles", []),
+    )
 
     return {"access_token": token, "token_type": "bearer"}
 
 
-def get_current_user(token: str = Depends(oauth2_scheme)) -> str:
+def decode_token(token: str) -> dict:
     """
-    Dependency that:
-    - Extracts the JWT from the Authorization header (via OAuth2PasswordBearer)
-    - Decodes and verifies it
-    - Returns the username (sub) if valid
+    Decode and verify a JWT, rejecting expired or revoked tokens.
+    Returns the payload (sub, exp, jti).
     """
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
@@ -139,7 +178,33 @@ def get_current_user(token: str = Depends(oauth2_scheme)) -> str:
             headers={"WWW-Authenticate": "Bearer"},
         )
 
-    return username
+    jti = payload.get("jti")
+    if jti is None or revoked_tokens.is_revoked(jti):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Token has been revoked",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    return payload
+
+
+def get_token_payload(token: str = Depends(oauth2_scheme)) -> dict:
+    """Dependency returning the verified payload of the bearer token."""
+    return decode_token(token)
+
+
+def get_current_user(payload: dict = Depends(get_token_payload)) -> str:
+    """
+    Dependency that:
+    - Extracts the JWT from the Authorization header (via OAuth2PasswordBearer)
+    - Decodes and verifies it (signature, expiry, revocation)
+    - Returns the username (sub) if valid
+    """
+    return payload["sub"]
+
+
+# Route-level permission checks: one bitwise AND per request
+require = PermissionGuard(get_token_payload)
 
 
 @app.get("/me")
@@ -153,6 +218,47 @@ def me(current_user: str = Depends(get_current_user)):
     return {"username": current_user}
 
 
+@app.get("/me/permissions")
+def my_permissions(mask: int = Depends(require())):
+    """Permissions granted by the roles in the current token."""
+    return {"permissions": permissions_of(mask)}
+
+
+@app.get("/admin/users", dependencies=[Depends(require(Permission.USERS_MANAGE))])
+def list_users():
+    """Admins only (USERS_MANAGE). Viewers get 403."""
+    return [{"username": u["username"], "roles": u["roles"]} for u in fake_user_db.values()]
+
+
+@app.post("/logout")
+def logout(payload: dict = Depends(get_token_payload)):
+    """
+    Revoke the token used for this request. Using it again returns 401.
+    """
+    revoked_tokens.revoke(payload["jti"], payload["exp"])
+    return {"revoked": payload["jti"]}
+
+
+@app.post("/revoke")
+def revoke(token: str = Body(..., embed=True), current_user: str = Depends(get_current_user)):
+    """
+    Revoke another token of the current user (e.g. a leaked one).
+
+    Body: {"token": "<jwt>"}
+    """
+    payload = decode_token(token)
+    if payload["sub"] != current_user:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not your token")
+    revoked_tokens.revoke(payload["jti"], payload["exp"])
+    return {"revoked": payload["jti"]}
+
+
+@app.get("/stats/revocation")
+def revocation_stats():
+    """Bloom filter size and how often the exact store had to be consulted."""
+    return revoked_tokens.stats()
+
+
 # ------------------------------------------------------------------------------
 # Optional: run with `python main.py`
 # ------------------------------------------------------------------------------
@@ -0,0 +1,420 @@
+"""
+SQLite Sharding by Key with Consistent Hashing
+
+Description:
+Splits rows scoped by a key (e.g. `catalog_id`) over N SQLite files, so
+writes to different shards do not queue on one database's single writer
+lock. Each shard commits on its own thread; how much that adds depends on
+where the time goes. When commits wait on fsync or on the lock, shards
+overlap; when Python execution is the limit (measured on one CPU: flat
+from 1 to 8 shards), sharding adds no throughput and the gain over a
+single file comes from group commit alone.
+
+- HashRing: each shard owns many points ("virtual nodes") on a 64-bit hash
+  ring; a key belongs to the first point at or after its hash. Going from N
+  to N+1 shards moves only ~1/(N+1) of the keys.
+- One dedicated worker thread and connection per shard: every query for a
+  shard runs on that thread, so a shard never has two writers fighting
+  over its lock while other shards keep writing.
+- Group commit: the shard thread takes everything queued for it and runs
+  it in one transaction (one fsync), each job in its own SAVEPOINT so a
+  failing job is rolled back alone. A caller's future resolves only after
+  the commit, so an acknowledged write is durable.
+- Scatter-gather: `scatter(fn)` runs `fn` on every shard at once.
+  `merge(fetch, key)` streams rows from all shards in global order with a
+  k-way heap merge, pulling one keyset-paginated batch per shard at a time
+  (no OFFSET, no full result in memory).
+- Rebalancing: `rebalance(old, new)` copies every key whose owner changed
+  to its new shard, then deletes it from the old one (idempotent, so it
+  can be re-run after an interruption). Run it while writes are stopped.
+
+How to use:
+    from sharding import ShardedDatabase
+
+    db = ShardedDatabase.from_directory("./shards", count=4, metadata=Base.metadata)
+    await db.run(catalog_id, lambda conn: conn.execute(insert(...)))
+    async for row in db.merge(fetch_page, key=lambda r: (r.catalog_id, r.id), limit=100):
+        ...
+
+Rebalance (e.g. 4 -> 6 shards; tables are reflected from the files):
+    python sharding.py rebalance ./shards 4 6 [--key catalog_id]
+
+Benchmark (write throughput for 1, 2, 4, 8 shards):
+    python sharding.py
+"""
+
+import asyncio
+import bisect
+import hashlib
+import heapq
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, AsyncIterator, Callable, Dict, Hashable, List, Optional, Sequence
+
+from sqlalchemy import MetaData, create_engine, delete, event, insert, select
+from sqlalchemy.engine import Connection
+
+
+def _hash(value: str) -> int:
+    return int.from_bytes(hashlib.blake2b(value.encode(), digest_size=8).digest(), "big")
+
+
+class HashRing:
+    def __init__(self, nodes: Sequence[str], vnodes: int = 160):
+        points = sorted((_hash(f"{node}#{i}"), node) for node in nodes for i in range(vnodes))
+        self._hashes = [h for h, _ in points]
+        self._nodes = [node for _, node in points]
+
+    def node_for(self, key: Hashable) -> str:
+        i = bisect.bisect_left(self._hashes, _hash(str(key)))
+        return self._nodes[i % len(self._nodes)]
+
+
+# ------------------------------------------------------------------------------
+# Shards: one engine, one worker thread, one connection each
+# ------------------------------------------------------------------------------
+class Shard:
+    def __init__(self, name: str, url: str, max_batch: int = 256):
+        self.name = name
+        self.url = url
+        self.max_batch = max_batch
+        self.engine = create_engine(url)
+        event.listen(self.engine, "connect", self._configure)
+        event.listen(self.engine, "begin", lambda conn: conn.exec_driver_sql("BEGIN"))
+        self.batches = 0
+        self.jobs = 0
+        self._conn: Optional[Connection] = None
+        self._queue: "queue.SimpleQueue" = queue.SimpleQueue()
+        self._thread = threading.Thread(target=self._worker, name=name, daemon=True)
+        self._thread.start()
+
+    @staticmethod
+    def _configure(dbapi_conn, record) -> None:
+        # Let SQLAlchemy emit BEGIN itself, so SAVEPOINTs nest inside it
+        dbapi_conn.isolation_level = None
+        dbapi_conn.execute("PRAGMA journal_mode=WAL")
+        dbapi_conn.execute("PRAGMA busy_timeout=5000")
+
+    # -- the shard's thread -------------------------------------------------
+    def _worker(self) -> None:
+        while True:
+            jobs = [self._queue.get()]
+            while len(jobs) < self.max_batch:
+                try:
+                    jobs.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            stop = any(job is None for job in jobs)
+            # Skip jobs whose caller was cancelled while queued (wrap_future
+            # cancels the concurrent future too); the rest can no longer be cancelled
+            jobs = [job for job in jobs if job is not None and job[1].set_running_or_notify_cancel()]
+            if jobs:
+                try:
+                    self._execute(jobs)
+                except Exception as exc:  # e.g. engine.connect() failed: fail this batch, keep the thread
+                    for _, future in jobs:
+                        if not future.done():
+                            future.set_exception(exc)
+                    if self._conn is not None:
+                        try:
+                            self._conn.close()
+                        except Exception:
+                            pass
+                        self._conn = None
+            if stop:
+                if self._conn is not None:
+                    self._conn.close()
+                return
+
+    def _execute(self, jobs: List[tuple]) -> None:
+        """
+        Group commit: everything queued for this shard runs in ONE transaction
+        (one fsync), each job inside its own SAVEPOINT so a failing job is
+        rolled back alone. Futures resolve only after the commit.
+        """
+        if self._conn is None:
+            self._conn = self.engine.connect()
+        conn = self._conn
+        self.batches += 1
+        self.jobs += len(jobs)
+        outcomes = []
+        try:
+            with conn.begin():
+                if len(jobs) == 1:
+                    outcomes.append((jobs[0][1], jobs[0][0](conn), None))
+                else:
+                    # Plain SAVEPOINT statements on the driver connection: SQLAlchemy's
+                    # begin_nested() recompiles them on every call (~3x the cost of an insert)
+                    raw = conn.connection.dbapi_connection
+                    for fn, future in jobs:
+                        raw.execute("SAVEPOINT job")
+                        try:
+                            outcomes.append((future, fn(conn), None))
+                            raw.execute("RELEASE SAVEPOINT job")
+                        except Exception as exc:
+                            raw.execute("ROLLBACK TO SAVEPOINT job")
+                            raw.execute("RELEASE SAVEPOINT job")
+                            outcomes.append((future, None, exc))
+        except Exception as exc:  # the commit itself (or a single job) failed
+            outcomes = [(future, None, exc) for _, future in jobs]
+        for future, result, exc in outcomes:
+            if exc is None:
+                future.set_result(result)
+            else:
+                future.set_exception(exc)
+
+    # -- callers ------------------------------------------------------------
+    def _enqueue(self, fn: Callable[[Connection], Any]) -> Future:
+        future: Future = Future()
+        self._queue.put((fn, future))
+        return future
+
+    def submit(self, fn: Callable[[Connection], Any]) -> "asyncio.Future":
+        """Run `fn(conn)` on the shard's thread, inside a transaction."""
+        return asyncio.wrap_future(self._enqueue(fn))
+
+    def run_sync(self, fn: Callable[[Connection], Any]) -> Any:
+        """Blocking variant for scripts and tools."""
+        return self._enqueue(fn).result()
+
+    def close(self) -> None:
+        self._queue.put(None)
+        self._thread.join()
+        self.engine.dispose()
+
+
+class ShardedDatabase:
+    def __init__(self, urls: Dict[str, str], metadata: Optional[MetaData] = None, vnodes: int = 160):
+        self.shards: Dict[str, Shard] = {name: Shard(name, url) for name, url in urls.items()}
+        self.ring = HashRing(list(urls), vnodes)
+        if metadata is not None:
+            for shard in self.shards.values():
+                shard.run_sync(metadata.create_all)
+
+    @classmethod
+    def from_directory(cls, directory: str, count: int, metadata: Optional[MetaData] = None) -> "ShardedDatabase":
+        """Shards named shard-0..shard-{count-1}, stored as <directory>/shard-<i>.db."""
+        os.makedirs(directory, exist_ok=True)
+        urls = {f"shard-{i}": f"sqlite:///{os.path.join(directory, f'shard-{i}.db')}" for i in range(count)}
+        return cls(urls, metadata)
+
+    def shard_for(self, key: Hashable) -> Shard:
+        return self.shards[self.ring.node_for(key)]
+
+    async def run(self, key: Hashable, fn: Callable[[Connection], Any]) -> Any:
+        """Run `fn(conn)` on the shard owning `key`."""
+        return await self.shard_for(key).submit(fn)
+
+    async def scatter(self, fn: Callable[[Connection], Any]) -> List[Any]:
+        """Run `fn(conn)` on every shard concurrently; results in shard order."""
+        return list(await asyncio.gather(*(shard.submit(fn) for shard in self.shards.values())))
+
+    async def merge(
+        self,
+        fetch: Callable[[Connection, Optional[tuple], int], List[Any]],
+        key: Callable[[Any], tuple],
+        after: Optional[tuple] = None,
+        limit: Optional[int] = None,
+        batch: int = 500,
+    ) -> AsyncIterator[Any]:
+        """
+        Rows of all shards in ascending `key` order. `fetch(conn, after, n)`
+        returns up to n rows with key > `after` (None: from the start), ordered
+        by key. Each shard is asked for its next batch only when its buffer
+        runs out, so a page of `limit` rows reads about `limit` rows per shard.
+        """
+        if limit is not None:
+            batch = max(1, min(batch, limit))
+        shards = list(self.shards.values())
+
+        def page(since):
+            return lambda conn: fetch(conn, since, batch)
+
+        buffers = await asyncio.gather(*(shard.submit(page(after)) for shard in shards))
+        positions = [0] * len(shards)
+        heap = [(key(rows[0]), i) for i, rows in enumerate(buffers) if rows]
+        heapq.heapify(heap)
+        emitted = 0
+        while heap:
+            row_key, i = heapq.heappop(heap)
+            yield buffers[i][positions[i]]
+            emitted += 1
+            if limit is not None and emitted >= limit:
+                return
+            positions[i] += 1
+            if positions[i] == len(buffers[i]):
+                if len(buffers[i]) < batch:
+                    continue  # shard exhausted
+                buffers[i], positions[i] = await shards[i].submit(page(row_key)), 0
+                if not buffers[i]:
+                    continue
+            heapq.heappush(heap, (key(buffers[i][positions[i]]), i))
+
+    def stats(self) -> Dict[str, dict]:
+        return {
+            name: {"jobs": s.jobs, "commits": s.batches, "jobs_per_commit": round(s.jobs / s.batches, 1) if s.batches else None}
+            for name, s in self.shards.items()
+        }
+
+    def close(self) -> None:
+        for shard in self.shards.values():
+            shard.close()
+
+
+# ------------------------------------------------------------------------------
+# Rebalancing
+# ------------------------------------------------------------------------------
+def rebalance(source: ShardedDatabase, target: ShardedDatabase, key_column: str = "catalog_id") -> Dict[str, int]:
+    """
+    Move every key whose owner differs between `source` and `target`, for
+    every table that has `key_column`. Copy first, then delete: re-running
+    after an interruption finishes the job without losing rows.
+    """
+    moved = {"keys": 0, "rows": 0, "kept": 0}
+    for shard in source.shards.values():
+        metadata = MetaData()
+        shard.run_sync(lambda conn: metadata.reflect(conn))
+        tables = [t for t in metadata.tables.values() if key_column in t.c]
+        if not tables:
+            continue
+        for key in sorted({
+            k for table in tables
+            for k in shard.run_sync(lambda conn, t=table: conn.execute(select(t.c[key_column]).distinct()).scalars().all())
+        }):
+            destination = target.shard_for(key)
+            if destination.url == shard.url:
+                moved["kept"] += 1
+                continue
+            for table in tables:
+                rows = shard.run_sync(
+                    lambda conn, t=table: [dict(r._mapping) for r in conn.execute(select(t).where(t.c[key_column] == key))]
+                )
+                if rows:
+                    destination.run_sync(lambda conn, t=table: (t.create(conn, checkfirst=True),
+                                                                conn.execute(insert(t).prefix_with("OR REPLACE"), rows)))
+                    shard.run_sync(lambda conn, t=table: conn.execute(delete(t).where(t.c[key_column] == key)))
+                    moved["rows"] += len(rows)
+            moved["keys"] += 1
+    return moved
+
+
+# ------------------------------------------------------------------------------
+# Benchmark: write throughput vs number of shards
+# ------------------------------------------------------------------------------
+def benchmark(writes: int = 4_000, concurrency: int = 64) -> None:
+    import random
+    import tempfile
+
+    from sqlalchemy import Column, Float, Integer, String
+    from sqlalchemy.orm import declarative_base
+
+    Base = declarative_base()
+
+    class BookRow(Base):
+        __tablename__ = "catalog_books"
+        catalog_id = Column(Integer, primary_key=True)
+        id = Column(Integer, primary_key=True)
+        title = Column(String, nullable=False)
+        price = Column(Float, nullable=False)
+
+    table = BookRow.__table__
+
+    async def run_writes(db: ShardedDatabase) -> float:
+        queue = list(range(writes))
+        random.Random(0).shuffle(queue)
+
+        async def writer():
+            while queue:
+                n = queue.pop()
+                catalog_id = n % 1000
+                row = {"catalog_id": catalog_id, "id": n, "title": f"Book {n}", "price": 9.99}
+                await db.run(catalog_id, lambda conn: conn.execute(insert(table), row))
+
+        start = time.perf_counter()
+        await asyncio.gather(*(writer() for _ in range(concurrency)))
+        return writes / (time.perf_counter() - start)
+
+    async def run_unsharded() -> float:  # one file, a pooled connection and a transaction per write
+        import anyio
+
+        engine = create_engine(f"sqlite:///{tempfile.mkdtemp()}/books.db", connect_args={"timeout": 30})
+        Base.metadata.create_all(engine)
+        queue_ = list(range(writes))
+
+        def write(row):
+            with engine.begin() as conn:
+                conn.execute(insert(table), row)
+
+        async def writer():
+            while queue_:
+                n = queue_.pop()
+                await anyio.to_thread.run_sync(write, {"catalog_id": n % 1000, "id": n, "title": f"Book {n}", "price": 9.99})
+
+        start = time.perf_counter()
+        await asyncio.gather(*(writer() for _ in range(concurrency)))
+        engine.dispose()
+        return writes / (time.perf_counter() - start)
+
+    print(f"{writes:,} single-row writes, {concurrency} concurrent writers, {os.cpu_count()} CPU(s)")
+    baseline = asyncio.run(run_unsharded())
+    print(f"{'1 file, txn per write':<22} {baseline:8,.0f} writes/s")
+    for count in (1, 2, 4, 8):
+        db = ShardedDatabase.from_directory(tempfile.mkdtemp(), count, Base.metadata)
+        rate = asyncio.run(run_writes(db))
+        batch = sum(s.jobs for s in db.shards.values()) / sum(s.batches for s in db.shards.values())
+        print(f"{f'{count} shard(s)':<22} {rate:8,.0f} writes/s   x{rate / baseline:.2f}  ({batch:.0f} writes per commit)")
+        if count == 4:
+            async def first_page():
+                def fetch(conn, after, n):
+                    stmt = select(table).order_by(table.c.catalog_id, table.c.id).limit(n)
+                    if after is not None:
+                        stmt = stmt.where(tuple_(table.c.catalog_id, table.c.id) > after)
+                    return conn.execute(stmt).all()
+
+                start = time.perf_counter()
+                rows = [r async for r in db.merge(fetch, key=lambda r: (r.catalog_id, r.id), limit=100)]
+                return rows, time.perf_counter() - start
+
+            from sqlalchemy import tuple_
+
+            rows, seconds = asyncio.run(first_page())
+            print(f"  cross-shard page of {len(rows)} (merged, ordered): {seconds * 1000:.1f} ms")
+            directory = os.path.dirname(db.shards["shard-0"].url[len("sqlite:///"):])
+            grown = ShardedDatabase.from_directory(directory, 5)
+            start = time.perf_counter()
+            moved = rebalance(db, grown)
+            print(
+                f"  rebalance 4 -> 5 shards: moved {moved['keys']} of {moved['keys'] + moved['kept']} catalogs "
+                f"({moved['rows']:,} rows) in {time.perf_counter() - start:.2f}s"
+            )
+            grown.close()
+        db.close()
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    import argparse
+
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    commands = parser.add_subparsers(dest="command")
+    move = commands.add_parser("rebalance", help="move keys between shard layouts")
+    move.add_argument("directory")
+    move.add_argument("old_count", type=int)
+    move.add_argument("new_count", type=int)
+    move.add_argument("--key", default="catalog_id")
+    args = parser.parse_args(argv)
+
+    if args.command == "rebalance":
+        old = ShardedDatabase.from_directory(args.directory, args.old_count)
+        new = ShardedDatabase.from_directory(args.directory, args.new_count)
+        print(rebalance(old, new, args.key))
+        old.close()
+        new.close()
+    else:
+        benchmark()
+
+
+if __name__ == "__main__":
+    main()
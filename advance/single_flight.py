@@ -0,0 +1,184 @@
+"""
+Single-Flight Request Coalescing
+
+Description:
+When many identical requests arrive at the same time (a popular book, a
+trending search), only one of them does the work; the others wait for it and
+receive the same result (or the same exception).
+
+- Works for async and sync handlers (sync ones run in the thread pool once).
+- Keys are built from selected path/query parameters.
+- Counters report how many calls were executed vs. coalesced.
+
+This is not a cache: once the shared call finishes, the next request runs
+again.
+
+How to use (decorator):
+    from single_flight import SingleFlight
+
+    flights = SingleFlight()
+
+    @app.get("/books/{book_id}")
+    @flights.coalesce(key=("book_id",))
+    def get_book(book_id: int, db: Session = Depends(get_session)): ...
+
+How to use (dependency):
+    search_flight = flights.dependency(key=("q", "lang", "limit"))
+
+    @app.get("/search")
+    async def search(q: str, flight: Flight = Depends(search_flight)):
+        return await flight.run(expensive_search, q)
+"""
+
+import asyncio
+import functools
+import inspect
+import threading
+from typing import Any, Callable, Dict, Iterable, Optional
+
+from fastapi import Request
+from starlette.concurrency import run_in_threadpool
+
+
+class SingleFlight:
+    """A group of coalesced calls sharing one set of counters."""
+
+    def __init__(self, name: str = "default"):
+        self.name = name
+        self._async_calls: Dict[Any, asyncio.Future] = {}
+        self._sync_calls: Dict[Any, "_SyncCall"] = {}
+        self._lock = threading.Lock()
+        self.executed = 0
+        self.coalesced = 0
+
+    # -- core -------------------------------------------------------------
+    async def do(self, key: Any, fn: Callable, *args, **kwargs) -> Any:
+        """Run `fn` once per key among concurrent callers on the event loop."""
+        future = self._async_calls.get(key)
+        if future is not None:
+            self.coalesced += 1
+            # shield: one waiter being cancelled must not cancel the shared call
+            return await asyncio.shield(future)
+
+        future = asyncio.get_running_loop().create_future()
+        self._async_calls[key] = future
+        self.executed += 1
+        try:
+            if inspect.iscoroutinefunction(fn):
+                result = await fn(*args, **kwargs)
+            else:
+                result = await run_in_threadpool(fn, *args, **kwargs)
+        except BaseException as exc:
+            future.set_exception(exc)
+            future.exception()  # mark retrieved: no warning when nobody waited
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            del self._async_calls[key]
+
+    def do_sync(self, key: Any, fn: Callable, *args, **kwargs) -> Any:
+        """Thread-based variant for code already running in worker threads."""
+        with self._lock:
+            call = self._sync_calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._sync_calls[key] = _SyncCall()
+                self.executed += 1
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn(*args, **kwargs)
+            return call.result
+        except BaseException as exc:
+            call.error = exc
+            raise
+        finally:
+            with self._lock:
+                del self._sync_calls[key]
+            call.event.set()
+
+    def stats(self) -> dict:
+        return {
+            "group": self.name,
+            "executed": self.executed,
+            "coalesced": self.coalesced,
+            "in_flight": len(self._async_calls) + len(self._sync_calls),
+        }
+
+    # -- decorator --------------------------------------------------------
+    def coalesce(self, key: Optional[Iterable[str]] = None) -> Callable:
+        """
+        Decorator for route handlers. `key` lists the parameter names (path or
+        query) that identify identical requests; by default every str, int,
+        float, bool or None argument is used.
+        """
+        key_names = tuple(key) if key is not None else None
+
+        def decorator(fn: Callable) -> Callable:
+            prefix = f"{fn.__module__}.{fn.__qualname__}"
+
+            def make_key(kwargs: dict) -> tuple:
+                if key_names is not None:
+                    return (prefix,) + tuple(kwargs.get(k) for k in key_names)
+                return (prefix,) + tuple(
+                    (k, v) for k, v in sorted(kwargs.items())
+                    if v is None or isinstance(v, (str, int, float, bool))
+                )
+
+            # FastAPI reads the signature through __wrapped__, so parameters and
+            # dependencies of the original handler keep working.
+            @functools.wraps(fn)
+            async def wrapper(**kwargs):
+                return await self.do(make_key(kwargs), fn, **kwargs)
+
+            return wrapper
+
+        return decorator
+
+    # -- dependency -------------------------------------------------------
+    def dependency(self, key: Iterable[str]) -> Callable[[Request], "Flight"]:
+        """Dependency returning a `Flight` keyed by the given path/query params."""
+        key_names = tuple(key)
+
+        def get_flight(request: Request) -> Flight:
+            values = []
+            for name in key_names:
+                if name in request.path_params:
+                    values.append(request.path_params[name])
+                else:
+                    values.append(request.query_params.get(name))
+            return Flight(self, (request.url.path,) + tuple(values))
+
+        return get_flight
+
+
+class Flight:
+    """A SingleFlight group bound to the key of the current request."""
+
+    def __init__(self, group: SingleFlight, key: tuple):
+        self.group = group
+        self.key = key
+
+    async def run(self, fn: Callable, *args, **kwargs) -> Any:
+        return await self.group.do(self.key, fn, *args, **kwargs)
+
+    def run_sync(self, fn: Callable, *args, **kwargs) -> Any:
+        return self.group.do_sync(self.key, fn, *args, **kwargs)
+
+
+class _SyncCall:
+    __slots__ = ("event", "result", "error")
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
@@ -0,0 +1,611 @@
+"""
+Inverted Tag Index with Roaring-Style Bitmaps
+
+Description:
+Answers "catalogs tagged python AND fastapi, OR-ed with ..., but NOT
+deprecated" over millions of catalogs with compressed bitmap operations.
+
+- One bitmap of catalog ids per tag. Bitmaps are roaring-style: ids are
+  split into a high 16-bit key and a low 16-bit value; each key holds a
+  container of low values, either a sorted uint16 array (<= 4096 values,
+  2 bytes per id) or a 65536-bit bitmap (8 KB, used when denser).
+  AND / OR / AND NOT run container by container with NumPy.
+- Containers are never modified in place (copy-on-write), so query results
+  can share them with the index safely.
+- Incremental updates: `set_tags(catalog_id, tags, old=...)` adds / removes
+  the id only in the bitmaps of tags that changed.
+- Persistence: `save()` writes a snapshot (JSON header + raw container
+  bytes) atomically; `load()` memory-maps it, so a restart does not copy or
+  rebuild anything.
+- CatalogTags keeps the tags in SQLite as the source of truth and updates
+  the index on each write. A snapshot records the last write it contains;
+  newer rows are replayed on startup.
+
+How to use:
+    from tag_index import CatalogTags
+
+    catalogs = CatalogTags("./catalog_tags.db")
+    catalogs.set_tags(42, ["python", "fastapi"])
+    catalogs.search(all_of=["python"], none_of=["deprecated"], limit=20)
+    # -> {"count": ..., "ids": [...]}
+    catalogs.snapshot()   # e.g. on shutdown
+
+Benchmark (1M catalogs x 50 tags: build, save, reload, queries, updates):
+    python tag_index.py
+"""
+
+import json
+import logging
+import mmap
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+
+ARRAY_MAX = 4096  # above this many values a bitmap container is smaller
+U16, U64 = np.dtype(np.uint16), np.dtype(np.uint64)
+MAGIC = b"TAGIDX1\n"
+
+logger = logging.getLogger("tag_index")
+
+
+# ------------------------------------------------------------------------------
+# Containers: sorted uint16 arrays or 1024 x uint64 bitmaps
+# ------------------------------------------------------------------------------
+def _to_bits(values: np.ndarray) -> np.ndarray:
+    bits = np.zeros(65536, dtype=bool)
+    bits[values] = True
+    return np.packbits(bits, bitorder="little").view(np.uint64)
+
+
+def _to_values(words: np.ndarray) -> np.ndarray:
+    return np.flatnonzero(np.unpackbits(words.view(np.uint8), bitorder="little")).astype(np.uint16)
+
+
+def _cardinality(c: np.ndarray) -> int:
+    return len(c) if c.dtype == U16 else int(np.bitwise_count(c).sum())
+
+
+def _normalize(c: np.ndarray) -> Optional[np.ndarray]:
+    """Pick the smaller representation; None for an empty container."""
+    if c.dtype == U64:
+        n = _cardinality(c)
+        if n == 0:
+            return None
+        return _to_values(c) if n <= ARRAY_MAX else c
+    if len(c) == 0:
+        return None
+    return _to_bits(c) if len(c) > ARRAY_MAX else c
+
+
+def _test(words: np.ndarray, values: np.ndarray) -> np.ndarray:
+    return ((words[values >> 6] >> (values & 63).astype(np.uint64)) & np.uint64(1)).astype(bool)
+
+
+def _and(a: np.ndarray, b: np.ndarray) -> Optional[np.ndarray]:
+    if a.dtype == U16 and b.dtype == U16:
+        return _normalize(np.intersect1d(a, b, assume_unique=True))
+    if a.dtype == U16:
+        return _normalize(a[_test(b, a)])
+    if b.dtype == U16:
+        return _normalize(b[_test(a, b)])
+    return _normalize(a & b)
+
+
+def _or(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    if a.dtype == U16 and b.dtype == U16:
+        return _normalize(np.union1d(a, b))
+    a_bits = a if a.dtype == U64 else _to_bits(a)
+    b_bits = b if b.dtype == U64 else _to_bits(b)
+    return a_bits | b_bits
+
+
+def _andnot(a: np.ndarray, b: np.ndarray) -> Optional[np.ndarray]:
+    if a.dtype == U16 and b.dtype == U16:
+        return _normalize(np.setdiff1d(a, b, assume_unique=True))
+    if a.dtype == U16:
+        return _normalize(a[~_test(b, a)])
+    return _normalize(a & ~(b if b.dtype == U64 else _to_bits(b)))
+
+
+class RoaringBitmap:
+    __slots__ = ("containers",)
+
+    def __init__(self, containers: Optional[Dict[int, np.ndarray]] = None):
+        self.containers: Dict[int, np.ndarray] = containers if containers is not None else {}
+
+    @classmethod
+    def from_values(cls, values: Iterable[int]) -> "RoaringBitmap":
+        ids = np.asarray(values, dtype=np.uint32)
+        if len(ids) > 1 and not (ids[1:] > ids[:-1]).all():  # already sorted and unique: skip
+            ids = np.sort(ids)
+            ids = ids[np.concatenate(([True], ids[1:] != ids[:-1]))]
+        containers = {}
+        if len(ids):
+            splits = np.flatnonzero(np.diff(ids >> 16)) + 1
+            for chunk in np.split(ids, splits):
+                containers[int(chunk[0] >> 16)] = _normalize((chunk & 0xFFFF).astype(np.uint16))
+        return cls(containers)
+
+    # -- single values ----------------------------------------------------
+    def add(self, x: int) -> None:
+        key, low = x >> 16, x & 0xFFFF
+        c = self.containers.get(key)
+        if c is None:
+            self.containers[key] = np.array([low], dtype=np.uint16)
+        elif c.dtype == U16:
+            i = int(np.searchsorted(c, low))
+            if i < len(c) and c[i] == low:
+                return
+            c = np.insert(c, i, low)
+            self.containers[key] = _to_bits(c) if len(c) > ARRAY_MAX else c
+        else:
+            c = c.copy()
+            c[low >> 6] |= np.uint64(1 << (low & 63))
+            self.containers[key] = c
+
+    def discard(self, x: int) -> None:
+        key, low = x >> 16, x & 0xFFFF
+        c = self.containers.get(key)
+        if c is None:
+            return
+        if c.dtype == U16:
+            i = int(np.searchsorted(c, low))
+            if i == len(c) or c[i] != low:
+                return
+            c = np.delete(c, i)
+        else:
+            c = c.copy()
+            c[low >> 6] &= ~np.uint64(1 << (low & 63))
+        c = _normalize(c)
+        if c is None:
+            del self.containers[key]
+        else:
+            self.containers[key] = c
+
+    def __contains__(self, x: int) -> bool:
+        c = self.containers.get(x >> 16)
+        if c is None:
+            return False
+        low = x & 0xFFFF
+        if c.dtype == U16:
+            i = int(np.searchsorted(c, low))
+            return i < len(c) and c[i] == low
+        return bool((int(c[low >> 6]) >> (low & 63)) & 1)
+
+    def __len__(self) -> int:
+        return sum(_cardinality(c) for c in self.containers.values())
+
+    # -- set operations ---------------------------------------------------
+    def __and__(self, other: "RoaringBitmap") -> "RoaringBitmap":
+        out = {}
+        for key in self.containers.keys() & other.containers.keys():
+            c = _and(self.containers[key], other.containers[key])
+            if c is not None:
+                out[key] = c
+        return RoaringBitmap(out)
+
+    def __or__(self, other: "RoaringBitmap") -> "RoaringBitmap":
+        out = dict(self.containers)
+        for key, c in other.containers.items():
+            out[key] = _or(out[key], c) if key in out else c
+        return RoaringBitmap(out)
+
+    def __sub__(self, other: "RoaringBitmap") -> "RoaringBitmap":
+        out = {}
+        for key, c in self.containers.items():
+            if key in other.containers:
+                c = _andnot(c, other.containers[key])
+            if c is not None:
+                out[key] = c
+        return RoaringBitmap(out)
+
+    def to_array(self, limit: Optional[int] = None, offset: int = 0) -> np.ndarray:
+        """Ids in ascending order; only the containers needed are expanded."""
+        parts, have = [], 0
+        for key in sorted(self.containers):
+            c = self.containers[key]
+            n = _cardinality(c)
+            if have + n <= offset:
+                have += n
+                continue
+            values = c if c.dtype == U16 else _to_values(c)
+            parts.append((np.uint32(key) << np.uint32(16)) | values.astype(np.uint32))
+            have += n
+            if limit is not None and have >= offset + limit:
+                break
+        if not parts:
+            return np.empty(0, dtype=np.uint32)
+        ids = np.concatenate(parts)
+        skip = offset - (have - len(ids))
+        return ids[skip:skip + limit] if limit is not None else ids[skip:]
+
+    def nbytes(self) -> int:
+        return sum(c.nbytes for c in self.containers.values())
+
+
+# ------------------------------------------------------------------------------
+# Tag index
+# ------------------------------------------------------------------------------
+class TagIndex:
+    def __init__(self):
+        self.tags: Dict[str, RoaringBitmap] = {}
+        self.ids = RoaringBitmap()  # every catalog in the index (base for NOT-only queries)
+        self.meta: dict = {}
+        self._lock = threading.Lock()
+        self._mmap = None
+
+    @classmethod
+    def from_postings(cls, postings: Dict[str, Iterable[int]], ids: Iterable[int] = ()) -> "TagIndex":
+        """Bulk build from {tag: catalog ids} (much faster than one set_tags per catalog)."""
+        index = cls()
+        universe = RoaringBitmap.from_values(np.fromiter(ids, dtype=np.uint32))
+        for tag, tag_ids in postings.items():
+            bitmap = RoaringBitmap.from_values(tag_ids)
+            if bitmap.containers:
+                index.tags[tag] = bitmap
+                universe = universe | bitmap
+        index.ids = universe
+        return index
+
+    # -- writes -----------------------------------------------------------
+    def tags_of(self, catalog_id: int) -> List[str]:
+        """Tags of one catalog, by probing every tag bitmap: O(distinct tags)."""
+        with self._lock:
+            return sorted(tag for tag, bitmap in self.tags.items() if catalog_id in bitmap)
+
+    def set_tags(self, catalog_id: int, tags: Iterable[str], old: Optional[Iterable[str]] = None) -> None:
+        """
+        Make `tags` the tags of `catalog_id`, touching only the bitmaps of
+        tags that changed. Pass the previous tags as `old` when the caller
+        has them (e.g. from the row being updated); otherwise they are probed.
+        """
+        new = set(tags)
+        with self._lock:
+            if old is None:
+                old = {tag for tag, bitmap in self.tags.items() if catalog_id in bitmap}
+            old = set(old)
+            for tag in old - new:
+                bitmap = self.tags.get(tag)
+                if bitmap is not None:
+                    bitmap.discard(catalog_id)
+                    if not bitmap.containers:
+                        del self.tags[tag]
+            for tag in new - old:
+                self.tags.setdefault(tag, RoaringBitmap()).add(catalog_id)
+            self.ids.add(catalog_id)
+
+    def delete(self, catalog_id: int, old: Optional[Iterable[str]] = None) -> None:
+        self.set_tags(catalog_id, (), old)
+        with self._lock:
+            self.ids.discard(catalog_id)
+
+    # -- queries ----------------------------------------------------------
+    def query(
+        self,
+        all_of: Iterable[str] = (),
+        any_of: Iterable[str] = (),
+        none_of: Iterable[str] = (),
+    ) -> RoaringBitmap:
+        """Catalogs having every `all_of` tag, at least one `any_of` tag and no `none_of` tag."""
+        empty = RoaringBitmap()
+        any_of = list(any_of)
+        with self._lock:
+            # Copies of the container dicts: writers may replace containers meanwhile
+            required = [RoaringBitmap(dict(self.tags.get(tag, empty).containers)) for tag in all_of]
+            optional = [RoaringBitmap(dict(self.tags[tag].containers)) for tag in any_of if tag in self.tags]
+            excluded = [RoaringBitmap(dict(self.tags[tag].containers)) for tag in none_of if tag in self.tags]
+            universe = RoaringBitmap(dict(self.ids.containers))
+
+        result: Optional[RoaringBitmap] = None
+        for bitmap in sorted(required, key=len):  # smallest first: later ANDs touch fewer containers
+            result = bitmap if result is None else result & bitmap
+            if not result.containers:
+                return result
+        if any_of:
+            union = empty
+            for bitmap in optional:
+                union = union | bitmap
+            result = union if result is None else result & union
+        if result is None:
+            result = universe
+        for bitmap in excluded:
+            result = result - bitmap
+        return result
+
+    # -- persistence ------------------------------------------------------
+    def save(self, path: str, meta: Optional[dict] = None) -> int:
+        """Write a snapshot atomically (tmp file + rename). Returns bytes written."""
+        with self._lock:
+            blobs, offset = [], 0
+
+            def layout(bitmap: RoaringBitmap) -> list:
+                nonlocal offset
+                entries = []
+                for key, c in sorted(bitmap.containers.items()):
+                    raw = c.tobytes()
+                    pad = -len(raw) % 8  # keep uint64 containers 8-byte aligned
+                    entries.append([key, "b" if c.dtype == U64 else "a", offset, len(c)])
+                    blobs.append(raw + b"\0" * pad)
+                    offset += len(raw) + pad
+                return entries
+
+            header = {
+                "meta": meta if meta is not None else self.meta,
+                "ids": layout(self.ids),
+                "tags": {tag: layout(bitmap) for tag, bitmap in self.tags.items()},
+            }
+            head = json.dumps(header).encode()
+            prefix = MAGIC + len(head).to_bytes(8, "little") + head
+            prefix += b"\0" * (-len(prefix) % 8)
+
+            tmp = path + ".tmp"
+            with open(tmp, "wb") as f:
+                f.write(prefix)
+                for blob in blobs:
+                    f.write(blob)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, path)
+            return len(prefix) + offset
+
+    @classmethod
+    def load(cls, path: str) -> "TagIndex":
+        """Memory-map a snapshot: containers are read-only views into the file."""
+        index = cls()
+        with open(path, "rb") as f:
+            buf = index._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if buf[:len(MAGIC)] != MAGIC:
+            raise ValueError(f"{path} is not a tag index snapshot")
+        head_len = int.from_bytes(buf[len(MAGIC):len(MAGIC) + 8], "little")
+        start = len(MAGIC) + 8
+        header = json.loads(buf[start:start + head_len])
+        base = start + head_len + (-(start + head_len) % 8)
+
+        def bitmap(entries: list) -> RoaringBitmap:
+            containers = {}
+            for key, kind, offset, count in entries:
+                dtype = np.uint64 if kind == "b" else np.uint16
+                containers[key] = np.frombuffer(buf, dtype=dtype, count=count, offset=base + offset)
+            return RoaringBitmap(containers)
+
+        index.meta = header["meta"]
+        index.ids = bitmap(header["ids"])
+        index.tags = {tag: bitmap(entries) for tag, entries in header["tags"].items()}
+        return index
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "catalogs": len(self.ids),
+                "tags": len(self.tags),
+                "index_bytes": sum(b.nbytes() for b in self.tags.values()),
+            }
+
+
+# ------------------------------------------------------------------------------
+# Catalog tags: SQLite rows (source of truth) + the index kept in step
+# ------------------------------------------------------------------------------
+class CatalogTags:
+    """
+    Stores each catalog's tags in SQLite and updates the TagIndex on every
+    write. Every write gets a sequence number, allocated in SQL inside the
+    write transaction, so several worker processes can share the database:
+    each one applies rows newer than the last seq its index has seen before
+    a write or a search. A snapshot records that seq too, so on startup only
+    newer rows are replayed (or the whole index is rebuilt when there is no
+    usable snapshot).
+    """
+
+    def __init__(self, path: str = "./catalog_tags.db", index_path: Optional[str] = None):
+        self.path = path
+        self.index_path = index_path or path + ".tagidx"
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+        conn = self._conn()
+        conn.executescript(
+            "CREATE TABLE IF NOT EXISTS catalog_tags ("
+            " catalog_id INTEGER PRIMARY KEY,"
+            " tags TEXT,"  # JSON list; NULL once deleted
+            " seq INTEGER NOT NULL);"
+            "CREATE INDEX IF NOT EXISTS ix_catalog_tags_seq ON catalog_tags (seq);"
+        )
+        self._seq = conn.execute("SELECT COALESCE(MAX(seq), 0) FROM catalog_tags").fetchone()[0]
+        self.index = self._open_index(conn)
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def _open_index(self, conn: sqlite3.Connection) -> TagIndex:
+        if os.path.exists(self.index_path):
+            index = TagIndex.load(self.index_path)
+            done = index.meta.get("seq", 0)
+            if done <= self._seq:
+                self._seq = max(self._seq, self._replay(conn, index, done))
+                return index
+            logger.warning("%s is newer than %s: rebuilding the tag index", self.index_path, self.path)
+        postings: Dict[str, List[int]] = {}
+        ids = []
+        for catalog_id, tags in conn.execute("SELECT catalog_id, tags FROM catalog_tags WHERE tags IS NOT NULL"):
+            ids.append(catalog_id)
+            for tag in json.loads(tags):
+                postings.setdefault(tag, []).append(catalog_id)
+        return TagIndex.from_postings(postings, ids)
+
+    @staticmethod
+    def _replay(conn: sqlite3.Connection, index: TagIndex, after: int) -> int:
+        """Apply rows written after seq `after` to `index`; returns the last seq applied."""
+        rows = conn.execute(
+            "SELECT catalog_id, tags, seq FROM catalog_tags WHERE seq > ? ORDER BY seq", (after,)
+        ).fetchall()
+        for catalog_id, tags, seq in rows:
+            if tags is None:
+                index.delete(catalog_id)
+            else:
+                index.set_tags(catalog_id, json.loads(tags))
+            after = seq
+        return after
+
+    def _catch_up(self, conn: sqlite3.Connection) -> None:
+        """Apply writes made by other processes (caller holds self._lock)."""
+        self._seq = self._replay(conn, self.index, self._seq)
+
+    def _write(self, catalog_id: int, tags: Optional[List[str]]) -> None:
+        conn = self._conn()
+        with self._lock:  # DB row and index change together, in seq order
+            conn.execute("BEGIN IMMEDIATE")  # the write lock: no other process allocates a seq meanwhile
+            try:
+                self._catch_up(conn)
+                row = conn.execute("SELECT tags FROM catalog_tags WHERE catalog_id = ?", (catalog_id,)).fetchone()
+                old = json.loads(row[0]) if row and row[0] is not None else []
+                (seq,) = conn.execute(
+                    "INSERT INTO catalog_tags (catalog_id, tags, seq)"
+                    " VALUES (?, ?, (SELECT COALESCE(MAX(seq), 0) + 1 FROM catalog_tags)) "
+                    "ON CONFLICT (catalog_id) DO UPDATE SET tags = excluded.tags, seq = excluded.seq "
+                    "RETURNING seq",
+                    (catalog_id, json.dumps(tags) if tags is not None else None),
+                ).fetchone()
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            if tags is None:
+                self.index.delete(catalog_id, old=old)
+            else:
+                self.index.set_tags(catalog_id, tags, old=old)
+            self._seq = seq
+
+    def set_tags(self, catalog_id: int, tags: Iterable[str]) -> List[str]:
+        tags = sorted(set(tags))
+        self._write(catalog_id, tags)
+        return tags
+
+    def delete(self, catalog_id: int) -> None:
+        self._write(catalog_id, None)
+
+    def get_tags(self, catalog_id: int) -> Optional[List[str]]:
+        row = self._conn().execute("SELECT tags FROM catalog_tags WHERE catalog_id = ?", (catalog_id,)).fetchone()
+        return json.loads(row[0]) if row and row[0] is not None else None
+
+    def search(
+        self,
+        all_of: Iterable[str] = (),
+        any_of: Iterable[str] = (),
+        none_of: Iterable[str] = (),
+        limit: int = 50,
+        offset: int = 0,
+    ) -> dict:
+        with self._lock:
+            self._catch_up(self._conn())
+        hits = self.index.query(all_of, any_of, none_of)
+        return {"count": len(hits), "ids": hits.to_array(limit=limit, offset=offset).tolist()}
+
+    def snapshot(self) -> int:
+        """Persist the index; the next startup replays only rows written after this."""
+        with self._lock:
+            seq = self._seq
+            return self.index.save(self.index_path, meta={"seq": seq})
+
+
+# ------------------------------------------------------------------------------
+# Benchmark: 1M catalogs x 50 tags
+# ------------------------------------------------------------------------------
+def _tag_probabilities(vocabulary: int, tags_per_catalog: int, cap: float = 0.5) -> np.ndarray:
+    """Zipf-like popularity summing to `tags_per_catalog`, no tag on more than `cap` of catalogs."""
+    weights = 1.0 / np.arange(1, vocabulary + 1) ** 0.9
+    p = weights / weights.sum() * tags_per_catalog
+    for _ in range(50):
+        capped = p >= cap
+        p[capped] = cap
+        free = ~capped
+        p[free] *= (tags_per_catalog - cap * capped.sum()) / p[free].sum()
+    return np.minimum(p, cap)
+
+
+def benchmark(catalogs: int = 1_000_000, tags_per_catalog: int = 50, vocabulary: int = 2_000) -> None:
+    import tempfile
+
+    rng = np.random.default_rng(0)
+    p = _tag_probabilities(vocabulary, tags_per_catalog)
+
+    start = time.perf_counter()
+    postings, total = {}, 0
+    for t in range(vocabulary):
+        if p[t] > 0.05:
+            ids = np.flatnonzero(rng.random(catalogs) < p[t])
+        else:
+            ids = np.unique(rng.integers(0, catalogs, rng.binomial(catalogs, p[t])))
+        postings[f"tag{t}"] = ids
+        total += len(ids)
+    generated = time.perf_counter() - start
+    start = time.perf_counter()
+    index = TagIndex.from_postings(postings, np.arange(catalogs))
+    build = time.perf_counter() - start
+    size = sum(b.nbytes() for b in index.tags.values())
+    print(
+        f"{catalogs:,} catalogs, {total / catalogs:.1f} tags each ({total:,} postings, {vocabulary:,} distinct)"
+        f" [data generated in {generated:.1f}s]"
+    )
+    print(f"build: {build:.1f}s   size: {size / 1e6:.0f} MB ({size / total:.2f} bytes/posting)")
+
+    path = os.path.join(tempfile.mkdtemp(), "tags.idx")
+    start = time.perf_counter()
+    written = index.save(path)
+    print(f"save: {time.perf_counter() - start:.2f}s ({written / 1e6:.0f} MB)")
+    start = time.perf_counter()
+    index = TagIndex.load(path)
+    print(f"reload (mmap): {(time.perf_counter() - start) * 1000:.0f} ms   (vs build {build:.1f}s)")
+
+    queries = [
+        ("2 popular AND", dict(all_of=["tag0", "tag1"])),
+        ("3 AND + NOT", dict(all_of=["tag0", "tag5", "tag20"], none_of=["tag2"])),
+        ("popular AND rare", dict(all_of=["tag0", "tag1500"])),
+        ("OR of 5 mid", dict(any_of=[f"tag{t}" for t in range(100, 105)])),
+        ("OR of 5 AND popular", dict(all_of=["tag3"], any_of=[f"tag{t}" for t in range(100, 105)])),
+        ("NOT only", dict(none_of=["tag0"])),
+    ]
+    print(f"{'query':<22} {'latency':>9} {'hits':>10}  (count + first page of 20)")
+    for label, q in queries:
+        index.query(**q)
+        start = time.perf_counter()
+        for _ in range(20):
+            hits = index.query(**q)
+            count, page = len(hits), hits.to_array(limit=20)
+        ms = (time.perf_counter() - start) / 20 * 1000
+        print(f"{label:<22} {ms:6.2f} ms {count:>10,}")
+
+    sa, sb = set(postings["tag0"].tolist()), set(postings["tag1"].tolist())
+    start = time.perf_counter()
+    len(sa & sb)
+    print(f"{'(python sets, 2 AND)':<22} {(time.perf_counter() - start) * 1000:6.2f} ms")
+
+    def random_updates(n):
+        return [
+            (int(i), [f"tag{t}" for t in rng.choice(vocabulary, tags_per_catalog, replace=False, p=p / p.sum())])
+            for i in rng.integers(0, catalogs, n)
+        ]
+
+    updates = random_updates(200)
+    previous = [index.tags_of(catalog_id) for catalog_id, _ in updates]  # what the DB row holds
+    start = time.perf_counter()
+    for (catalog_id, tags), old in zip(updates, previous):
+        index.set_tags(catalog_id, tags, old=old)
+    known = (time.perf_counter() - start) / len(updates)
+    updates = random_updates(200)
+    start = time.perf_counter()
+    for catalog_id, tags in updates:
+        index.set_tags(catalog_id, tags)
+    probed = (time.perf_counter() - start) / len(updates)
+    print(f"incremental update: {known * 1000:.2f} ms (old tags given), {probed * 1000:.2f} ms (old tags probed)")
+
+if __name__ == "__main__":
+    benchmark()
@@ -0,0 +1,308 @@
+"""
+Chunked, Resumable Uploads
+
+Description:
+Upload large files into the storage tree in chunks, resuming after a broken
+connection, without ever holding the whole file in memory.
+
+Flow:
+1. POST /uploads                      {"path": "docs/big.iso", "size": 1048576000,
+                                       "sha256": "<optional hex digest>"}
+   -> {"upload_id": "...", "offset": 0}
+2. PUT  /uploads/{upload_id}?offset=N  raw bytes of the next chunk
+   (optional header Content-SHA256: digest of this chunk)
+   -> {"offset": N + len(chunk)}
+   A wrong offset returns 409 with the offset the server expects, so the
+   client can resume from there. GET /uploads/{upload_id} returns it too.
+3. POST /uploads/{upload_id}/finalize
+   -> {"path": "...", "sha256": "...", "deduplicated": true|false}
+
+- The request body is streamed straight to disk (no multipart spooling), so
+  memory use is the same for a 10 MB or a 10 GB upload.
+- The whole-file SHA-256 is computed incrementally as chunks arrive.
+- Finished files are stored once as content-addressed blobs
+  (blobs/ab/abcdef...) and the storage path is a hard link to the blob, so
+  identical files take disk space only once.
+- Finalize holds the session lock: concurrent finalize calls (or a chunk
+  still being written) cannot race on the partial file.
+- Target paths are checked after resolving symlinks, so a symlinked
+  directory under the storage root cannot be used to write outside it.
+- Abandoned uploads (no chunk for `expire_after` seconds, 24 h by default)
+  are deleted, partial file included; the sweep runs at most hourly, from
+  POST /uploads.
+
+How to use:
+    from uploads import UploadManager
+
+    uploads = UploadManager(storage_root="./storage", data_dir="./upload_data")
+    app.include_router(uploads.router)
+"""
+
+import hashlib
+import json
+import os
+import secrets
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Optional
+
+import anyio
+from fastapi import APIRouter, HTTPException, Query, Request, status
+from pydantic import BaseModel, Field
+
+from file_serving import safe_join
+
+WRITE_BUFFER = 1024 * 1024  # bytes buffered before one write() in a thread
+
+
+class UploadCreate(BaseModel):
+    path: str = Field(..., min_length=1, max_length=1024)
+    size: int = Field(..., ge=0)
+    sha256: Optional[str] = Field(None, pattern=r"^[0-9a-f]{64}$")
+
+
+class UploadSession:
+    """State of one upload. Offset and metadata are also kept on disk."""
+
+    def __init__(self, upload_id: str, path: str, size: int, sha256: Optional[str], part: Path):
+        self.upload_id = upload_id
+        self.path = path
+        self.size = size
+        self.expected_sha256 = sha256
+        self.part = part
+        self.offset = part.stat().st_size if part.exists() else 0
+        self.hasher = hashlib.sha256()
+        self.lock = anyio.Lock()
+        self.closed = False  # finalized or expired: further requests get 404
+        self.touched = time.time()  # last request for it (plain float: read from the purge thread)
+        if self.offset:
+            # Resumed after a restart: rebuild the running hash from disk once
+            with open(part, "rb") as f:
+                for block in iter(lambda: f.read(WRITE_BUFFER), b""):
+                    self.hasher.update(block)
+
+    def info(self) -> dict:
+        return {"upload_id": self.upload_id, "path": self.path, "size": self.size, "offset": self.offset}
+
+
+class UploadManager:
+    """
+    Args:
+        storage_root: where finished files appear (served by /storage/...).
+        data_dir: holds partial uploads and content-addressed blobs; must be
+            on the same filesystem as storage_root (hard links).
+        max_size: largest accepted upload in bytes.
+        expire_after: seconds without a chunk after which an upload is deleted.
+    """
+
+    def __init__(
+        self, storage_root: str, data_dir: str, max_size: int = 50 * 1024 ** 3, expire_after: float = 24 * 3600,
+    ):
+        self.storage_root = Path(storage_root).resolve()
+        self.parts_dir = Path(data_dir).resolve() / "parts"
+        self.blobs_dir = Path(data_dir).resolve() / "blobs"
+        for d in (self.storage_root, self.parts_dir, self.blobs_dir):
+            d.mkdir(parents=True, exist_ok=True)
+        self.max_size = max_size
+        self.expire_after = expire_after
+        self.sessions: Dict[str, UploadSession] = {}
+        self._lock = threading.Lock()
+        self._next_purge = 0.0
+        self.router = self._build_router()
+
+    # -- sessions ---------------------------------------------------------
+    def create(self, data: UploadCreate) -> UploadSession:
+        if data.size > self.max_size:
+            raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail="Upload too large")
+        self._target(data.path)  # validate early
+        if time.monotonic() >= self._next_purge:
+            self._next_purge = time.monotonic() + min(3600.0, self.expire_after)
+            self.purge_expired()
+        upload_id = secrets.token_urlsafe(16)
+        part = self.parts_dir / f"{upload_id}.part"
+        part.touch()
+        meta = {"path": data.path, "size": data.size, "sha256": data.sha256}
+        (self.parts_dir / f"{upload_id}.json").write_text(json.dumps(meta))
+        session = UploadSession(upload_id, data.path, data.size, data.sha256, part)
+        with self._lock:
+            self.sessions[upload_id] = session
+        return session
+
+    def get(self, upload_id: str) -> UploadSession:
+        with self._lock:
+            session = self.sessions.get(upload_id)
+        if session is not None:
+            return session
+        # Not in memory (e.g. after a restart): reload from disk. Rehashing the
+        # part file can take a while, so it happens outside the global lock.
+        meta_file = self.parts_dir / f"{upload_id}.json"
+        if not upload_id.replace("-", "").replace("_", "").isalnum() or not meta_file.exists():
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Upload not found")
+        try:
+            meta = json.loads(meta_file.read_text())
+        except FileNotFoundError:  # finalized or expired meanwhile
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Upload not found")
+        session = UploadSession(
+            upload_id, meta["path"], meta["size"], meta["sha256"], self.parts_dir / f"{upload_id}.part"
+        )
+        with self._lock:
+            # Two requests may have reloaded it at once: keep the first
+            return self.sessions.setdefault(upload_id, session)
+
+    def purge_expired(self) -> int:
+        """Delete uploads without a chunk for `expire_after` seconds. Returns how many."""
+        cutoff = time.time() - self.expire_after
+        purged = 0
+        for part in self.parts_dir.glob("*.part"):
+            try:
+                if part.stat().st_mtime >= cutoff:  # every chunk write touches it
+                    continue
+            except FileNotFoundError:  # finalized meanwhile
+                continue
+            upload_id = part.stem
+            with self._lock:
+                session = self.sessions.get(upload_id)
+                if session is not None:
+                    if session.touched >= cutoff:  # e.g. a long chunk still streaming in
+                        continue
+                    session.closed = True
+                    del self.sessions[upload_id]
+            part.unlink(missing_ok=True)
+            (self.parts_dir / f"{upload_id}.json").unlink(missing_ok=True)
+            purged += 1
+        return purged
+
+    def _target(self, path: str) -> Path:
+        """Where a finished upload goes; like FileStore.resolve, checked after resolving symlinks."""
+        real = Path(os.path.realpath(safe_join(self.storage_root, path)))
+        if self.storage_root not in real.parents:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid path")
+        return real
+
+    def _forget(self, session: UploadSession) -> None:
+        with self._lock:
+            self.sessions.pop(session.upload_id, None)
+        session.part.unlink(missing_ok=True)
+        (self.parts_dir / f"{session.upload_id}.json").unlink(missing_ok=True)
+
+    # -- chunks -----------------------------------------------------------
+    async def write_chunk(self, session: UploadSession, offset: int, request: Request) -> int:
+        session.touched = time.time()
+        if session.lock.locked():
+            raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="A chunk is already being written")
+        async with session.lock:
+            if session.closed:
+                raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Upload not found")
+            if offset != session.offset:
+                raise HTTPException(
+                    status_code=status.HTTP_409_CONFLICT,
+                    detail={"message": "Unexpected offset", "offset": session.offset},
+                )
+            chunk_sha = request.headers.get("content-sha256")
+            chunk_hasher = hashlib.sha256() if chunk_sha else None
+            file_hasher = session.hasher.copy()  # committed only if the chunk is good
+            written = 0
+            buffer = bytearray()
+
+            fd = os.open(session.part, os.O_WRONLY)
+            try:
+                os.lseek(fd, offset, os.SEEK_SET)
+                async for data in request.stream():
+                    if offset + written + len(buffer) + len(data) > session.size:
+                        raise HTTPException(
+                            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                            detail="Chunk goes past the declared size",
+                        )
+                    buffer += data
+                    if len(buffer) >= WRITE_BUFFER:
+                        written += await self._flush(fd, buffer, file_hasher, chunk_hasher)
+                        buffer = bytearray()
+                if buffer:
+                    written += await self._flush(fd, buffer, file_hasher, chunk_hasher)
+                if chunk_hasher is not None and chunk_hasher.hexdigest() != chunk_sha.lower():
+                    raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Chunk checksum mismatch")
+            except BaseException:
+                # Roll the partial file back to the last good offset
+                os.ftruncate(fd, session.offset)
+                raise
+            finally:
+                os.close(fd)
+
+            session.hasher = file_hasher
+            session.offset += written
+            return session.offset
+
+    @staticmethod
+    async def _flush(fd: int, buffer: bytearray, file_hasher, chunk_hasher) -> int:
+        file_hasher.update(buffer)
+        if chunk_hasher is not None:
+            chunk_hasher.update(buffer)
+        view = memoryview(buffer)
+        while view:  # os.write may write less than asked
+            n = await anyio.to_thread.run_sync(os.write, fd, view)
+            view = view[n:]
+        return len(buffer)
+
+    # -- finalize ---------------------------------------------------------
+    def finalize(self, session: UploadSession) -> dict:
+        """Call with `session.lock` held (see the route)."""
+        if session.closed:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Upload not found")
+        if session.offset != session.size:
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail={"message": "Upload is incomplete", "offset": session.offset},
+            )
+        digest = session.hasher.hexdigest()
+        target = self._target(session.path)  # before touching the part file
+        if session.expected_sha256 and digest != session.expected_sha256:
+            session.closed = True
+            self._forget(session)
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="File checksum mismatch")
+
+        blob = self.blobs_dir / digest[:2] / digest
+        blob.parent.mkdir(exist_ok=True)
+        deduplicated = blob.exists()
+        if deduplicated:
+            session.part.unlink()
+        else:
+            with open(session.part, "rb+") as f:
+                os.fsync(f.fileno())
+            os.replace(session.part, blob)
+
+        session.closed = True
+        target.parent.mkdir(parents=True, exist_ok=True)
+        tmp = target.with_name(f".{target.name}.{session.upload_id}.tmp")
+        os.link(blob, tmp)
+        os.replace(tmp, target)  # atomic: readers see the old or the new file
+        self._forget(session)
+        return {"path": session.path, "size": session.size, "sha256": digest, "deduplicated": deduplicated}
+
+    # -- routes -----------------------------------------------------------
+    def _build_router(self) -> APIRouter:
+        router = APIRouter(prefix="/uploads", tags=["uploads"])
+
+        @router.post("", status_code=status.HTTP_201_CREATED)
+        def create_upload(data: UploadCreate):
+            return self.create(data).info()
+
+        @router.get("/{upload_id}")
+        def upload_status(upload_id: str):
+            return self.get(upload_id).info()
+
+        @router.put("/{upload_id}")
+        async def upload_chunk(upload_id: str, request: Request, offset: int = Query(..., ge=0)):
+            # get() may re-hash a partial file from disk: keep it off the event loop
+            session = await anyio.to_thread.run_sync(self.get, upload_id)
+            new_offset = await self.write_chunk(session, offset, request)
+            return {"upload_id": upload_id, "offset": new_offset}
+
+        @router.post("/{upload_id}/finalize")
+        async def finalize_upload(upload_id: str):
+            session = await anyio.to_thread.run_sync(self.get, upload_id)
+            session.touched = time.time()
+            async with session.lock:  # one finalize at a time, never during a chunk write
+                return await anyio.to_thread.run_sync(self.finalize, session)
+
+        return router
@@ -30,6 +30,14 @@ You may repeat this process for all other endpoints:
    • PATCH /power
    • DELETE /clear-history
 
+Runtime metrics (threadpool queue wait, event-loop lag, sync/async counts):
+   GET /stats/runtime      (THREADPOOL_SIZE sets the threadpool capacity, default 40)
+   GET /stats/inline       handlers run inline on the event loop (see below)
+
+✔ The arithmetic handlers are marked @inline_guard.inline: they run directly
+   on the event loop instead of taking a threadpool round trip. One that
+   exceeds its 1 ms budget repeatedly is moved back to the threadpool.
+
 Available API Endpoints (Manual Testing Examples):
 --------------------------------------------------
 
@@ -104,11 +112,26 @@ Important Notes:
 """
 
 
+import os
+import sys
+from pathlib import Path
+
 from fastapi import FastAPI
 from pydantic import BaseModel
 
+# Shared helpers (runtime metrics, ...) live in ../advance
+sys.path.append(str(Path(__file__).resolve().parent.parent / "advance"))
+from inline_routes import InlineGuard
+from runtime_metrics import RuntimeMonitor
+
 app = FastAPI(title="Calculator API", version="1.0.0")
 
+# Every sync handler below runs in the threadpool: size it and watch it
+runtime = RuntimeMonitor(threadpool_size=int(os.getenv("THREADPOOL_SIZE", "40"))).install(app)
+
+# Nanosecond handlers skip the threadpool hop (demoted if they exceed 1 ms)
+inline_guard = InlineGuard(budget_ms=1.0)
+
 
 # ========= Data Model =========
 class Operation(BaseModel):
@@ -118,17 +141,20 @@ class Operation(BaseModel):
 
 # ========== GET (Read Operation) ==========
 @app.get("/add")
+@inline_guard.inline
 def add(a: float, b: float):
     return {"operation": "addition", "result": a + b}
 
 
 @app.get("/subtract")
+@inline_guard.inline
 def subtract(a: float, b: float):
     return {"operation": "subtraction", "result": a - b}
 
 
 # ========== POST (Create Calculation Request) ==========
 @app.post("/multiply")
+@inline_guard.inline
 def multiply(payload: Operation): # Payload(just a variable name) = the JSON data sent in the request body (e.g., in POST/PUT/PATCH) that FastAPI receives and processes.
     result = payload.a * payload.b
     return {"operation": "multiplication", "result": result}
@@ -136,6 +162,7 @@ def multiply(payload: Operation): # Payload(just a variable name) = the JSON dat
 
 # ========== PUT (Replace - divide) ==========
 @app.put("/divide")
+@inline_guard.inline
 def divide(payload: Operation):
     if payload.b == 0:
         return {"error": "Cannot divide by zero"}
@@ -145,6 +172,7 @@ def divide(payload: Operation):
 
 # ========== PATCH (Special Operation - Power) ==========
 @app.patch("/power")
+@inline_guard.inline
 def power(payload: Operation):
     result = payload.a ** payload.b
     return {"operation": "power", "result": result}
@@ -154,7 +182,12 @@ def power(payload: Operation):
 history = []  # dummy history storage
 
 @app.delete("/clear-history")
+@inline_guard.inline
 def clear_history():
     history.clear()
     return {"message": "Calculation history cleared successfully"}
 
+
+@app.get("/stats/inline")
+def inline_stats():
+    return inline_guard.stats()
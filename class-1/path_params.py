@@ -3,51 +3,193 @@ Path Parameters Example using FastAPI
 =====================================
 This FastAPI application demonstrates the use of various types of path parameters.
 It includes endpoints that accept different data types as path parameters, such as integers,'''
-from fastapi import FastAPI
+import os
+import sys
+from pathlib import Path
+from typing import Generator, List
+
+import anyio
+from fastapi import Depends, FastAPI, HTTPException, Query, Request
+from pydantic import BaseModel, Field
+from sqlalchemy import Column, Float, ForeignKey, Integer, String, create_engine, select
+from sqlalchemy.orm import Session, declarative_base, sessionmaker
 from uuid import UUID
 
+# Shared helpers (file serving, ...) live in ../advance
+sys.path.append(str(Path(__file__).resolve().parent.parent / "advance"))
+from dataloader import DataLoader, QueryCounter, QueryCountMiddleware, group_by
+from file_serving import FileStore
+from inline_routes import InlineGuard
+from runtime_metrics import RuntimeMonitor
+from uploads import UploadManager
+
+# Orders database (ORDERS_DB_URL, default: ./orders.db)
+engine = create_engine(
+    os.getenv("ORDERS_DB_URL", "sqlite:///./orders.db"),
+    connect_args={"check_same_thread": False},
+)
+SessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False)
+Base = declarative_base()
+
+
+class OrderORM(Base):
+    __tablename__ = "orders"
+
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, nullable=False, index=True)
+
+
+class OrderItemORM(Base):
+    __tablename__ = "order_items"
+
+    id = Column(Integer, primary_key=True)
+    order_id = Column(Integer, ForeignKey("orders.id"), nullable=False, index=True)
+    sku = Column(String, nullable=False)
+    quantity = Column(Integer, nullable=False)
+    unit_price = Column(Float, nullable=False)
+
+
+Base.metadata.create_all(bind=engine)
+
+
+class OrderItemIn(BaseModel):
+    sku: str
+    quantity: int = Field(gt=0)
+    unit_price: float = Field(ge=0)
+
+
+class OrderIn(BaseModel):
+    items: List[OrderItemIn] = Field(min_length=1)
+
+
+def get_session() -> Generator[Session, None, None]:
+    db = SessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+def order_items_loader(db: Session = Depends(get_session)) -> DataLoader:
+    """One loader per request: order ids awaited together become one IN (...) query."""
+    def load_items(order_ids):
+        rows = db.scalars(select(OrderItemORM).where(OrderItemORM.order_id.in_(order_ids)))
+        return group_by(rows, "order_id")
+    return DataLoader(load_items, default=[])
+
+
+def order_out(order: OrderORM, items=None) -> dict:
+    out = {"order_id": order.id, "user_id": order.user_id}
+    if items is not None:
+        out["items"] = [
+            {"sku": i.sku, "quantity": i.quantity, "unit_price": i.unit_price} for i in items
+        ]
+    return out
+
+
 app = FastAPI(title="Path Parameters Example")
 
+# Every response reports the SQL statements it ran as X-SQL-Queries
+queries = QueryCounter(engine)
+app.add_middleware(QueryCountMiddleware, counter=queries)
+
+# Threadpool capacity (THREADPOOL_SIZE) and saturation metrics at /stats/runtime
+runtime = RuntimeMonitor(threadpool_size=int(os.getenv("THREADPOOL_SIZE", "40"))).install(app)
+
+# Handlers that only echo or convert their parameters run on the event loop
+inline_guard = InlineGuard(budget_ms=1.0)
+
+# /storage/... serves files from STORAGE_ROOT (default: ./storage)
+storage = FileStore(os.getenv("STORAGE_ROOT", "./storage"))
+
+# Resumable chunked uploads into the same tree: POST /uploads, PUT chunks, finalize
+uploads = UploadManager(
+    storage_root=os.getenv("STORAGE_ROOT", "./storage"),
+    data_dir=os.getenv("UPLOAD_DATA_DIR", "./upload_data"),
+)
+app.include_router(uploads.router)
+
 # 1. Basic path parameter (int)
 @app.get("/users/{user_id}")
+@inline_guard.inline
 def get_user(user_id: int):
     return {"message": "User profile fetched", "user_id": user_id}
 
 # 2. Mixed: Multiple path parameters + query parameter
 @app.get("/users/{user_id}/orders/{order_id}")
-def get_user_order(user_id: int, order_id: int, include_items: bool = False):
+async def get_user_order(
+    user_id: int,
+    order_id: int,
+    include_items: bool = False,
+    db: Session = Depends(get_session),
+    items: DataLoader = Depends(order_items_loader),
+):
+    order = await anyio.to_thread.run_sync(db.get, OrderORM, order_id)
+    if order is None or order.user_id != user_id:
+        raise HTTPException(status_code=404, detail="Order not found")
     return {
         "message": "Order fetched",
-        "user_id": user_id,
-        "order_id": order_id,
-        "include_items": include_items
+        "include_items": include_items,
+        **order_out(order, await items.load(order.id) if include_items else None),
     }
 
+# 2b. List view: 2 queries whatever the number of orders (see X-SQL-Queries)
+@app.get("/users/{user_id}/orders")
+async def list_user_orders(
+    user_id: int,
+    include_items: bool = False,
+    limit: int = Query(50, ge=1, le=500),
+    db: Session = Depends(get_session),
+    items: DataLoader = Depends(order_items_loader),
+):
+    orders = await anyio.to_thread.run_sync(
+        lambda: db.scalars(
+            select(OrderORM).where(OrderORM.user_id == user_id).order_by(OrderORM.id).limit(limit)
+        ).all()
+    )
+    if not include_items:
+        return [order_out(o) for o in orders]
+    nested = await items.load_many(o.id for o in orders)
+    return [order_out(o, i) for o, i in zip(orders, nested)]
+
+@app.post("/users/{user_id}/orders", status_code=201)
+def create_user_order(user_id: int, order: OrderIn, db: Session = Depends(get_session)):
+    row = OrderORM(user_id=user_id)
+    db.add(row)
+    db.flush()
+    db.add_all(OrderItemORM(order_id=row.id, **item.model_dump()) for item in order.items)
+    db.commit()
+    return {"order_id": row.id, "user_id": user_id}
+
 # 3. String path parameter (filename)
 @app.get("/files/{filename}")
+@inline_guard.inline
 def get_file(filename: str):
     return {"message": "File requested", "filename": filename}
 
 # 4. Float path parameter
 @app.get("/temperature/{celsius}")
+@inline_guard.inline
 def convert_temperature(celsius: float):
     fahrenheit = celsius * 9/5 + 32
     return {"celsius": celsius, "fahrenheit": fahrenheit}
 
 # 5. Boolean path parameter
 @app.get("/features/{enabled}")
+@inline_guard.inline
 def feature_status(enabled: bool):
     return {"feature_enabled": enabled}
 
 # 6. UUID path parameter
 @app.get("/payments/{payment_id}")
+@inline_guard.inline
 def get_payment(payment_id: UUID):
     return {"payment_id": str(payment_id), "status": "verified"}
 
-# 7. Capture nested file path (supports slashes)
+# 7. Capture nested file path (supports slashes) and serve the file
 @app.get("/storage/{file_path:path}")
-def retrieve_deep_file(file_path: str):
-    return {"file_path": file_path}
+def retrieve_deep_file(file_path: str, request: Request):
+    return storage.response(request, file_path)
 
 
 """Detailed Explanation:
@@ -81,6 +223,12 @@ Available API Endpoints:
    Example: /users/12/orders/55?include_items=true
    Description: Fetch a specific order for a user. Optional query parameter 'include_items'.
 
+   GET /users/{user_id}/orders?include_items=true
+   POST /users/{user_id}/orders   {"items": [{"sku": "B-1", "quantity": 2, "unit_price": 9.5}]}
+   Description: List a user's orders. Items of all listed orders are fetched
+   with one batched IN (...) query, not one query per order; every response
+   carries the number of SQL statements it ran in the X-SQL-Queries header.
+
 3) String Path Parameter
    GET /files/{filename}
    Example: /files/report%20Q4.txt
@@ -104,7 +252,20 @@ Available API Endpoints:
 7) Capture Subpath (with slashes)
    GET /storage/{file_path}
    Example: /storage/documents/2025/january/budget.xlsx
-   Description: Retrieve a file located in nested folders.
+   Description: Retrieve a file located in nested folders (served from STORAGE_ROOT).
+
+8) Resumable Chunked Uploads
+   POST /uploads                        {"path": "documents/big.iso", "size": 1048576}
+   PUT  /uploads/{upload_id}?offset=0   raw bytes of the next chunk
+   POST /uploads/{upload_id}/finalize
+   Description: Upload a file in pieces; it then appears under /storage/...
+
+9) Runtime Metrics
+   GET /stats/runtime
+   Description: Threadpool capacity (THREADPOOL_SIZE), active/queued workers and
+   queue wait, event-loop lag, blocked-loop stacks, sync vs async calls per route.
+   Endpoints 1, 3, 4, 5 and 6 only echo or convert their parameters, so they
+   run inline on the event loop instead of in the threadpool.
 
 Notes:
 ------
@@ -15,16 +15,17 @@ Example URLs:
 - /roles/viewer
 """
 
+import sys
+from pathlib import Path
+
 from fastapi import FastAPI
-from enum import Enum
 
-app = FastAPI(title="Enum Path Parameter Example")
+# Role is shared with the authorization layer in ../advance/rbac.py
+sys.path.append(str(Path(__file__).resolve().parent.parent / "advance"))
+from rbac import ROLE_MASKS, Role, permissions_of
 
-class Role(str, Enum):
-    admin = "admin"
-    editor = "editor"
-    viewer = "viewer"
+app = FastAPI(title="Enum Path Parameter Example")
 
 @app.get("/roles/{role}")
 def get_role(role: Role):
-    return {"role": role.value}
+    return {"role": role.value, "permissions": permissions_of(ROLE_MASKS[role.value])}
@@ -11,18 +11,35 @@ How to run:
 
 Example URLs:
 - /users/12/projects/active
-- /reports/2025/2
+- /reports/2025/2           (pre-aggregated sales for Q2 2025)
+- /reports/2025/2/verify    (compare the rollup with a full recompute)
 - /invoices/8aa1b2f5-8e3d-45a3-83b5-6c2a4e9623f7
 - /storage/documents/2025/january/budget.xlsx
 """
 
-from fastapi import FastAPI, Path
+import os
+import sys
+from fastapi import Depends, FastAPI, Path, Request
+from pydantic import BaseModel, Field
+from sqlalchemy.orm import Session
 from enum import Enum
+from pathlib import Path as FsPath
 from typing import Annotated
 from uuid import UUID
 
+# Shared helpers (file serving, ...) live in ../advance
+sys.path.append(str(FsPath(__file__).resolve().parent.parent / "advance"))
+from file_serving import FileStore
+from rollups import RollupEngine
+
 app = FastAPI(title="Advanced Path Operations Example")
 
+# /storage/... serves files from STORAGE_ROOT (default: ./storage)
+storage_files = FileStore(os.getenv("STORAGE_ROOT", "./storage"))
+
+# Orders and their daily/monthly/quarterly rollups
+rollups = RollupEngine(os.getenv("REPORTS_DB_URL", "sqlite:///./reports.db"))
+
 @app.get("/users/me")
 def me():
     return {"me": True}
@@ -43,17 +60,41 @@ def by_tag(
 ):
     return {"tag": tag}
 
+class OrderCreate(BaseModel):
+    book_id: int = Field(..., ge=1)
+    quantity: int = Field(..., ge=1)
+    amount: float = Field(..., ge=0)
+
+@app.post("/orders", status_code=201)
+def create_order(order: OrderCreate, db: Session = Depends(rollups.get_session)):
+    row = rollups.record_order(db, order.book_id, order.quantity, round(order.amount * 100))
+    return {"id": row.id, "created_at": row.created_at}
+
 @app.get("/reports/{year}/{quarter}")
 def report(
     year: int = Path(..., ge=2000, le=2100),
-    quarter: int = Path(..., ge=1, le=4)
+    quarter: int = Path(..., ge=1, le=4),
+    db: Session = Depends(rollups.get_session),
 ):
-    return {"year": year, "quarter": quarter}
+    return rollups.quarter_report(db, year, quarter)
+
+@app.get("/reports/{year}/{quarter}/verify")
+def verify_report(
+    year: int = Path(..., ge=2000, le=2100),
+    quarter: int = Path(..., ge=1, le=4),
+    db: Session = Depends(rollups.get_session),
+):
+    return rollups.verify_quarter(db, year, quarter)
+
+@app.post("/reports/compact")
+def compact_reports(db: Session = Depends(rollups.get_session)):
+    """Roll up orders that were bulk-loaded without updating the summaries."""
+    return {"processed": rollups.compact(db)}
 
 @app.get("/invoices/{invoice_id}")
 def invoice(invoice_id: UUID):
     return {"invoice_id": str(invoice_id)}
 
 @app.get("/storage/{path:path}")
-def storage(path: str):
-    return {"path": path}
+def storage(path: str, request: Request):
+    return storage_files.response(request, path)
@@ -14,10 +14,21 @@ Example URL:
 - /assets/images/users/profile.jpg
 """
 
-from fastapi import FastAPI
+import os
+import sys
+from pathlib import Path
+
+from fastapi import FastAPI, Request
+
+# Shared helpers (file serving, ...) live in ../advance
+sys.path.append(str(Path(__file__).resolve().parent.parent / "advance"))
+from file_serving import FileStore
 
 app = FastAPI(title="Subpath Capture Example")
 
+# Files are served from ASSETS_ROOT (default: ./assets)
+assets = FileStore(os.getenv("ASSETS_ROOT", "./assets"))
+
 @app.get("/assets/{file_path:path}")
-def read_asset(file_path: str):
-    return {"file_path": file_path}
+def read_asset(file_path: str, request: Request):
+    return assets.response(request, file_path)
@@ -0,0 +1,95 @@
+"""
+Tests for advance/file_serving.py: Range header parsing and the responses
+FileStore builds from it (206 / 416 / full file).
+
+Run from the repository root:
+    python -m pytest -q tests
+"""
+
+import sys
+from pathlib import Path
+
+import pytest
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+
+# Shared helpers (file serving, ...) live in ../advance
+sys.path.append(str(Path(__file__).resolve().parent.parent / "advance"))
+from file_serving import FileStore, parse_range
+
+SIZE = 100
+
+
+# ------------------------------------------------------------------------------
+# parse_range
+# ------------------------------------------------------------------------------
+@pytest.mark.parametrize(
+    "header, expected",
+    [
+        ("bytes=0-9", [(0, 9)]),
+        ("bytes=90-", [(90, 99)]),
+        ("bytes=90-500", [(90, 99)]),
+        ("bytes=-5", [(95, 99)]),
+        ("bytes=-500", [(0, 99)]),
+        ("bytes=0-4,5-9,50-59", [(0, 9), (50, 59)]),
+    ],
+)
+def test_valid_ranges(header, expected):
+    assert parse_range(header, SIZE) == expected
+
+
+@pytest.mark.parametrize(
+    "header",
+    ["bytes=--5", "bytes=-+5", "bytes=+0-5", "bytes=0--5", "bytes=- 5", "bytes=9-0", "bytes=-", "items=0-5", "bytes=0_1-5"],
+)
+def test_malformed_ranges_are_ignored(header):
+    assert parse_range(header, SIZE) is None
+
+
+@pytest.mark.parametrize("header", ["bytes=100-", "bytes=200-300", "bytes=-0"])
+def test_unsatisfiable_ranges(header):
+    assert parse_range(header, SIZE) == []
+
+
+def test_no_range_is_inverted_after_clamping():
+    assert parse_range("bytes=-5", 0) == []
+    for start, end in parse_range("bytes=-5,0-0,99-", SIZE):
+        assert 0 <= start <= end < SIZE
+
+
+# ------------------------------------------------------------------------------
+# Responses
+# ------------------------------------------------------------------------------
+@pytest.fixture
+def client(tmp_path):
+    (tmp_path / "data.bin").write_bytes(bytes(range(SIZE)))
+    store = FileStore(str(tmp_path))
+    app = FastAPI()
+
+    @app.get("/files/{file_path:path}")
+    def read_file(file_path: str, request: Request):
+        return store.response(request, file_path)
+
+    with TestClient(app) as c:
+        yield c
+
+
+def test_negative_suffix_sends_the_full_file(client):
+    response = client.get("/files/data.bin", headers={"Range": "bytes=--5"})
+    assert response.status_code == 200
+    assert "content-range" not in response.headers
+    assert response.content == bytes(range(SIZE))
+
+
+def test_suffix_range(client):
+    response = client.get("/files/data.bin", headers={"Range": "bytes=-5"})
+    assert response.status_code == 206
+    assert response.headers["content-range"] == f"bytes 95-99/{SIZE}"
+    assert response.headers["content-length"] == "5"
+    assert response.content == bytes(range(95, SIZE))
+
+
+def test_unsatisfiable_range_is_416(client):
+    response = client.get("/files/data.bin", headers={"Range": "bytes=200-300"})
+    assert response.status_code == 416
+    assert response.headers["content-range"] == f"bytes */{SIZE}"
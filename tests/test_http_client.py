@@ -0,0 +1,251 @@
+"""
+Tests for advance/http_client.py: retries, time budget, per-host limits and
+circuit-breaker transitions (httpx.MockTransport), and mail batching against
+the stub provider in advance/mail_stub.py (in-process, via ASGITransport).
+
+Run from the repository root:
+    python -m pytest -q tests
+"""
+
+import sys
+import time
+from pathlib import Path
+
+import anyio
+import httpx
+import pytest
+
+# Shared helpers (outbound HTTP client, mail stub, ...) live in ../advance
+sys.path.append(str(Path(__file__).resolve().parent.parent / "advance"))
+import mail_stub
+from http_client import (
+    BudgetExceededError,
+    CircuitBreaker,
+    CircuitOpenError,
+    MailBatcher,
+    MailClient,
+    OutboundClient,
+)
+
+pytestmark = pytest.mark.anyio
+
+URL = "http://provider.test/send"
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+def responder(*statuses, delay: float = 0.0):
+    """A MockTransport handler answering with `statuses` in turn (the last one repeats)."""
+    calls = []
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        calls.append(request)
+        if delay:
+            await anyio.sleep(delay)
+        return httpx.Response(statuses[min(len(calls), len(statuses)) - 1])
+
+    handler.calls = calls
+    return handler
+
+
+def client(handler, **kwargs) -> OutboundClient:
+    return OutboundClient(transport=httpx.MockTransport(handler), **kwargs)
+
+
+# ------------------------------------------------------------------------------
+# Retries and budget
+# ------------------------------------------------------------------------------
+async def test_retries_5xx_then_succeeds():
+    handler = responder(503, 502, 200)
+    async with client(handler, retries=2) as http:
+        response = await http.post(URL)
+    assert response.status_code == 200
+    assert len(handler.calls) == 3
+
+
+async def test_gives_up_after_retries():
+    handler = responder(503)
+    async with client(handler, retries=2, failure_threshold=100) as http:
+        with pytest.raises(httpx.HTTPStatusError):
+            await http.post(URL)
+    assert len(handler.calls) == 3
+
+
+async def test_4xx_is_not_retried():
+    handler = responder(422)
+    async with client(handler, retries=2) as http:
+        with pytest.raises(httpx.HTTPStatusError):
+            await http.post(URL)
+    assert len(handler.calls) == 1
+    assert http.breaker("http://provider.test").state == CircuitBreaker.CLOSED
+
+
+async def test_transport_errors_are_retried():
+    calls = []
+
+    async def handler(request):
+        calls.append(request)
+        if len(calls) < 3:
+            raise httpx.ConnectError("refused", request=request)
+        return httpx.Response(200)
+
+    async with client(handler, retries=2) as http:
+        assert (await http.post(URL)).status_code == 200
+    assert len(calls) == 3
+
+
+async def test_budget_covers_the_whole_call():
+    handler = responder(200, delay=5.0)
+    async with client(handler, budget=0.2) as http:
+        start = time.monotonic()
+        with pytest.raises(BudgetExceededError):
+            await http.post(URL)
+    assert time.monotonic() - start < 1.0
+
+
+# ------------------------------------------------------------------------------
+# Per-host concurrency
+# ------------------------------------------------------------------------------
+async def test_per_host_limit():
+    active = {"provider.test": 0, "other.test": 0}
+    peak = dict(active)
+
+    async def handler(request):
+        host = request.url.host
+        active[host] += 1
+        peak[host] = max(peak[host], active[host])
+        await anyio.sleep(0.02)
+        active[host] -= 1
+        return httpx.Response(200)
+
+    async with client(handler, per_host=2) as http:
+        async with anyio.create_task_group() as tg:
+            for _ in range(10):
+                tg.start_soon(http.get, "http://provider.test/a")
+                tg.start_soon(http.get, "http://other.test/b")
+    assert peak == {"provider.test": 2, "other.test": 2}
+
+
+# ------------------------------------------------------------------------------
+# Circuit breaker
+# ------------------------------------------------------------------------------
+async def test_breaker_opens_then_fails_fast():
+    handler = responder(500)
+    async with client(handler, retries=0, failure_threshold=3, reset_timeout=60) as http:
+        for _ in range(3):
+            with pytest.raises(httpx.HTTPStatusError):
+                await http.post(URL)
+        with pytest.raises(CircuitOpenError):
+            await http.post(URL)
+    assert len(handler.calls) == 3  # the open circuit never reached the host
+
+
+async def test_half_open_trial_success_closes():
+    handler = responder(500, 200)
+    async with client(handler, retries=0, failure_threshold=1, reset_timeout=0.05) as http:
+        with pytest.raises(httpx.HTTPStatusError):
+            await http.post(URL)
+        breaker = http.breaker("http://provider.test")
+        assert breaker.state == CircuitBreaker.OPEN
+        await anyio.sleep(0.06)
+        assert (await http.post(URL)).status_code == 200
+        assert breaker.state == CircuitBreaker.CLOSED
+
+
+async def test_half_open_trial_failure_reopens():
+    handler = responder(500)
+    async with client(handler, retries=0, failure_threshold=1, reset_timeout=0.05) as http:
+        with pytest.raises(httpx.HTTPStatusError):
+            await http.post(URL)
+        await anyio.sleep(0.06)
+        with pytest.raises(httpx.HTTPStatusError):
+            await http.post(URL)  # the trial
+        assert http.breaker("http://provider.test").state == CircuitBreaker.OPEN
+        with pytest.raises(CircuitOpenError):
+            await http.post(URL)
+
+
+async def test_only_one_trial_while_half_open():
+    handler = responder(500, 200, delay=0.05)
+    async with client(handler, retries=0, failure_threshold=1, reset_timeout=0.01) as http:
+        with pytest.raises(httpx.HTTPStatusError):
+            await http.post(URL)
+        await anyio.sleep(0.02)
+        results = []
+
+        async def call():
+            try:
+                results.append((await http.post(URL)).status_code)
+            except CircuitOpenError:
+                results.append("open")
+
+        async with anyio.create_task_group() as tg:
+            tg.start_soon(call)
+            await anyio.sleep(0.01)
+            tg.start_soon(call)
+    assert sorted(map(str, results)) == ["200", "open"]
+
+
+async def test_cancelled_trial_does_not_wedge_the_breaker():
+    handler = responder(500, 200, delay=0.2)
+    async with client(handler, retries=0, failure_threshold=1, reset_timeout=0.01) as http:
+        with pytest.raises(httpx.HTTPStatusError):
+            await http.post(URL)
+        await anyio.sleep(0.02)
+        with anyio.move_on_after(0.05):  # cancel the half-open trial mid-flight
+            await http.post(URL)
+        # The next call becomes the new trial instead of failing forever
+        assert (await http.post(URL)).status_code == 200
+        assert http.breaker("http://provider.test").state == CircuitBreaker.CLOSED
+
+
+# ------------------------------------------------------------------------------
+# Mail batching against the stub provider
+# ------------------------------------------------------------------------------
+async def test_mail_batches_against_stub():
+    mail_stub.stats.update(requests=0, messages=0)
+    transport = httpx.ASGITransport(app=mail_stub.app)
+    async with OutboundClient(transport=transport) as http:
+        batcher = MailBatcher(MailClient(http, "http://mail.test"), batch_size=50, flush_interval=0.05)
+        async with anyio.create_task_group() as tg:
+            tg.start_soon(batcher.run)
+            for i in range(120):
+                await batcher.send(f"user{i}@example.com", "Welcome")
+            await batcher.close()
+    assert batcher.sent == 120 and batcher.failed == 0
+    assert mail_stub.stats == {"requests": 3, "messages": 120}
+
+
+async def test_mail_failures_are_counted_not_raised():
+    async def handler(request):
+        return httpx.Response(503)
+
+    async with client(handler, retries=0, budget=0.5) as http:
+        batcher = MailBatcher(MailClient(http, "http://provider.test"), batch_size=10, flush_interval=0.01)
+        async with anyio.create_task_group() as tg:
+            tg.start_soon(batcher.run)
+            for i in range(5):
+                await batcher.send(f"user{i}@example.com", "Welcome")
+            await batcher.close()
+    assert batcher.failed == 5 and batcher.sent == 0
+
+
+async def test_unexpected_error_does_not_stop_the_batcher():
+    class FlakyMail:
+        calls = 0
+
+        async def send_many(self, messages):
+            FlakyMail.calls += 1
+            if FlakyMail.calls == 1:
+                raise KeyError("id")  # e.g. a response missing a field
+
+    batcher = MailBatcher(FlakyMail(), batch_size=1, flush_interval=0.01)
+    async with anyio.create_task_group() as tg:
+        tg.start_soon(batcher.run)
+        for i in range(3):
+            await batcher.send(f"user{i}@example.com", "Welcome")
+        await batcher.close()
+    assert batcher.failed == 1 and batcher.sent == 2